@@ -0,0 +1,251 @@
+"""
+Semantic answer cache keyed on query embeddings
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SemanticAnswerCache:
+    """
+    Cache answers for questions whose embeddings are near-identical
+
+    Entries live in SQLite so they survive restarts, with an in-memory
+    matrix of normalized embeddings for fast cosine lookups. Entries
+    expire after ttl seconds and the least recently used entries are
+    evicted once max_entries is reached.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        model_name: str,
+        threshold: float = 0.95,
+        max_entries: int = 1000,
+        ttl: float = 86400,
+    ):
+        self.path = path
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "model TEXT NOT NULL, "
+            "query TEXT NOT NULL, "
+            "embedding BLOB NOT NULL, "
+            "answer TEXT NOT NULL, "
+            "sources TEXT NOT NULL, "
+            "compute_time REAL NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "last_access REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+        self._ids: List[int] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._entries: Dict[int, Dict[str, Any]] = {}
+
+        self._lookups = 0
+        self._hits = 0
+        self._latency_saved = 0.0
+
+        self._load()
+
+    @classmethod
+    def from_env(cls, cache_dir: str, model_name: str) -> Optional["SemanticAnswerCache"]:
+        """Build a cache from ANSWER_CACHE_* environment variables, or None if disabled"""
+        if (os.getenv("ANSWER_CACHE_ENABLED") or "true").lower() in ("0", "false", "no"):
+            return None
+        os.makedirs(cache_dir, exist_ok=True)
+        return cls(
+            path=os.path.join(cache_dir, "answers.sqlite3"),
+            model_name=model_name,
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000")),
+            ttl=float(os.getenv("ANSWER_CACHE_TTL", "86400")),
+        )
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _load(self) -> None:
+        rows = self._conn.execute(
+            "SELECT id, embedding, answer, sources, compute_time, created_at, last_access "
+            "FROM answers WHERE model = ? ORDER BY id",
+            (self.model_name,),
+        ).fetchall()
+        vectors = []
+        for row_id, blob, answer, sources, compute_time, created_at, last_access in rows:
+            self._ids.append(row_id)
+            vectors.append(np.frombuffer(blob, dtype=np.float32))
+            self._entries[row_id] = {
+                "answer": answer,
+                "sources": json.loads(sources),
+                "compute_time": compute_time,
+                "created_at": created_at,
+                "last_access": last_access,
+            }
+        if vectors:
+            self._matrix = np.vstack(vectors)
+        logger.info(f"Loaded {len(self._ids)} cached answers")
+
+    def _remove(self, positions: List[int]) -> None:
+        row_ids = [self._ids[pos] for pos in positions]
+        self._conn.executemany(
+            "DELETE FROM answers WHERE id = ?", [(row_id,) for row_id in row_ids]
+        )
+        self._conn.commit()
+        for row_id in row_ids:
+            del self._entries[row_id]
+        removed = set(positions)
+        keep = [pos for pos in range(len(self._ids)) if pos not in removed]
+        self._ids = [self._ids[pos] for pos in keep]
+        self._matrix = self._matrix[keep] if keep else None
+
+    def lookup(self, embedding: List[float]) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Find a cached answer for a query embedding
+
+        Args:
+            embedding: Query embedding
+
+        Returns:
+            (answer, sources) for the most similar cached query above the
+            threshold, or None on a miss
+        """
+        started = time.perf_counter()
+        query = self._normalize(embedding)
+        with self._lock:
+            self._lookups += 1
+            if self._matrix is None or self._matrix.shape[1] != query.shape[0]:
+                return None
+
+            scores = self._matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+
+            row_id = self._ids[best]
+            entry = self._entries[row_id]
+            now = time.time()
+            if now - entry["created_at"] > self.ttl:
+                self._remove([best])
+                return None
+
+            entry["last_access"] = now
+            self._conn.execute(
+                "UPDATE answers SET last_access = ? WHERE id = ?", (now, row_id)
+            )
+            self._conn.commit()
+            self._hits += 1
+            self._latency_saved += max(0.0, entry["compute_time"] - (time.perf_counter() - started))
+            return entry["answer"], entry["sources"]
+
+    def store(
+        self,
+        query_text: str,
+        embedding: List[float],
+        answer: str,
+        sources: List[Dict[str, Any]],
+        compute_time: float,
+    ) -> None:
+        """
+        Add an answer to the cache, evicting the least recently used entry if full
+
+        Args:
+            query_text: Original question, kept for inspection
+            embedding: Query embedding
+            answer: Synthesized answer
+            sources: Source metadata returned with the answer
+            compute_time: Seconds it took to produce the answer
+        """
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            if self._matrix is not None and self._matrix.shape[1] != vector.shape[0]:
+                self._clear_locked()
+
+            cursor = self._conn.execute(
+                "INSERT INTO answers (model, query, embedding, answer, sources, "
+                "compute_time, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.model_name,
+                    query_text,
+                    vector.tobytes(),
+                    answer,
+                    json.dumps(sources),
+                    compute_time,
+                    now,
+                    now,
+                ),
+            )
+            self._conn.commit()
+
+            row_id = cursor.lastrowid
+            self._ids.append(row_id)
+            self._entries[row_id] = {
+                "answer": answer,
+                "sources": sources,
+                "compute_time": compute_time,
+                "created_at": now,
+                "last_access": now,
+            }
+            row = vector.reshape(1, -1)
+            self._matrix = row if self._matrix is None else np.vstack([self._matrix, row])
+
+            if len(self._ids) > self.max_entries:
+                overflow = len(self._ids) - self.max_entries
+                by_access = sorted(
+                    range(len(self._ids)),
+                    key=lambda pos: self._entries[self._ids[pos]]["last_access"],
+                )
+                self._remove(by_access[:overflow])
+
+    def _clear_locked(self) -> None:
+        self._conn.execute("DELETE FROM answers WHERE model = ?", (self.model_name,))
+        self._conn.commit()
+        self._ids = []
+        self._entries = {}
+        self._matrix = None
+
+    def reload(self) -> None:
+        """Re-read entries from SQLite, e.g. after another process changed them"""
+        with self._lock:
+            self._ids = []
+            self._entries = {}
+            self._matrix = None
+            self._load()
+
+    def clear(self) -> None:
+        """Drop all cached answers for this embedding model, e.g. after the index changes"""
+        with self._lock:
+            self._clear_locked()
+        logger.info("Answer cache cleared")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and latency saved since startup"""
+        with self._lock:
+            return {
+                "entries": len(self._ids),
+                "lookups": self._lookups,
+                "hits": self._hits,
+                "hit_rate": round(self._hits / self._lookups, 4) if self._lookups else 0.0,
+                "latency_saved_seconds": round(self._latency_saved, 3),
+            }
@@ -0,0 +1,79 @@
+"""
+Compare serial /query calls with one /query/batch call
+
+Runs against a server that already has an index. Disable the answer cache
+on the server (ANSWER_CACHE_ENABLED=false) for a fair comparison, since
+the second pass would otherwise be served from it.
+
+Usage:
+    python benchmarks/bench_batch.py --url http://localhost:8000 --questions 100
+"""
+import argparse
+import json
+import time
+
+import httpx
+
+QUESTIONS = [
+    "What are the symptoms of diabetes?",
+    "How can I lower my blood pressure?",
+    "What causes migraine headaches?",
+    "What are treatment options for anxiety?",
+    "How do I improve my sleep quality?",
+    "What is the difference between a cold and the flu?",
+    "What are the risk factors for heart disease?",
+    "How is asthma treated?",
+]
+
+
+def make_questions(count: int) -> list:
+    # Vary the wording so neither run benefits from exact-match caching.
+    return [f"{QUESTIONS[i % len(QUESTIONS)]} (case {i})" for i in range(count)]
+
+
+def run_serial(client: httpx.Client, url: str, questions: list) -> float:
+    started = time.perf_counter()
+    for question in questions:
+        client.post(f"{url}/query", json={"question": question}).raise_for_status()
+    return time.perf_counter() - started
+
+
+def run_batch(client: httpx.Client, url: str, questions: list, concurrency: int) -> float:
+    started = time.perf_counter()
+    received = 0
+    with client.stream(
+        "POST", f"{url}/query/batch",
+        json={"questions": questions, "concurrency": concurrency}
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                received += 1
+    if received != len(questions):
+        raise RuntimeError(f"Expected {len(questions)} results, got {received}")
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark /query/batch against serial /query")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    with httpx.Client(timeout=None) as client:
+        serial = run_serial(client, args.url, make_questions(args.questions))
+        batch = run_batch(client, args.url, make_questions(args.questions), args.concurrency)
+
+    result = {
+        "questions": args.questions,
+        "concurrency": args.concurrency,
+        "serial_seconds": round(serial, 2),
+        "batch_seconds": round(batch, 2),
+        "speedup": round(serial / batch, 1) if batch else None,
+    }
+    print(json.dumps(result))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
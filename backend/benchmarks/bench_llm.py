@@ -0,0 +1,131 @@
+"""
+Compare LLM backend latency and throughput
+
+Sends the same RAG-style prompts to each backend and reports p50/p95
+latency, time to first token and completions per second. The hosted
+backend is skipped when OPENAI_API_KEY is not set. With --local-server a
+stand-in server (local_llm_server.py) is started in-process for the
+openai_like backend.
+
+Usage:
+    python benchmarks/bench_llm.py --backends openai_like,openai --requests 50 --concurrency 4
+    python benchmarks/bench_llm.py --backends openai_like --local-server --token-latency 0.02
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_backends import build_llm  # noqa: E402
+from local_llm_server import make_server  # noqa: E402
+
+PROMPT_TEMPLATE = (
+    "Context information is below.\n"
+    "---------------------\n"
+    "{context}\n"
+    "---------------------\n"
+    "Given the context information and not prior knowledge, answer the query.\n"
+    "Query: {question}\n"
+    "Answer: "
+)
+
+SAMPLES = [
+    ("What are the symptoms of diabetes?",
+     "Common symptoms of diabetes include increased thirst, frequent urination, "
+     "extreme hunger, unexplained weight loss, fatigue and blurred vision."),
+    ("How can I lower my blood pressure?",
+     "Blood pressure can be lowered by reducing salt intake, exercising regularly, "
+     "limiting alcohol, maintaining a healthy weight and managing stress."),
+    ("What causes migraines?",
+     "Migraines may be triggered by hormonal changes, stress, certain foods, "
+     "sleep changes and sensory stimuli such as bright lights."),
+    ("How much sleep do adults need?",
+     "Most adults need seven to nine hours of sleep per night. Consistent sleep "
+     "schedules improve sleep quality."),
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_backend(backend: str, requests: int, concurrency: int) -> Dict[str, Any]:
+    """Time `requests` streamed completions against one backend"""
+    os.environ["LLM_BACKEND"] = backend
+    llm = build_llm()
+    prompts = [
+        PROMPT_TEMPLATE.format(context=context, question=question)
+        for question, context in SAMPLES
+    ]
+
+    def one(i: int) -> Dict[str, float]:
+        start = time.perf_counter()
+        first_token = None
+        for _ in llm.stream_complete(prompts[i % len(prompts)]):
+            if first_token is None:
+                first_token = time.perf_counter() - start
+        total = time.perf_counter() - start
+        return {"latency": total, "ttft": first_token if first_token is not None else total}
+
+    # Warm up connections and any lazily loaded model before timing.
+    one(0)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies = [r["latency"] for r in results]
+    ttfts = [r["ttft"] for r in results]
+    return {
+        "backend": backend,
+        "requests": requests,
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "ttft_p50_ms": round(percentile(ttfts, 50) * 1000, 1),
+        "ttft_p95_ms": round(percentile(ttfts, 95) * 1000, 1),
+        "throughput_rps": round(requests / wall, 2) if wall else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark LLM backends")
+    parser.add_argument("--backends", default="openai_like,openai",
+                        help="Comma-separated LLM_BACKEND values")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--local-server", action="store_true",
+                        help="Start the stand-in server for openai_like")
+    parser.add_argument("--first-token-latency", type=float, default=0.0)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.local_server:
+        server = make_server(port=0, first_token_latency=args.first_token_latency,
+                             token_latency=args.token_latency)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ["LLM_API_BASE"] = f"http://127.0.0.1:{server.server_port}/v1"
+
+    results = []
+    for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        if backend == "openai" and not os.getenv("OPENAI_API_KEY"):
+            print(f"Skipping {backend}: OPENAI_API_KEY not set", file=sys.stderr)
+            continue
+        results.append(run_backend(backend, args.requests, args.concurrency))
+        print(json.dumps(results[-1]))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,76 @@
+"""
+Compare retrieval-only latency with full synthesis
+
+Sends the same questions to /retrieve and to /query against a running
+server that already has an index, and reports p50/p95 latency of each.
+Disable the answer cache on the server (ANSWER_CACHE_ENABLED=false) so
+/query always synthesizes.
+
+Usage:
+    python benchmarks/bench_retrieve.py --url http://localhost:8000 --requests 200
+"""
+import argparse
+import json
+import time
+
+import httpx
+
+QUESTIONS = [
+    "What are the symptoms of diabetes?",
+    "How can I lower my blood pressure?",
+    "What causes migraine headaches?",
+    "What are treatment options for anxiety?",
+    "How do I improve my sleep quality?",
+    "What is metformin used for?",
+    "What are the risk factors for heart disease?",
+    "How is asthma treated?",
+]
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(client: httpx.Client, url: str, payloads: list) -> dict:
+    latencies = []
+    for payload in payloads:
+        started = time.perf_counter()
+        client.post(url, json=payload).raise_for_status()
+        latencies.append(time.perf_counter() - started)
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark /retrieve against /query")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=100,
+                        help="Requests for /retrieve; /query gets a tenth as many")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.requests)]
+    with httpx.Client(timeout=None) as client:
+        # Warm up the embedding model and connections.
+        client.post(f"{args.url}/retrieve", json={"question": questions[0]}).raise_for_status()
+        results = {
+            "retrieve": measure(client, f"{args.url}/retrieve", [
+                {"question": question, "top_k": args.top_k} for question in questions
+            ]),
+            "query": measure(client, f"{args.url}/query", [
+                {"question": question} for question in questions[:max(1, args.requests // 10)]
+            ]),
+        }
+
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,110 @@
+"""
+Measure cold start time of the API server
+
+Starts main.py in a fresh process several times and reports how long it
+takes until /health answers (liveness) and until /ready returns 200
+(readiness: index loaded and warmed up), along with the server's own
+warm-up stage timings. The server uses the current environment, so point
+CHROMA_DB_PATH at an existing index to include index loading.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 5
+    OFFLINE_MODE=true LLM_API_BASE=http://localhost:8080/v1 python benchmarks/bench_startup.py
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_once(timeout: float) -> Dict[str, Any]:
+    """Start the server, wait for liveness then readiness, and stop it"""
+    port = free_port()
+    env = dict(os.environ, HOST="127.0.0.1", PORT=str(port))
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    live: Optional[float] = None
+    ready: Optional[float] = None
+    state: Dict[str, Any] = {}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    state = {"phase": "exited", "error": f"exit code {process.returncode}"}
+                    break
+                try:
+                    if live is None:
+                        client.get("/health").raise_for_status()
+                        live = time.perf_counter() - started
+                    response = client.get("/ready")
+                    state = response.json()
+                    if response.status_code == 200:
+                        ready = time.perf_counter() - started
+                        break
+                    if state.get("phase") == "failed":
+                        break
+                except httpx.HTTPError:
+                    pass
+                time.sleep(0.02)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return {
+        "live_s": round(live, 3) if live is not None else None,
+        "ready_s": round(ready, 3) if ready is not None else None,
+        "phase": state.get("phase"),
+        "error": state.get("error"),
+        "warmup_ms": state.get("timings"),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark API server cold start")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300.0,
+                        help="Seconds to wait for readiness per run")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    runs = [start_once(args.timeout) for _ in range(args.runs)]
+    live = [run["live_s"] for run in runs if run["live_s"] is not None]
+    ready = [run["ready_s"] for run in runs if run["ready_s"] is not None]
+    results = {
+        "runs": runs,
+        "live_p50_s": percentile(live, 50),
+        "ready_p50_s": percentile(ready, 50),
+        "ready_failures": args.runs - len(ready),
+    }
+
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
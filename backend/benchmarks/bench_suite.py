@@ -0,0 +1,366 @@
+"""
+Reproducible offline load test of index builds, retrieval and queries
+
+Starts the stand-in LLM server (local_llm_server.py) and the API server
+in fresh processes, with the deterministic hash embedding model and empty
+Chroma and cache directories. It builds the index through /initialize
+from a fixed slice of the dataset, then drives /retrieve, /query with
+"mode": "retrieve", and /query at each requested concurrency. Nothing
+leaves the machine, so runs are comparable across commits.
+
+Reported: index build time and docs/sec; p50/p95/p99 latency, QPS and
+errors per endpoint and concurrency; and the server's peak RSS (Linux).
+Results are printed as JSON together with the commit and settings, and
+--baseline prints the relative change of each number against an earlier
+result file.
+
+The slice is the first --docs rows of DATASET_NAME, which must be in the
+local HuggingFace cache, or with --corpus synthetic a generated set of
+question/answer documents (written as JSONL and loaded the same way).
+The dataset is read with --dataset-mode, by default the server's own
+default (arrow).
+
+Usage:
+    python benchmarks/bench_suite.py --corpus synthetic --docs 2000 --concurrency 1,8 --output base.json
+    python benchmarks/bench_suite.py --corpus synthetic --docs 2000 --concurrency 1,8 --baseline base.json
+    python benchmarks/bench_suite.py --corpus dataset --docs 5000 --token-latency 0.01
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONDITIONS = [
+    "diabetes", "hypertension", "migraine", "asthma", "anxiety", "insomnia",
+    "influenza", "arthritis", "anemia", "eczema", "gout", "bronchitis",
+    "hypothyroidism", "sinusitis", "depression", "kidney stones",
+]
+ASPECTS = [
+    ("What are the symptoms of {c}?", "Typical symptoms of {c} include {a}, {b} and fatigue."),
+    ("How is {c} treated?", "Treatment of {c} usually combines {a} with {b} and follow-up visits."),
+    ("What causes {c}?", "{c} is commonly linked to {a}, {b} and family history."),
+    ("How can I prevent {c}?", "Preventing {c} involves {a}, {b} and regular check-ups."),
+]
+DETAILS = [
+    "regular exercise", "a balanced diet", "medication", "adequate sleep",
+    "stress management", "hydration", "weight control", "avoiding smoking",
+    "physical therapy", "blood tests", "lifestyle changes", "limiting alcohol",
+]
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def synthetic_rows(count: int, seed: int) -> List[Dict[str, str]]:
+    """Question/answer rows in the dataset's input/output layout"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        condition = CONDITIONS[i % len(CONDITIONS)]
+        question, answer = ASPECTS[(i // len(CONDITIONS)) % len(ASPECTS)]
+        a, b = rng.sample(DETAILS, 2)
+        rows.append({
+            "input": f"{question.format(c=condition)} (patient {i})",
+            "output": f"{answer.format(c=condition, a=a, b=b).capitalize()} Case note {i}.",
+        })
+    return rows
+
+
+def make_questions(rows: List[Dict[str, str]], count: int, seed: int) -> List[str]:
+    """A fixed sample of the corpus questions, reworded so caches don't answer them"""
+    rng = random.Random(seed)
+    pool = [row["input"] for row in rows] or [a[0].format(c=c) for c in CONDITIONS for a in ASPECTS]
+    return [f"{rng.choice(pool)} [{i}]" for i in range(count)]
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """Peak resident memory of a process so far (VmHWM), Linux only"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def wait_for(check: Any, timeout: float, what: str) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if check():
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError(f"Timed out waiting for {what}")
+
+
+def run_build(client: httpx.Client, docs: int, timeout: float) -> Dict[str, Any]:
+    """Build the index through /initialize and wait for the job"""
+    started = time.perf_counter()
+    response = client.post("/initialize", params={"max_samples": docs})
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    job: Dict[str, Any] = {}
+
+    def finished() -> bool:
+        nonlocal job
+        job = client.get(f"/jobs/{job_id}").json()
+        return job["status"] not in ("queued", "running")
+
+    wait_for(finished, timeout, "the index build")
+    elapsed = time.perf_counter() - started
+    if job["status"] != "completed":
+        raise RuntimeError(f"Index build {job['status']}: {job.get('errors')}")
+    return {
+        "documents": job["docs_processed"],
+        "embedded": job["docs_embedded"],
+        "build_s": round(elapsed, 2),
+        "docs_per_sec": round(job["docs_processed"] / elapsed, 1) if elapsed else None,
+        "indexing_docs_per_sec": job["docs_per_sec"],
+    }
+
+
+def run_load(
+    url: str, path: str, payloads: List[Dict[str, Any]], concurrency: int
+) -> Dict[str, Any]:
+    """Send payloads to one endpoint from concurrency client threads"""
+    local = threading.local()
+    clients: List[httpx.Client] = []
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def send(payload: Dict[str, Any]) -> None:
+        nonlocal errors
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = httpx.Client(base_url=url, timeout=120.0)
+            with lock:
+                clients.append(client)
+        started = time.perf_counter()
+        try:
+            client.post(path, json=payload).raise_for_status()
+            ok = True
+        except httpx.HTTPError:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, payloads))
+    wall = time.perf_counter() - started
+    for client in clients:
+        client.close()
+    return {
+        "requests": len(payloads),
+        "errors": errors,
+        "qps": round(len(latencies) / wall, 2) if wall else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+SCENARIOS = {
+    "retrieve": ("/retrieve", lambda question: {"question": question}),
+    "query_retrieve": ("/query", lambda question: {"question": question, "mode": "retrieve"}),
+    "query": ("/query", lambda question: {"question": question}),
+}
+
+
+def main(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="bench_suite_")
+    processes: List[subprocess.Popen] = []
+    try:
+        env = dict(
+            os.environ,
+            OFFLINE_MODE="true",
+            EMBEDDING_PROVIDER="hash",
+            LLM_BACKEND="openai_like",
+            CHROMA_DB_PATH=os.path.join(workdir, "chroma"),
+            CACHE_DIR=os.path.join(workdir, "cache"),
+            ANSWER_CACHE_ENABLED="true" if args.answer_cache else "false",
+            PRECOMPUTED_ANSWERS_ENABLED="true" if args.answer_cache else "false",
+            DATASET_MODE=args.dataset_mode,
+            HOST="127.0.0.1",
+        )
+        rows: List[Dict[str, str]] = []
+        if args.corpus == "synthetic":
+            rows = synthetic_rows(args.docs, args.seed)
+            corpus_dir = os.path.join(workdir, "corpus")
+            os.makedirs(corpus_dir)
+            with open(os.path.join(corpus_dir, "train.jsonl"), "w") as f:
+                for row in rows:
+                    f.write(json.dumps(row) + "\n")
+            env["DATASET_NAME"] = corpus_dir
+
+        llm_port = free_port()
+        processes.append(subprocess.Popen(
+            [sys.executable, "local_llm_server.py", "--port", str(llm_port),
+             "--first-token-latency", str(args.first_token_latency),
+             "--token-latency", str(args.token_latency)],
+            cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+        env["LLM_API_BASE"] = f"http://127.0.0.1:{llm_port}/v1"
+
+        port = free_port()
+        env["PORT"] = str(port)
+        url = f"http://127.0.0.1:{port}"
+        log = open(os.path.join(workdir, "server.log"), "w")
+        server = subprocess.Popen(
+            [sys.executable, "main.py"], cwd=BACKEND_DIR, env=env,
+            stdout=log, stderr=subprocess.STDOUT,
+        )
+        processes.append(server)
+
+        results: Dict[str, Any] = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "settings": {
+                "corpus": args.corpus, "dataset_mode": args.dataset_mode,
+                "docs": args.docs, "seed": args.seed,
+                "requests": args.requests, "concurrency": args.concurrency,
+                "scenarios": args.scenarios, "answer_cache": args.answer_cache,
+                "first_token_latency": args.first_token_latency,
+                "token_latency": args.token_latency,
+            },
+        }
+        with httpx.Client(base_url=url, timeout=30.0) as client:
+            wait_for(lambda: client.get("/ready").status_code == 200, args.timeout, "the server")
+            results["build"] = run_build(client, args.docs, args.timeout)
+            # Pick up the new index in every worker before measuring.
+            wait_for(lambda: client.get("/status").json()["index_loaded"], args.timeout, "the index")
+        results["rss_after_build_mb"] = peak_rss_mb(server.pid)
+
+        questions = make_questions(rows, args.requests + args.warmup, args.seed)
+        results["scenarios"] = []
+        for name in args.scenarios.split(","):
+            path, payload = SCENARIOS[name]
+            run_load(url, path, [payload(q) for q in questions[:args.warmup]], 1)
+            for concurrency in (int(value) for value in args.concurrency.split(",")):
+                measured = run_load(
+                    url, path, [payload(q) for q in questions[args.warmup:]], concurrency
+                )
+                results["scenarios"].append({"scenario": name, "concurrency": concurrency, **measured})
+        results["peak_rss_mb"] = peak_rss_mb(server.pid)
+        return results
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if args.keep:
+            print(f"Kept {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change of every number against a baseline result"""
+    def change(new: Any, old: Any) -> Optional[float]:
+        if isinstance(new, (int, float)) and isinstance(old, (int, float)) and old:
+            return round((new - old) / old, 4)
+        return None
+
+    changes: Dict[str, Any] = {"baseline_commit": baseline.get("commit")}
+    for key in ("build_s", "docs_per_sec"):
+        changes[key] = change(results["build"].get(key), baseline.get("build", {}).get(key))
+    changes["peak_rss_mb"] = change(results.get("peak_rss_mb"), baseline.get("peak_rss_mb"))
+    old_scenarios = {
+        (entry["scenario"], entry["concurrency"]): entry for entry in baseline.get("scenarios", [])
+    }
+    for entry in results["scenarios"]:
+        old = old_scenarios.get((entry["scenario"], entry["concurrency"]))
+        if old is None:
+            continue
+        changes[f"{entry['scenario']}@{entry['concurrency']}"] = {
+            key: change(entry[key], old.get(key)) for key in ("qps", "p50_ms", "p95_ms", "p99_ms")
+        }
+    return changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load test of index builds, retrieval and queries")
+    parser.add_argument("--corpus", choices=["synthetic", "dataset"], default="synthetic",
+                        help="Generated documents, or the first --docs rows of DATASET_NAME")
+    parser.add_argument("--dataset-mode", choices=["arrow", "streaming", "memory"], default="arrow",
+                        help="How the server reads the dataset (DATASET_MODE)")
+    parser.add_argument("--docs", type=int, default=1000, help="Documents to index")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and concurrency")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per scenario")
+    parser.add_argument("--concurrency", default="1,8", help="Comma-separated client concurrency levels")
+    parser.add_argument("--scenarios", default="retrieve,query_retrieve,query",
+                        help=f"Comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--answer-cache", action="store_true", help="Leave the answer cache and precomputed answers on")
+    parser.add_argument("--first-token-latency", type=float, default=0.0,
+                        help="Stub LLM seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.0,
+                        help="Stub LLM seconds between tokens")
+    parser.add_argument("--timeout", type=float, default=600.0,
+                        help="Seconds to wait for startup and the index build")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory and server log")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = main(args)
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["change"] = compare(results, json.load(f))
+
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,269 @@
+"""
+Compare the quantized vector index with Chroma
+
+Builds both indexes over the same embeddings and reports the total disk
+footprint of each configuration, load time (opening the index and
+answering the first query), resident memory, recall@k against exact search
+and p50/p95 query latency. The quantized configuration still needs the
+Chroma collection (it rescores with the float vectors stored there), so
+its disk_mb is Chroma plus the quantized files, with the latter also shown
+as index_mb. Each backend is measured in a fresh subprocess so load time
+and memory are not shared.
+
+Embeddings come from an existing Chroma index (--chroma-path) or are
+generated (clustered random unit vectors). Queries are stored vectors
+with a little noise added, so no embedding model is needed.
+
+Usage:
+    python benchmarks/bench_vectors.py --count 100000 --dim 384 --queries 200
+    python benchmarks/bench_vectors.py --chroma-path ./chroma_db --queries 200
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantized_index import QuantizedIndex  # noqa: E402
+
+COLLECTION = "medical_wikidoc"
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def rss_mb() -> float:
+    """Resident memory of this process, including touched memory-mapped pages"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        # Peak rather than current usage; ru_maxrss is in kilobytes on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def chroma_client(path: str) -> Any:
+    import chromadb
+    from chromadb.config import Settings
+
+    return chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+
+
+def synthetic_pages(count: int, dim: int, page_size: int = 5000) -> Iterator[Tuple[List[str], np.ndarray]]:
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(max(1, count // 500), dim)).astype(np.float32)
+    for start in range(0, count, page_size):
+        size = min(page_size, count - start)
+        vectors = centers[rng.integers(len(centers), size=size)] + 0.5 * rng.normal(size=(size, dim))
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        yield [f"node-{i}" for i in range(start, start + size)], vectors.astype(np.float32)
+
+
+def chroma_pages(collection: Any, page_size: int = 5000) -> Iterator[Tuple[List[str], np.ndarray]]:
+    offset = 0
+    while True:
+        result = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+        ids = result.get("ids") or []
+        if ids:
+            yield ids, np.asarray(result["embeddings"], dtype=np.float32)
+        if len(ids) < page_size:
+            return
+        offset += page_size
+
+
+def probe(
+    backend: str, path: str, chroma_path: str, queries_path: str, top_k: int, nprobe: int, rescore: int
+) -> Dict[str, Any]:
+    """Load one backend and run the queries; runs in its own process"""
+    queries = np.load(queries_path)
+    baseline = rss_mb()
+
+    started = time.perf_counter()
+    collection = chroma_client(chroma_path).get_collection(COLLECTION)
+    if backend == "chroma":
+        def search(query: np.ndarray) -> List[str]:
+            return collection.query(
+                query_embeddings=[query.tolist()], n_results=top_k, include=[]
+            )["ids"][0]
+    else:
+        index = QuantizedIndex(path, nprobe=nprobe, rescore=rescore)
+        index.load()
+
+        def fetch_vectors(ids: List[str]) -> Dict[str, List[float]]:
+            result = collection.get(ids=ids, include=["embeddings"])
+            return dict(zip(result["ids"], result["embeddings"]))
+
+        def search(query: np.ndarray) -> List[str]:
+            return [node_id for node_id, _ in index.search(query, top_k, fetch_vectors)]
+
+    # Chroma loads its HNSW index on the first query, so count that as loading.
+    results = [search(queries[0])]
+    load_time = time.perf_counter() - started
+
+    latencies = []
+    for query in queries[1:]:
+        query_started = time.perf_counter()
+        results.append(search(query))
+        latencies.append(time.perf_counter() - query_started)
+
+    return {
+        "load_s": round(load_time, 3),
+        "rss_mb": round(rss_mb() - baseline, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "results": results,
+    }
+
+
+def exact_neighbours(pages: Iterator[Tuple[List[str], np.ndarray]], queries: np.ndarray, top_k: int) -> List[List[str]]:
+    """True top_k ids per query by brute-force squared L2"""
+    best_ids: List[List[str]] = [[] for _ in queries]
+    best_distances = [np.empty(0, dtype=np.float32) for _ in queries]
+    for ids, vectors in pages:
+        distances = (
+            (vectors ** 2).sum(axis=1)[None, :] - 2.0 * queries @ vectors.T
+        )
+        for i in range(len(queries)):
+            merged_ids = best_ids[i] + list(ids)
+            merged = np.concatenate([best_distances[i], distances[i]])
+            keep = np.argsort(merged)[:top_k]
+            best_ids[i] = [merged_ids[j] for j in keep]
+            best_distances[i] = merged[keep]
+    return best_ids
+
+
+def run_probe(
+    backend: str, path: str, chroma_path: str, queries_path: str, args: argparse.Namespace
+) -> Dict[str, Any]:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--probe", backend, "--probe-path", path,
+         "--probe-chroma-path", chroma_path, "--probe-queries", queries_path, "--top-k", str(args.top_k),
+         "--nprobe", str(args.nprobe), "--rescore", str(args.rescore)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="bench_vectors_")
+    try:
+        if args.chroma_path:
+            chroma_path = args.chroma_path
+            collection = chroma_client(chroma_path).get_collection(COLLECTION)
+            count = collection.count()
+
+            def pages() -> Iterator[Tuple[List[str], np.ndarray]]:
+                return chroma_pages(collection)
+        else:
+            chroma_path = os.path.join(workdir, "chroma")
+            collection = chroma_client(chroma_path).create_collection(COLLECTION)
+            count = args.count
+            for ids, vectors in synthetic_pages(args.count, args.dim):
+                collection.add(ids=ids, embeddings=vectors.tolist(), documents=ids)
+
+            def pages() -> Iterator[Tuple[List[str], np.ndarray]]:
+                return synthetic_pages(args.count, args.dim)
+
+        quantized_path = os.path.join(workdir, "quantized")
+        index = QuantizedIndex(quantized_path, lists=args.lists)
+        started = time.perf_counter()
+        index.build(pages(), count)
+        build_time = time.perf_counter() - started
+
+        # Queries: random stored vectors plus noise.
+        rng = np.random.default_rng(1)
+        chosen = set(rng.choice(count, size=min(args.queries, count), replace=False).tolist())
+        sampled = []
+        position = 0
+        for _, vectors in pages():
+            for row in range(len(vectors)):
+                if position + row in chosen:
+                    sampled.append(vectors[row])
+            position += len(vectors)
+        queries = np.asarray(sampled, dtype=np.float32)
+        queries += 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+        queries_path = os.path.join(workdir, "queries.npy")
+        np.save(queries_path, queries)
+
+        truth = exact_neighbours(pages(), queries, args.top_k)
+
+        results: Dict[str, Any] = {
+            "vectors": count,
+            "dim": int(queries.shape[1]),
+            "queries": len(queries),
+            "top_k": args.top_k,
+        }
+        version_path = os.path.join(quantized_path, index.stats()["version"])
+        chroma_size = directory_size(chroma_path)
+        quantized_size = directory_size(version_path)
+        sizes = {"chroma": chroma_size, "quantized": chroma_size + quantized_size}
+        for backend, path in (("chroma", chroma_path), ("quantized", quantized_path)):
+            measured = run_probe(backend, path, chroma_path, queries_path, args)
+            found = measured.pop("results")
+            recall = sum(
+                len(set(expected) & set(got)) / len(expected)
+                for expected, got in zip(truth, found) if expected
+            ) / len(truth)
+            results[backend] = {
+                "disk_mb": round(sizes[backend] / 1024 / 1024, 1),
+                f"recall@{args.top_k}": round(recall, 4),
+                **measured,
+            }
+        results["quantized"]["index_mb"] = round(quantized_size / 1024 / 1024, 1)
+        results["quantized"]["build_s"] = round(build_time, 2)
+        results["quantized"]["lists"] = index.stats()["lists"]
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the quantized vector index against Chroma")
+    parser.add_argument("--chroma-path", help="Use embeddings from this existing Chroma index")
+    parser.add_argument("--count", type=int, default=100000, help="Generated vectors")
+    parser.add_argument("--dim", type=int, default=384, help="Generated vector size")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=0, help="IVF lists (0: automatic)")
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--rescore", type=int, default=100)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--probe", choices=["chroma", "quantized"], help=argparse.SUPPRESS)
+    parser.add_argument("--probe-path", help=argparse.SUPPRESS)
+    parser.add_argument("--probe-chroma-path", help=argparse.SUPPRESS)
+    parser.add_argument("--probe-queries", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(probe(
+            args.probe, args.probe_path, args.probe_chroma_path, args.probe_queries, args.top_k, args.nprobe, args.rescore
+        )))
+        sys.exit(0)
+
+    results = main(args)
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
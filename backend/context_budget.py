@@ -0,0 +1,173 @@
+"""
+Compress retrieved context to a token budget before synthesis
+"""
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+from llama_index.core.schema import MetadataMode, NodeWithScore
+
+from lexical_index import tokenize
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+
+# Metadata worth showing the LLM; the rest (ids, and question/answer
+# previews that repeat the text) only costs tokens.
+_LLM_METADATA_KEYS = ("topic",)
+
+
+def _default_tokenizer() -> Callable[[str], List[Any]]:
+    try:
+        from llama_index.core.utils import get_tokenizer
+
+        return get_tokenizer()
+    except Exception as e:
+        logger.warning(f"Falling back to whitespace token counts: {e}")
+        return str.split
+
+
+def _split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_PATTERN.split(text) if sentence.strip()]
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ContextBudget:
+    """
+    Shrink the nodes passed to synthesis
+
+    Context that already fits the budget is passed through unchanged.
+    Otherwise, three steps, in order:
+    1. Drop chunks that are near-duplicates (by term-set Jaccard
+       similarity) of a higher-ranked chunk.
+    2. Score each sentence by how many query terms it contains, weighted by
+       how rare the term is across the retrieved context.
+    3. Keep the best-scoring sentences, across all chunks, then fill the
+       rest of the budget with the sentences that share no term with the
+       query (answers rarely repeat the question's words), in document
+       order. Each chunk is rebuilt from its kept sentences in their
+       original order.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 1024,
+        dedup_threshold: float = 0.85,
+        tokenizer: Optional[Callable[[str], List[Any]]] = None,
+    ):
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+        self._tokenizer = tokenizer or _default_tokenizer()
+
+    @classmethod
+    def from_env(cls) -> Optional["ContextBudget"]:
+        """Build a budget from CONTEXT_* environment variables, or None if disabled"""
+        if (os.getenv("CONTEXT_BUDGET_ENABLED") or "true").lower() in ("0", "false", "no"):
+            return None
+        return cls(
+            max_tokens=int(os.getenv("CONTEXT_TOKEN_BUDGET", "1024")),
+            dedup_threshold=float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.85")),
+        )
+
+    def count_tokens(self, text: str) -> int:
+        return len(self._tokenizer(text))
+
+    def _prompt_tokens(self, query_text: str, nodes: List[NodeWithScore]) -> int:
+        context = "\n\n".join(node.node.get_content(metadata_mode=MetadataMode.LLM) for node in nodes)
+        return self.count_tokens(context) + self.count_tokens(query_text)
+
+    def _dedupe(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        kept: List[Tuple[NodeWithScore, set]] = []
+        for node in nodes:
+            terms = set(tokenize(node.node.get_content()))
+            if any(_jaccard(terms, other) >= self.dedup_threshold for _, other in kept):
+                continue
+            kept.append((node, terms))
+        return [node for node, _ in kept]
+
+    def apply(
+        self, query_text: str, nodes: List[NodeWithScore]
+    ) -> Tuple[List[NodeWithScore], Dict[str, int]]:
+        """
+        Compress nodes to the token budget
+
+        Args:
+            query_text: User query
+            nodes: Selected nodes, best first
+
+        Returns:
+            The compressed nodes, and prompt token counts and node counts
+            before and after compression
+        """
+        tokens_before = self._prompt_tokens(query_text, nodes)
+        if tokens_before <= self.max_tokens:
+            return nodes, {
+                "prompt_tokens_before": tokens_before,
+                "prompt_tokens_after": tokens_before,
+                "nodes_before": len(nodes),
+                "nodes_after": len(nodes),
+            }
+        unique = self._dedupe(nodes)
+
+        sentences: List[Tuple[int, int, str, List[str]]] = []
+        for node_rank, node in enumerate(unique):
+            for position, sentence in enumerate(_split_sentences(node.node.get_content())):
+                sentences.append((node_rank, position, sentence, tokenize(sentence)))
+
+        # Rarer query terms count for more.
+        query_terms = set(tokenize(query_text))
+        frequency: Dict[str, int] = {}
+        for _, _, _, terms in sentences:
+            for term in set(terms) & query_terms:
+                frequency[term] = frequency.get(term, 0) + 1
+
+        def relevance(terms: List[str]) -> float:
+            return sum(1.0 / frequency[term] for term in set(terms) & query_terms)
+
+        scored = [(relevance(terms), node_rank, position, sentence)
+                  for node_rank, position, sentence, terms in sentences]
+        matching = sorted(
+            (item for item in scored if item[0] > 0),
+            key=lambda item: (-item[0], item[1], item[2])
+        )
+        rest = sorted(
+            (item for item in scored if item[0] <= 0),
+            key=lambda item: (item[1], item[2])
+        )
+        candidates = matching + rest
+
+        budget = self.max_tokens - self.count_tokens(query_text)
+        chosen: Dict[int, List[Tuple[int, str]]] = {}
+        for _, node_rank, position, sentence in candidates:
+            cost = self.count_tokens(sentence) + 1
+            if cost > budget:
+                continue
+            budget -= cost
+            chosen.setdefault(node_rank, []).append((position, sentence))
+
+        compressed = []
+        for node_rank, node in enumerate(unique):
+            if node_rank not in chosen:
+                continue
+            text = " ".join(sentence for _, sentence in sorted(chosen[node_rank]))
+            base = node.node.copy()
+            base.set_content(text)
+            base.excluded_llm_metadata_keys = [
+                key for key in base.metadata if key not in _LLM_METADATA_KEYS
+            ]
+            compressed.append(NodeWithScore(node=base, score=node.score))
+
+        return compressed, {
+            "prompt_tokens_before": tokens_before,
+            "prompt_tokens_after": self._prompt_tokens(query_text, compressed),
+            "nodes_before": len(nodes),
+            "nodes_after": len(compressed),
+        }
@@ -2,23 +2,84 @@
 Data loader for medical datasets from HuggingFace
 """
 import os
-from datasets import load_dataset
-from typing import List, Dict
+import json
+import hashlib
+from itertools import chain
+from datasets import Dataset, load_dataset
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import Callable, Dict, Iterator, List, Optional
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Bump when document preparation changes so cached Arrow files are rebuilt.
+LOADER_VERSION = 1
+
+
+def _truncate(value: str, max_len: int = 200) -> str:
+    if not value:
+        return ""
+    if len(value) <= max_len:
+        return value
+    return value[:max_len - 3] + "..."
+
+
+def _truncate_column(values: pa.ChunkedArray, max_len: int = 200) -> pa.ChunkedArray:
+    """Columnwise _truncate"""
+    shortened = pc.binary_join_element_wise(
+        pc.utf8_slice_codeunits(values, 0, max_len - 3), "...", ""
+    )
+    return pc.if_else(pc.greater(pc.utf8_length(values), max_len), shortened, values)
+
+
+def _string_column(batch: pa.Table, field: str) -> pa.ChunkedArray:
+    return pc.fill_null(pc.cast(batch.column(field), pa.string()), "")
+
+
+def _prepare_batch(
+    batch: pa.Table,
+    indices: List[int],
+    question_field: str,
+    answer_field: Optional[str],
+    dataset_name: str
+) -> pa.Table:
+    """Build document text and metadata columns for a batch of rows"""
+    questions = _string_column(batch, question_field)
+    if answer_field:
+        answers = _string_column(batch, answer_field)
+        text = pc.binary_join_element_wise(
+            "Question: ", questions, "\n\nAnswer: ", answers, ""
+        )
+    else:
+        answers = pa.chunked_array([pa.array([""] * len(questions), pa.string())])
+        text = questions
+
+    doc_ids = pc.binary_join_element_wise(
+        f"{dataset_name}_", pc.cast(pa.array(indices, pa.int64()), pa.string()), ""
+    )
+    return pa.table({
+        "text": text,
+        "doc_id": doc_ids,
+        "question": _truncate_column(questions),
+        "answer": _truncate_column(answers)
+    })
+
+
 class WikidocDataLoader:
     """Load and process medical data from HuggingFace"""
     
-    def __init__(self, dataset_name: str = None):
+    def __init__(self, dataset_name: str = None, cache_dir: str = None):
         self.dataset_name = dataset_name or os.getenv(
             "DATASET_NAME",
             "lavita/ChatDoctor-HealthCareMagic-100k"
         )
+        self.cache_dir = cache_dir or os.getenv("CACHE_DIR") or "./cache"
         self.dataset = None
+        self.question_field = None
+        self.answer_field = None
 
     def _detect_fields(self, item: Dict[str, str]):
         candidates = [
@@ -63,14 +124,6 @@ class WikidocDataLoader:
                 self.dataset = self.dataset.select(range(min(max_samples, len(self.dataset))))
             
             logger.info(f"Loaded {len(self.dataset)} samples")
-            
-            # Process documents
-            def _truncate(value: str, max_len: int = 200) -> str:
-                if not value:
-                    return ""
-                if len(value) <= max_len:
-                    return value
-                return value[:max_len - 3] + "..."
 
             if len(self.dataset) == 0:
                 return []
@@ -79,28 +132,10 @@ class WikidocDataLoader:
             if not question_field:
                 raise ValueError("Could not detect text fields in dataset items.")
 
-            documents = []
-            for idx, item in enumerate(self.dataset):
-                question_text = item.get(question_field, "")
-                answer_text = item.get(answer_field, "") if answer_field else ""
-
-                if answer_field:
-                    text = f"Question: {question_text}\n\nAnswer: {answer_text}"
-                else:
-                    text = question_text
-
-                documents.append({
-                    "text": text,
-                    "metadata": {
-                        "source": "huggingface",
-                        "dataset": self.dataset_name,
-                        "doc_id": f"{self.dataset_name}_{idx}",
-                        "question_field": question_field,
-                        "answer_field": answer_field or "",
-                        "question": _truncate(question_text),
-                        "answer": _truncate(answer_text)
-                    }
-                })
+            make_document = self._document_factory(question_field, answer_field)
+            documents = [
+                make_document(idx, item) for idx, item in enumerate(self.dataset)
+            ]
 
             # Add small curated set for common conditions to improve coverage.
             documents.extend(self._curated_documents())
@@ -112,11 +147,209 @@ class WikidocDataLoader:
             logger.error(f"Error loading dataset: {e}")
             raise
 
-    def _curated_documents(self) -> List[Dict[str, str]]:
-        curated = [
+    def iter_batches(
+        self,
+        split: str = "train",
+        max_samples: int = None,
+        batch_size: int = 256
+    ) -> Iterator[List[Dict[str, str]]]:
+        """
+        Stream the dataset as fixed-size batches of documents
+        
+        Rows are read with HuggingFace streaming and converted as they
+        arrive, so the whole split is never held in memory and peak memory
+        doesn't grow with max_samples. The curated documents come last.
+        
+        Args:
+            split: Dataset split to load (default: "train")
+            max_samples: Maximum number of samples to load (None for all)
+            batch_size: Documents per yielded batch
+            
+        Yields:
+            Lists of documents with text content
+        """
+        try:
+            logger.info(f"Streaming dataset: {self.dataset_name}")
+            stream = load_dataset(self.dataset_name, split=split, streaming=True)
+            if max_samples:
+                stream = stream.take(max_samples)
+
+            rows = iter(stream)
+            first = next(rows, None)
+            if first is not None:
+                question_field, answer_field = self._detect_fields(first)
+                if not question_field:
+                    raise ValueError("Could not detect text fields in dataset items.")
+
+                make_document = self._document_factory(question_field, answer_field)
+                batch = []
+                for idx, item in enumerate(chain([first], rows)):
+                    batch.append(make_document(idx, item))
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+
+            # Add small curated set for common conditions to improve coverage.
+            yield self._curated_documents()
+
+        except Exception as e:
+            logger.error(f"Error streaming dataset: {e}")
+            raise
+
+    def prepare_dataset(
+        self,
+        split: str = "train",
+        max_samples: int = None,
+        num_proc: int = None
+    ) -> Dataset:
+        """
+        Build document columns with batched Arrow operations and cache them
+        
+        The prepared columns (text, doc_id, question, answer) are written to
+        an Arrow file keyed on dataset name, split, fields, sample limit and
+        LOADER_VERSION. Repeat calls memory-map that file and skip
+        preprocessing entirely.
+        
+        Args:
+            split: Dataset split to load (default: "train")
+            max_samples: Maximum number of samples to load (None for all)
+            num_proc: Worker processes for preprocessing (default:
+                DATASET_NUM_PROC or all cores, only for large datasets)
+            
+        Returns:
+            Memory-mapped dataset of prepared documents
+        """
+        logger.info(f"Loading dataset: {self.dataset_name}")
+        dataset = load_dataset(self.dataset_name, split=split)
+        if max_samples:
+            dataset = dataset.select(range(min(max_samples, len(dataset))))
+
+        if len(dataset) == 0:
+            return dataset
+
+        question_field, answer_field = self._detect_fields(dataset[0])
+        if not question_field:
+            raise ValueError("Could not detect text fields in dataset items.")
+        self.question_field, self.answer_field = question_field, answer_field
+
+        key = json.dumps([
+            self.dataset_name, split, question_field, answer_field,
+            max_samples, LOADER_VERSION
+        ])
+        fingerprint = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_file = os.path.join(self.cache_dir, f"prepared_{fingerprint}.arrow")
+
+        if num_proc is None:
+            num_proc = int(os.getenv("DATASET_NUM_PROC") or os.cpu_count() or 1)
+        # Process start-up costs more than it saves on small datasets.
+        if len(dataset) < 10000:
+            num_proc = None
+
+        return dataset.with_format("arrow").map(
+            _prepare_batch,
+            batched=True,
+            batch_size=1000,
+            with_indices=True,
+            num_proc=num_proc,
+            fn_kwargs={
+                "question_field": question_field,
+                "answer_field": answer_field,
+                "dataset_name": self.dataset_name
+            },
+            remove_columns=dataset.column_names,
+            cache_file_name=cache_file,
+            load_from_cache_file=True,
+            desc="Preparing documents"
+        ).with_format(None)
+
+    def iter_prepared_batches(
+        self,
+        split: str = "train",
+        max_samples: int = None,
+        batch_size: int = 256
+    ) -> Iterator[List[Dict[str, str]]]:
+        """
+        Yield batches of documents from the cached Arrow preparation
+        
+        Args:
+            split: Dataset split to load (default: "train")
+            max_samples: Maximum number of samples to load (None for all)
+            batch_size: Documents per yielded batch
+            
+        Yields:
+            Lists of documents with text content
+        """
+        try:
+            prepared = self.prepare_dataset(split=split, max_samples=max_samples)
+            if len(prepared) > 0:
+                logger.info(f"Prepared {len(prepared)} samples")
+                answer_field = self.answer_field or ""
+                for batch in prepared.iter(batch_size=batch_size):
+                    yield [
+                        {
+                            "text": text,
+                            "metadata": {
+                                "source": "huggingface",
+                                "dataset": self.dataset_name,
+                                "doc_id": doc_id,
+                                "question_field": self.question_field,
+                                "answer_field": answer_field,
+                                "question": question,
+                                "answer": answer
+                            }
+                        }
+                        for text, doc_id, question, answer in zip(
+                            batch["text"], batch["doc_id"], batch["question"], batch["answer"]
+                        )
+                    ]
+
+            # Add small curated set for common conditions to improve coverage.
+            yield self._curated_documents()
+
+        except Exception as e:
+            logger.error(f"Error preparing dataset: {e}")
+            raise
+
+    def _document_factory(
+        self, question_field: str, answer_field: Optional[str]
+    ) -> Callable[[int, Dict[str, str]], Dict[str, str]]:
+        """Build the function that turns one dataset row into a document"""
+        dataset_name = self.dataset_name
+        answer_field_name = answer_field or ""
+
+        def make_document(idx: int, item: Dict[str, str]) -> Dict[str, str]:
+            question_text = item.get(question_field) or ""
+            answer_text = (item.get(answer_field) or "") if answer_field else ""
+
+            if answer_field:
+                text = f"Question: {question_text}\n\nAnswer: {answer_text}"
+            else:
+                text = question_text
+
+            return {
+                "text": text,
+                "metadata": {
+                    "source": "huggingface",
+                    "dataset": dataset_name,
+                    "doc_id": f"{dataset_name}_{idx}",
+                    "question_field": question_field,
+                    "answer_field": answer_field_name,
+                    "question": _truncate(question_text),
+                    "answer": _truncate(answer_text)
+                }
+            }
+
+        return make_document
+
+    def _curated_topics(self) -> List[Dict[str, str]]:
+        return [
             {
                 "id": "flu_symptoms",
                 "title": "Flu symptoms overview",
+                "question": "What are the symptoms of the flu?",
                 "text": (
                     "Common flu symptoms include fever or chills, cough, sore throat, "
                     "runny or stuffy nose, muscle or body aches, headaches, fatigue, "
@@ -126,6 +359,7 @@ class WikidocDataLoader:
             {
                 "id": "flu_when_seek_help",
                 "title": "Flu when to seek care",
+                "question": "When should I see a doctor for the flu?",
                 "text": (
                     "Seek medical care for flu if you have trouble breathing, chest "
                     "pain, persistent dizziness, confusion, severe weakness, or if "
@@ -135,6 +369,7 @@ class WikidocDataLoader:
             {
                 "id": "cold_vs_flu",
                 "title": "Cold vs flu basics",
+                "question": "What is the difference between a cold and the flu?",
                 "text": (
                     "Colds usually start gradually with milder symptoms like sneezing "
                     "and runny nose, while flu often starts suddenly with fever, "
@@ -144,6 +379,7 @@ class WikidocDataLoader:
             {
                 "id": "fever_overview",
                 "title": "Fever basics",
+                "question": "What is a fever and how do I treat it?",
                 "text": (
                     "Fever is a body temperature higher than normal, commonly above "
                     "100.4 F (38 C). It can occur with infections and usually improves "
@@ -153,6 +389,7 @@ class WikidocDataLoader:
             {
                 "id": "hydration_tips",
                 "title": "Hydration tips",
+                "question": "How do I stay hydrated when I am sick?",
                 "text": (
                     "For viral illnesses, rest and hydration can help recovery. "
                     "Drink water or oral rehydration fluids, and monitor for signs "
@@ -162,6 +399,7 @@ class WikidocDataLoader:
             {
                 "id": "sore_throat_home_care",
                 "title": "Sore throat home care",
+                "question": "How can I treat a sore throat at home?",
                 "text": (
                     "Home care for a mild sore throat: warm fluids, honey in tea "
                     "(avoid in children under 1 year), saltwater gargles, throat "
@@ -172,6 +410,7 @@ class WikidocDataLoader:
             {
                 "id": "cough_home_care",
                 "title": "Cough home care",
+                "question": "How can I treat a cough at home?",
                 "text": (
                     "For a mild cough: stay hydrated, use warm drinks, honey for adults "
                     "and children over 1 year, and consider humidified air. Seek care "
@@ -182,6 +421,7 @@ class WikidocDataLoader:
             {
                 "id": "runny_nose_home_care",
                 "title": "Runny nose home care",
+                "question": "How can I treat a runny or stuffy nose at home?",
                 "text": (
                     "For runny or stuffy nose: saline nasal spray or rinse, steam "
                     "inhalation, fluids, and rest. Seek care if severe sinus pain, "
@@ -191,6 +431,7 @@ class WikidocDataLoader:
             {
                 "id": "headache_home_care",
                 "title": "Headache home care",
+                "question": "How can I relieve a headache at home?",
                 "text": (
                     "For mild headaches: rest in a quiet room, hydrate, apply a cool "
                     "or warm compress, and avoid triggers. Seek care for sudden severe "
@@ -200,6 +441,7 @@ class WikidocDataLoader:
             {
                 "id": "indigestion_home_care",
                 "title": "Indigestion home care",
+                "question": "How can I relieve indigestion at home?",
                 "text": (
                     "For indigestion: eat smaller meals, avoid lying down after eating, "
                     "limit spicy or fatty foods, and sip water. Seek care if severe "
@@ -209,6 +451,7 @@ class WikidocDataLoader:
             {
                 "id": "constipation_home_care",
                 "title": "Constipation home care",
+                "question": "How can I relieve constipation at home?",
                 "text": (
                     "For constipation: drink water, increase fiber (fruits, vegetables, "
                     "whole grains), and stay active. Seek care if severe pain, blood "
@@ -218,6 +461,7 @@ class WikidocDataLoader:
             {
                 "id": "nausea_home_care",
                 "title": "Mild nausea home care",
+                "question": "How can I relieve nausea at home?",
                 "text": (
                     "For mild nausea: small sips of water, bland foods like crackers, "
                     "ginger tea, and rest. Seek care if persistent vomiting, signs of "
@@ -227,6 +471,7 @@ class WikidocDataLoader:
             {
                 "id": "diarrhea_home_care",
                 "title": "Mild diarrhea home care",
+                "question": "How can I treat mild diarrhea at home?",
                 "text": (
                     "For mild diarrhea: oral rehydration fluids, bland foods, and rest. "
                     "Avoid dairy and fatty foods for a day or two. Seek care for blood "
@@ -236,6 +481,7 @@ class WikidocDataLoader:
             {
                 "id": "muscle_strain_home_care",
                 "title": "Muscle strain home care",
+                "question": "How do I treat a muscle strain at home?",
                 "text": (
                     "For a mild muscle strain: rest the area, apply ice for 10-20 minutes "
                     "several times daily for the first 48 hours, then heat as needed. "
@@ -245,6 +491,7 @@ class WikidocDataLoader:
             {
                 "id": "minor_burns_home_care",
                 "title": "Minor burn home care",
+                "question": "How do I treat a minor burn at home?",
                 "text": (
                     "For minor burns: cool the area under running water for several minutes, "
                     "cover with a clean non-stick dressing, and avoid breaking blisters. "
@@ -254,6 +501,7 @@ class WikidocDataLoader:
             {
                 "id": "insect_bite_home_care",
                 "title": "Insect bite home care",
+                "question": "How do I treat an insect bite?",
                 "text": (
                     "For insect bites: wash with soap and water, apply a cold compress, "
                     "and avoid scratching. Seek care for spreading redness, fever, or "
@@ -263,6 +511,7 @@ class WikidocDataLoader:
             {
                 "id": "seasonal_allergies_home_care",
                 "title": "Seasonal allergies home care",
+                "question": "How can I manage seasonal allergies at home?",
                 "text": (
                     "For seasonal allergies: rinse nasal passages with saline, keep windows "
                     "closed during high pollen, and shower after being outside. Seek care "
@@ -272,6 +521,7 @@ class WikidocDataLoader:
             {
                 "id": "mild_rash_home_care",
                 "title": "Mild rash home care",
+                "question": "How can I treat a mild rash at home?",
                 "text": (
                     "For a mild rash: keep skin clean and dry, avoid new products, and use "
                     "cool compresses. Seek care if rash spreads rapidly, is painful, "
@@ -281,6 +531,7 @@ class WikidocDataLoader:
             {
                 "id": "oral_cold_sore_home_care",
                 "title": "Cold sore home care",
+                "question": "How do I treat a cold sore?",
                 "text": (
                     "For cold sores: keep the area clean, avoid picking, and use cold "
                     "compresses for discomfort. Seek care if sores are severe, frequent, "
@@ -290,6 +541,7 @@ class WikidocDataLoader:
             {
                 "id": "earache_home_care",
                 "title": "Mild earache home care",
+                "question": "How can I relieve a mild earache at home?",
                 "text": (
                     "For mild ear discomfort: warm compresses and rest may help. Seek care "
                     "if severe pain, fever, drainage from the ear, or symptoms in young "
@@ -298,8 +550,17 @@ class WikidocDataLoader:
             },
         ]
 
+    def curated_questions(self) -> List[str]:
+        """The typical question for each curated home-care topic"""
+        return [item["question"] for item in self._curated_topics()]
+
+    def curated_document_count(self) -> int:
+        """Number of curated documents added to every build"""
+        return len(self._curated_topics())
+
+    def _curated_documents(self) -> List[Dict[str, str]]:
         documents: List[Dict[str, str]] = []
-        for item in curated:
+        for item in self._curated_topics():
             documents.append({
                 "text": f"{item['title']}\n\n{item['text']}",
                 "metadata": {
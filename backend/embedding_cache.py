@@ -0,0 +1,265 @@
+"""
+Exact-match embedding cache shared by the query and ingestion paths
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import logging
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Bounded in-memory LRU of embeddings backed by a SQLite file
+
+    Keys are hashes of (model name, kind, normalized text), so the same
+    file can be shared between embedding models without collisions.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, "
+            "embedding BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    @classmethod
+    def from_env(cls, cache_dir: str) -> Optional["EmbeddingCache"]:
+        """Build a cache from EMBEDDING_CACHE_* environment variables, or None if disabled"""
+        if (os.getenv("EMBEDDING_CACHE_ENABLED") or "true").lower() in ("0", "false", "no"):
+            return None
+        os.makedirs(cache_dir, exist_ok=True)
+        return cls(
+            path=os.path.join(cache_dir, "embeddings.sqlite3"),
+            max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000")),
+        )
+
+    @staticmethod
+    def make_key(model_name: str, kind: str, text: str) -> str:
+        """Cache key for a text; queries are also case-folded"""
+        normalized = " ".join(text.split())
+        if kind == "query":
+            normalized = normalized.casefold()
+        return hashlib.sha256(f"{model_name}\0{kind}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, embedding: List[float]) -> None:
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Look up embeddings, checking memory first and then disk"""
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            pending = []
+            for key in dict.fromkeys(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self._memory_hits += 1
+                else:
+                    pending.append(key)
+
+            # Stay under SQLite's bound-parameter limit.
+            for start in range(0, len(pending), 500):
+                chunk = pending[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    embedding = np.frombuffer(blob, dtype=np.float32).tolist()
+                    found[key] = embedding
+                    self._remember(key, embedding)
+                    self._disk_hits += 1
+
+            self._misses += len([key for key in pending if key not in found])
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        """Store embeddings in memory and on disk"""
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, embedding) VALUES (?, ?)",
+                [
+                    (key, np.asarray(embedding, dtype=np.float32).tobytes())
+                    for key, embedding in items.items()
+                ],
+            )
+            self._conn.commit()
+            for key, embedding in items.items():
+                self._remember(key, embedding)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit counts since startup"""
+        with self._lock:
+            lookups = self._memory_hits + self._disk_hits + self._misses
+            hits = self._memory_hits + self._disk_hits
+            return {
+                "memory_entries": len(self._memory),
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _embed_queries_uncached(model: BaseEmbedding, queries: List[str]) -> List[List[float]]:
+    """
+    Embed several queries in batched model calls where the model allows it
+
+    OpenAI query and text embeddings share an engine for current models, and
+    HuggingFace query embeddings are text embeddings of the query with its
+    instruction prepended, so both can use the batched text path. Other
+    models get one call per query.
+    """
+    if not queries:
+        return []
+    query_engine = getattr(model, "_query_engine", None)
+    if query_engine is not None and query_engine == getattr(model, "_text_engine", None):
+        embed = model._get_text_embeddings
+    elif hasattr(model, "query_instruction") and hasattr(model, "_embed"):
+        try:
+            from llama_index.embeddings.huggingface.utils import format_query
+        except ImportError:
+            return [model._get_query_embedding(query) for query in queries]
+        queries = [format_query(query, model.model_name, model.query_instruction) for query in queries]
+        embed = model._embed
+    else:
+        return [model._get_query_embedding(query) for query in queries]
+
+    embeddings: List[List[float]] = []
+    for start in range(0, len(queries), model.embed_batch_size):
+        embeddings.extend(embed(queries[start:start + model.embed_batch_size]))
+    return embeddings
+
+
+def embed_queries(model: BaseEmbedding, queries: List[str]) -> List[List[float]]:
+    """
+    Embed several queries at once, using the embedding cache when present
+
+    Args:
+        model: Embedding model, optionally wrapped in CachedEmbedding
+        queries: Query texts
+
+    Returns:
+        One embedding per query, in order
+    """
+    if isinstance(model, CachedEmbedding):
+        return model.get_query_embedding_batch(queries)
+    return _embed_queries_uncached(model, queries)
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embedding model wrapper that serves repeated texts from an EmbeddingCache"""
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, cache: EmbeddingCache, **kwargs: Any):
+        super().__init__(
+            model_name=inner.model_name,
+            embed_batch_size=inner.embed_batch_size,
+            **kwargs
+        )
+        self._inner = inner
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        """The wrapped embedding model"""
+        return self._inner
+
+    def _lookup(self, kind: str, texts: List[str]):
+        keys = [EmbeddingCache.make_key(self.model_name, kind, text) for text in texts]
+        found = self._cache.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        return keys, found, missing
+
+    def _embed(
+        self,
+        kind: str,
+        texts: List[str],
+        compute: Callable[[List[str]], List[List[float]]]
+    ) -> List[List[float]]:
+        keys, found, missing = self._lookup(kind, texts)
+        if missing:
+            computed = compute([texts[i] for i in missing])
+            new_items = {keys[i]: embedding for i, embedding in zip(missing, computed)}
+            self._cache.put_many(new_items)
+            found.update(new_items)
+        return [found[key] for key in keys]
+
+    async def _aembed(
+        self,
+        kind: str,
+        texts: List[str],
+        compute: Callable[[List[str]], Awaitable[List[List[float]]]]
+    ) -> List[List[float]]:
+        keys, found, missing = self._lookup(kind, texts)
+        if missing:
+            computed = await compute([texts[i] for i in missing])
+            new_items = {keys[i]: embedding for i, embedding in zip(missing, computed)}
+            self._cache.put_many(new_items)
+            found.update(new_items)
+        return [found[key] for key in keys]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(
+            "query", [query],
+            lambda texts: [self._inner._get_query_embedding(text) for text in texts]
+        )[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        async def compute(texts: List[str]) -> List[List[float]]:
+            return [await self._inner._aget_query_embedding(text) for text in texts]
+
+        return (await self._aembed("query", [query], compute))[0]
+
+    def get_query_embedding_batch(self, queries: List[str]) -> List[List[float]]:
+        """Embed several queries, computing only the cache misses in batches"""
+        return self._embed(
+            "query", queries,
+            lambda texts: _embed_queries_uncached(self._inner, texts)
+        )
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed("text", texts, self._inner._get_text_embeddings)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self._aembed("text", texts, self._inner._aget_text_embeddings)
@@ -0,0 +1,54 @@
+"""
+Deterministic feature-hashing embedding for benchmarks and offline tests
+"""
+import re
+import zlib
+from typing import List
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class HashEmbedding(BaseEmbedding):
+    """
+    Embed text by hashing its words and word pairs into a fixed-size vector
+
+    Needs no model weights or network and gives the same vector for the
+    same text in every process, so index builds and retrieval can be
+    benchmarked reproducibly. Texts sharing words end up close together,
+    which is enough for retrieval to return sensible neighbours, but this is
+    not a semantic model. Select it with EMBEDDING_PROVIDER=hash.
+    """
+
+    dim: int = 384
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        tokens = _TOKEN_PATTERN.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            # crc32 rather than hash(), which is salted per process.
+            hashed = zlib.crc32(feature.encode("utf-8"))
+            vector[hashed % self.dim] += 1.0 if hashed & 0x80000000 else -1.0
+        norm = float(np.linalg.norm(vector))
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
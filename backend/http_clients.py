@@ -0,0 +1,129 @@
+"""
+Shared, pooled HTTP clients for LLM and embedding API calls
+"""
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, TypeVar
+import logging
+
+import httpx
+
+from metrics import REGISTRY
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+HEDGED_CALLS = REGISTRY.counter(
+    "rag_hedged_calls_total", "LLM calls that were slow enough to send a second, hedged copy",
+    ("winner",)
+)
+
+# One sync and one async client per process; forked workers make their own.
+_clients: Dict[Any, Any] = {}
+_lock = threading.Lock()
+
+
+def _use_http2() -> bool:
+    if (os.getenv("LLM_HTTP2") or "true").lower() in ("0", "false", "no"):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.info("HTTP/2 needs the h2 package (pip install 'httpx[http2]'); using HTTP/1.1")
+        return False
+    return True
+
+
+def _client_options() -> Dict[str, Any]:
+    """Pool limits, keep-alive and timeouts from LLM_* environment variables"""
+    return {
+        "limits": httpx.Limits(
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "512")),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", "128")),
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30")),
+        ),
+        "timeout": httpx.Timeout(
+            float(os.getenv("LLM_TIMEOUT", "120")),
+            connect=float(os.getenv("LLM_CONNECT_TIMEOUT", "10")),
+        ),
+        "http2": _use_http2(),
+    }
+
+
+def _shared(kind: str, factory: Callable[..., Any]) -> Any:
+    key = (kind, os.getpid())
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = factory(**_client_options())
+        return client
+
+
+def sync_client() -> httpx.Client:
+    """The process's pooled client for blocking API calls"""
+    return _shared("sync", httpx.Client)
+
+
+def async_client() -> httpx.AsyncClient:
+    """
+    The process's pooled client for async API calls
+
+    Hundreds of calls can be in flight at once, limited by
+    LLM_MAX_CONNECTIONS (and multiplexed over fewer connections with
+    HTTP/2).
+    """
+    return _shared("async", httpx.AsyncClient)
+
+
+async def aclose() -> None:
+    """Close this process's clients, e.g. on server shutdown"""
+    with _lock:
+        clients = [
+            _clients.pop(key) for key in list(_clients) if key[1] == os.getpid()
+        ]
+    for client in clients:
+        if isinstance(client, httpx.AsyncClient):
+            await client.aclose()
+        else:
+            client.close()
+
+
+async def hedged(call: Callable[[], Awaitable[T]], delay: float) -> T:
+    """
+    Await call(), sending a second identical call if the first is slow
+
+    If the first call hasn't finished after delay seconds, a copy is
+    started and whichever succeeds first is returned; the other is
+    cancelled. This trims tail latency from slow replicas or stalled
+    connections at the cost of occasional duplicate work.
+
+    Args:
+        call: Starts the call; invoked once or twice
+        delay: Seconds before hedging; 0 disables it
+    """
+    if delay <= 0:
+        return await call()
+
+    tasks: List["asyncio.Task[T]"] = [asyncio.ensure_future(call())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return tasks[0].result()
+
+        tasks.append(asyncio.ensure_future(call()))
+        pending = set(tasks)
+        error: BaseException = RuntimeError("hedged call did not finish")
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    HEDGED_CALLS.inc(winner="first" if task is tasks[0] else "second")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
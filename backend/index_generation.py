@@ -0,0 +1,121 @@
+"""
+Index generation counter and file locks shared by worker processes
+"""
+import json
+import os
+import time
+from typing import Any, Dict
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: single worker only, locks are no-ops
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class FileLock:
+    """
+    Exclusive lock on a file, held across processes
+
+    Uses flock, so the lock is released automatically if the holding
+    process dies.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Take the lock
+
+        Returns:
+            False if blocking is off and another holder has it
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        lock_file = open(self.path, "a")
+        if fcntl is not None:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(lock_file, flags)
+            except BlockingIOError:
+                lock_file.close()
+                return False
+        self._file = lock_file
+        return True
+
+    def release(self) -> None:
+        lock_file, self._file = self._file, None
+        if lock_file is not None:
+            lock_file.close()
+
+    def locked(self) -> bool:
+        """Whether anyone, including this process, holds the lock"""
+        probe = FileLock(self.path)
+        if not probe.acquire(blocking=False):
+            return True
+        probe.release()
+        return self._file is not None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.release()
+
+
+class IndexGeneration:
+    """
+    Counter bumped every time the index is rebuilt or reset
+
+    Each worker remembers the generation it has loaded and compares it with
+    the shared file to notice changes made by other workers. Bumps are
+    serialized with a file lock and written atomically, so readers never
+    see a partial file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = FileLock(f"{path}.lock")
+
+    def read(self) -> Dict[str, Any]:
+        """The current generation, the event that produced it and when"""
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable index generation file: {e}")
+        return {"generation": 0, "event": None, "updated_at": None}
+
+    def bump(self, event: str) -> int:
+        """
+        Start a new generation
+
+        Args:
+            event: What changed the index ("build" or "reset")
+
+        Returns:
+            The new generation number
+        """
+        with self._lock:
+            generation = self.read()["generation"] + 1
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    "generation": generation,
+                    "event": event,
+                    "updated_at": time.time(),
+                }, f)
+            os.replace(tmp_path, self.path)
+        logger.info(f"Index generation {generation} ({event})")
+        return generation
+
+    def current(self) -> int:
+        return self.read()["generation"]
+
@@ -0,0 +1,192 @@
+"""
+Batched, concurrent embedding pipeline for index builds
+"""
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, List, Optional
+import logging
+
+from llama_index.core.schema import BaseNode, MetadataMode
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying with backoff: rate limits and transient API failures.
+_RETRYABLE_ERRORS = (
+    "RateLimitError",
+    "APITimeoutError",
+    "APIConnectionError",
+    "InternalServerError",
+)
+
+_CLOSE = object()
+
+
+def _retry_delay(error: Exception, attempt: int, base_delay: float) -> float:
+    """Backoff delay, honouring a Retry-After header when the API sends one"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return base_delay * (2 ** attempt) * (0.5 + random.random())
+
+
+class IngestionPipeline:
+    """
+    Embed nodes in concurrent batches and write them to a vector store
+
+    Each submitted group of nodes is split into embedding batches that run
+    on a thread pool, while a writer thread adds finished groups to the
+    vector store in submission order. Writing overlaps with embedding of
+    later groups, and the number of groups in flight is bounded so memory
+    stays flat on large builds.
+    """
+
+    def __init__(
+        self,
+        embed_model: Any,
+        vector_store: Any,
+        embed_batch_size: int = 64,
+        concurrency: int = 4,
+        max_retries: int = 6,
+        retry_base_delay: float = 1.0,
+        sort_by_length: bool = False,
+        max_pending: Optional[int] = None,
+    ):
+        self.embed_model = embed_model
+        self.vector_store = vector_store
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.sort_by_length = sort_by_length
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="embed"
+        )
+        self._pending: "queue.Queue" = queue.Queue(maxsize=max_pending or self.concurrency * 2)
+        self._completed: "queue.Queue" = queue.Queue()
+        self._error: Optional[Exception] = None
+        self._written = 0
+        self._writer = threading.Thread(target=self._write_loop, name="ingest-writer", daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def from_env(cls, embed_model: Any, vector_store: Any, provider: str) -> "IngestionPipeline":
+        """
+        Build a pipeline from EMBED_* environment variables
+
+        Batches use the embed model's own batch size. Hosted providers
+        default to several concurrent requests; local models default to one
+        length-sorted batch at a time, since the model itself already uses
+        every CPU core.
+        """
+        local = provider != "openai"
+        return cls(
+            embed_model=embed_model,
+            vector_store=vector_store,
+            embed_batch_size=embed_model.embed_batch_size,
+            concurrency=int(os.getenv("EMBED_CONCURRENCY", "1" if local else "4")),
+            max_retries=int(os.getenv("EMBED_MAX_RETRIES", "6")),
+            sort_by_length=local,
+        )
+
+    @property
+    def nodes_written(self) -> int:
+        return self._written
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                return self.embed_model.get_text_embedding_batch(texts)
+            except Exception as e:
+                if type(e).__name__ not in _RETRYABLE_ERRORS or attempt >= self.max_retries:
+                    raise
+                delay = _retry_delay(e, attempt, self.retry_base_delay)
+                logger.warning(f"Embedding batch failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    def submit(self, nodes: List[BaseNode], tag: Any = None) -> None:
+        """
+        Queue nodes for embedding and writing
+
+        Blocks while too many groups are in flight.
+
+        Args:
+            nodes: Nodes without embeddings
+            tag: Returned by completed() once these nodes are written
+        """
+        self._raise_if_failed()
+        if self.sort_by_length:
+            # Similar lengths in a batch means less padding for local models.
+            order = sorted(nodes, key=lambda node: len(node.get_content()))
+        else:
+            order = list(nodes)
+
+        futures: List[Future] = []
+        for start in range(0, len(order), self.embed_batch_size):
+            batch = order[start:start + self.embed_batch_size]
+            texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+            futures.append(self._executor.submit(self._embed_batch, texts))
+
+        self._pending.put((tag, order, futures))
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._pending.get()
+            if item is _CLOSE:
+                return
+            tag, nodes, futures = item
+            if self._error is not None:
+                for future in futures:
+                    future.cancel()
+                continue
+            try:
+                embeddings: List[List[float]] = []
+                for future in futures:
+                    embeddings.extend(future.result())
+                for node, embedding in zip(nodes, embeddings):
+                    node.embedding = embedding
+                if nodes:
+                    self.vector_store.add(nodes)
+                self._written += len(nodes)
+                self._completed.put(tag)
+            except Exception as e:
+                logger.error(f"Ingestion pipeline failed: {e}")
+                self._error = e
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def completed(self) -> List[Any]:
+        """Tags of submitted groups that have been written since the last call"""
+        tags = []
+        while True:
+            try:
+                tags.append(self._completed.get_nowait())
+            except queue.Empty:
+                return tags
+
+    def close(self, raise_errors: bool = True) -> None:
+        """
+        Wait for everything submitted to be written and stop the workers
+
+        Args:
+            raise_errors: Re-raise the first embedding or write error
+        """
+        self._pending.put(_CLOSE)
+        self._writer.join()
+        self._executor.shutdown(wait=True)
+        if raise_errors:
+            self._raise_if_failed()
@@ -0,0 +1,316 @@
+"""
+Background index build jobs with progress reporting and cancellation
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+from index_generation import FileLock
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation has been requested"""
+
+
+class JobConflict(Exception):
+    """Raised when a job is submitted while another one is still active"""
+
+
+class IngestionJob:
+    """State and progress of one background index build"""
+
+    def __init__(self, job_id: str, params: Dict[str, Any], state_dir: Optional[str] = None):
+        self.id = job_id
+        self.state_dir = state_dir
+        self.params = params
+        self.status = "queued"
+        self.phase = "queued"
+        self.docs_total: Optional[int] = None
+        self.docs_processed = 0
+        self.docs_embedded = 0
+        self.errors: List[str] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.indexing_started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def cancel(self) -> None:
+        """Ask the job to stop at the next checkpoint"""
+        self._cancel.set()
+
+    def check_cancelled(self) -> None:
+        """Raise JobCancelled if cancellation has been requested, here or by another worker"""
+        if self.state_dir and os.path.exists(_cancel_path(self.state_dir, self.id)):
+            self._cancel.set()
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.id} cancelled")
+
+    def set_phase(self, phase: str) -> None:
+        with self._lock:
+            self.phase = phase
+            if phase == "indexing" and self.indexing_started_at is None:
+                self.indexing_started_at = time.time()
+        logger.info(f"Job {self.id}: {phase}")
+        self.save()
+
+    def update(
+        self,
+        docs_processed: Optional[int] = None,
+        docs_embedded: Optional[int] = None,
+        docs_total: Optional[int] = None
+    ) -> None:
+        with self._lock:
+            if docs_processed is not None:
+                self.docs_processed = docs_processed
+            if docs_embedded is not None:
+                self.docs_embedded = docs_embedded
+            if docs_total is not None:
+                self.docs_total = docs_total
+        self.save()
+
+    def save(self) -> None:
+        """Write a status snapshot that other workers can serve"""
+        if not self.state_dir:
+            return
+        path = _state_path(self.state_dir, self.id)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({**self.to_dict(), "created_at": self.created_at}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not save job {self.id} state: {e}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            indexing_elapsed = (
+                end - self.indexing_started_at if self.indexing_started_at else 0.0
+            )
+
+            docs_per_sec = None
+            eta_seconds = None
+            if indexing_elapsed > 0 and self.docs_processed:
+                docs_per_sec = self.docs_processed / indexing_elapsed
+                if self.docs_total and self.active:
+                    remaining = max(0, self.docs_total - self.docs_processed)
+                    eta_seconds = round(remaining / docs_per_sec, 1)
+
+            return {
+                "id": self.id,
+                "status": self.status,
+                "phase": self.phase,
+                "params": self.params,
+                "docs_total": self.docs_total,
+                "docs_processed": self.docs_processed,
+                "docs_embedded": self.docs_embedded,
+                "docs_per_sec": round(docs_per_sec, 2) if docs_per_sec else None,
+                "eta_seconds": eta_seconds,
+                "elapsed_seconds": round(elapsed, 1),
+                "errors": list(self.errors),
+                "result": self.result,
+            }
+
+
+def _state_path(state_dir: str, job_id: str) -> str:
+    return os.path.join(state_dir, f"{job_id}.json")
+
+
+def _cancel_path(state_dir: str, job_id: str) -> str:
+    return os.path.join(state_dir, f"{job_id}.cancel")
+
+
+class StoredJob:
+    """A job run by another worker process, read from its status snapshot"""
+
+    def __init__(self, state: Dict[str, Any], state_dir: str):
+        self.state = state
+        self.state_dir = state_dir
+
+    @property
+    def id(self) -> str:
+        return self.state["id"]
+
+    @property
+    def status(self) -> str:
+        return self.state["status"]
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    @property
+    def created_at(self) -> float:
+        return self.state.get("created_at", 0.0)
+
+    def cancel(self) -> None:
+        """Ask the owning worker to stop the job at its next checkpoint"""
+        with open(_cancel_path(self.state_dir, self.id), "w"):
+            pass
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: value for key, value in self.state.items() if key != "created_at"}
+
+
+class JobManager:
+    """
+    Run index builds one at a time on a background thread
+
+    With a state_dir, builds are also exclusive across worker processes
+    (through a file lock), and job status and cancellation work from any
+    worker through snapshot files in that directory.
+    """
+
+    def __init__(self, max_history: int = 20, state_dir: Optional[str] = None):
+        self.max_history = max_history
+        self.state_dir = state_dir
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_lock: Optional[FileLock] = None
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+            self._build_lock = FileLock(os.path.join(state_dir, "build.lock"))
+
+    def submit(
+        self,
+        fn: Callable[[IngestionJob], Dict[str, Any]],
+        params: Optional[Dict[str, Any]] = None
+    ) -> IngestionJob:
+        """
+        Start fn(job) on a background thread
+
+        Args:
+            fn: Build function; reports progress through the job and returns
+                a result dict
+            params: Parameters to show in the job status
+
+        Raises:
+            JobConflict: If another job is still queued or running
+        """
+        with self._lock:
+            active = self.active_job()
+            if active is not None:
+                raise JobConflict(f"Job {active.id} is already {active.status}")
+            if self._build_lock and not self._build_lock.acquire(blocking=False):
+                raise JobConflict("An index build is running in another worker")
+
+            job = IngestionJob(uuid.uuid4().hex, params or {}, state_dir=self.state_dir)
+            self._jobs[job.id] = job
+            job.save()
+            while len(self._jobs) > self.max_history:
+                oldest_id = next(iter(self._jobs))
+                if self._jobs[oldest_id].active:
+                    break
+                self._jobs.pop(oldest_id)
+            self._prune_stored()
+
+        thread = threading.Thread(
+            target=self._run, args=(job, fn), name=f"job-{job.id[:8]}", daemon=True
+        )
+        thread.start()
+        return job
+
+    def _run(self, job: IngestionJob, fn: Callable[[IngestionJob], Dict[str, Any]]) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.check_cancelled()
+            job.result = fn(job)
+            job.status = "completed"
+            job.set_phase("done")
+        except JobCancelled:
+            job.status = "cancelled"
+            job.set_phase("cancelled")
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            job.errors.append(str(e))
+            job.status = "failed"
+            job.set_phase("failed")
+        finally:
+            job.finished_at = time.time()
+            job.save()
+            if self._build_lock:
+                self._build_lock.release()
+            if self.state_dir:
+                try:
+                    os.remove(_cancel_path(self.state_dir, job.id))
+                except FileNotFoundError:
+                    pass
+
+    def _prune_stored(self) -> None:
+        """Delete snapshots beyond max_history, oldest first"""
+        if not self.state_dir:
+            return
+        paths = [
+            os.path.join(self.state_dir, name)
+            for name in os.listdir(self.state_dir) if name.endswith(".json")
+        ]
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:-self.max_history]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _stored(self, job_id: str) -> Optional[StoredJob]:
+        if not self.state_dir:
+            return None
+        try:
+            with open(_state_path(self.state_dir, job_id)) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = StoredJob(state, self.state_dir)
+        # The owning worker died without finishing the job.
+        if job.active and not self._build_lock.locked():
+            state.update(status="interrupted", phase="interrupted")
+        return job
+
+    def get(self, job_id: str) -> Optional[Any]:
+        """A job of this worker, or of another worker if state is shared"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        # Job ids are uuid hex strings; anything else is not a state file.
+        if not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        return self._stored(job_id)
+
+    def list(self) -> List[Any]:
+        jobs: Dict[str, Any] = {}
+        if self.state_dir:
+            for name in os.listdir(self.state_dir):
+                if name.endswith(".json"):
+                    stored = self._stored(name[:-len(".json")])
+                    if stored is not None:
+                        jobs[stored.id] = stored
+        jobs.update(self._jobs)
+        ordered = sorted(jobs.values(), key=lambda job: job.created_at)
+        return ordered[-self.max_history:]
+
+    def active_job(self) -> Optional[Any]:
+        for job in self._jobs.values():
+            if job.active:
+                return job
+        if self._build_lock and self._build_lock.locked():
+            for job in self.list():
+                if job.active:
+                    return job
+        return None
@@ -0,0 +1,357 @@
+"""
+BM25 lexical index with memory-mapped postings on disk
+"""
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Words joined by "-" or "." stay together so drug names and ICD-style
+# codes (e.g. "beta-blocker", "e11.9") survive as single terms; their parts
+# are indexed as well.
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+_STOPWORDS = frozenset("""
+a about after all also an and any are as at be been before being but by can
+could did do does doing for from had has have having he her his how i if in
+into is it its may me might more most my no not of on or other our out over
+should so some such than that the their them then there these they this those
+through to too under up very was we were what when where which while who why
+will with would you your s t
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased terms of a text, without stopwords"""
+    terms = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        terms.append(token)
+        if "-" in token or "." in token:
+            terms.extend(part for part in re.split(r"[.\-]", token) if part not in _STOPWORDS)
+    return terms
+
+
+def _save_strings(path: str, name: str, strings: List[str]) -> None:
+    """Write strings as one UTF-8 blob and their offsets, for _StringTable"""
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    np.save(os.path.join(path, f"{name}.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(os.path.join(path, f"{name}_offsets.npy"), offsets)
+
+
+class _StringTable:
+    """
+    Memory-mapped list of strings written by _save_strings
+
+    Only the strings a lookup touches are paged in and decoded, so opening
+    a version costs the same however large its vocabulary is.
+    """
+
+    def __init__(self, path: str, name: str):
+        self.blob = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, f"{name}_offsets.npy"), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _bytes(self, number: int) -> bytes:
+        return self.blob[self.offsets[number]:self.offsets[number + 1]].tobytes()
+
+    def __getitem__(self, number: int) -> str:
+        return self._bytes(number).decode("utf-8")
+
+    def find(self, string: str) -> Optional[int]:
+        """Position of a string by binary search; the table must be sorted by UTF-8 bytes"""
+        target = string.encode("utf-8")
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self._bytes(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self) and self._bytes(low) == target:
+            return low
+        return None
+
+
+class _CompiledIndex:
+    """One immutable, memory-mapped version of the index"""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        # Terms sorted by their UTF-8 bytes; the postings of term number t
+        # are rows term_offsets[t]:term_offsets[t + 1].
+        self.terms = _StringTable(path, "terms")
+        self.term_offsets = np.load(os.path.join(path, "term_offsets.npy"), mmap_mode="r")
+        self.node_ids = _StringTable(path, "nodes")
+        self.postings = np.load(os.path.join(path, "postings.npy"), mmap_mode="r")
+        self.frequencies = np.load(os.path.join(path, "frequencies.npy"), mmap_mode="r")
+        self.lengths = np.load(os.path.join(path, "lengths.npy"), mmap_mode="r")
+        self.node_count = meta["node_count"]
+        self.avg_length = meta["avg_length"] or 1.0
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the same nodes as the vector collection
+
+    Term counts per node are staged in SQLite as documents are ingested, so
+    incremental builds only touch changed documents. compile() turns the
+    staged counts into postings arrays (node numbers and term frequencies,
+    grouped by term) that are memory-mapped for search, along with a sorted
+    term dictionary and the node ids, so nothing is read into memory up
+    front however large the index grows. Each compile writes
+    a new version directory and switches a CURRENT pointer, so searches on
+    the previous version are never disturbed.
+    """
+
+    def __init__(self, directory: str, k1: float = 1.5, b: float = 0.75):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, "staging.sqlite3"), check_same_thread=False, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS nodes ("
+            "node_id TEXT PRIMARY KEY, "
+            "document_id TEXT, "
+            "length INTEGER NOT NULL, "
+            "terms TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS nodes_document_id ON nodes (document_id)")
+        self._conn.commit()
+
+        self._index: Optional[_CompiledIndex] = None
+
+    @classmethod
+    def from_env(cls, cache_dir: str, name: str) -> Optional["LexicalIndex"]:
+        """Build an index from LEXICAL_INDEX_* / BM25_* environment variables, or None if disabled"""
+        if (os.getenv("LEXICAL_INDEX_ENABLED") or "true").lower() in ("0", "false", "no"):
+            return None
+        return cls(
+            directory=os.path.join(cache_dir, f"{name}_lexical"),
+            k1=float(os.getenv("BM25_K1", "1.5")),
+            b=float(os.getenv("BM25_B", "0.75")),
+        )
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    def add_texts(self, rows: Iterable[Tuple[str, Optional[str], str]]) -> None:
+        """
+        Stage nodes for the next compile
+
+        Args:
+            rows: (node_id, document_id, text) tuples
+        """
+        records = []
+        for node_id, document_id, text in rows:
+            terms = tokenize(text)
+            records.append((node_id, document_id, len(terms), json.dumps(Counter(terms))))
+        if not records:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO nodes (node_id, document_id, length, terms) "
+                "VALUES (?, ?, ?, ?)",
+                records,
+            )
+            self._conn.commit()
+
+    def add_nodes(self, nodes: Iterable[Any]) -> None:
+        """Stage LlamaIndex nodes for the next compile"""
+        self.add_texts((node.node_id, node.ref_doc_id, node.get_content()) for node in nodes)
+
+    def remove_documents(self, document_ids: List[str]) -> None:
+        """Unstage every node of the given documents"""
+        with self._lock:
+            for start in range(0, len(document_ids), 500):
+                chunk = document_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                self._conn.execute(
+                    f"DELETE FROM nodes WHERE document_id IN ({placeholders})", chunk
+                )
+            self._conn.commit()
+
+    def copy_from(self, other: "LexicalIndex") -> None:
+        """Replace the staged nodes with a copy of another index's, without retokenizing"""
+        with self._lock:
+            self._conn.execute("DELETE FROM nodes")
+            with other._lock:
+                cursor = other._conn.execute(
+                    "SELECT node_id, document_id, length, terms FROM nodes"
+                )
+                while True:
+                    rows = cursor.fetchmany(5000)
+                    if not rows:
+                        break
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO nodes (node_id, document_id, length, terms) "
+                        "VALUES (?, ?, ?, ?)",
+                        rows,
+                    )
+            self._conn.commit()
+
+    def staged_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+    def _current_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def load(self) -> bool:
+        """
+        Memory-map the current compiled version
+
+        Returns:
+            True if a compiled index was found
+        """
+        version = self._current_version()
+        if version is None:
+            return False
+        try:
+            self._index = _CompiledIndex(os.path.join(self.directory, version))
+            return True
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load lexical index {version}: {e}")
+            return False
+
+    def compile(self) -> None:
+        """Write the staged nodes as a new memory-mapped version and switch to it"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT node_id, length, terms FROM nodes ORDER BY node_id"
+            ).fetchall()
+
+        vocabulary: Dict[str, int] = {}
+        term_ids: List[int] = []
+        node_numbers: List[int] = []
+        frequencies: List[int] = []
+        node_ids = []
+        lengths = np.zeros(len(rows), dtype=np.int32)
+        for number, (node_id, length, terms) in enumerate(rows):
+            node_ids.append(node_id)
+            lengths[number] = length
+            for term, count in json.loads(terms).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                node_numbers.append(number)
+                frequencies.append(count)
+
+        # Number terms in sorted order and group postings by term; a stable
+        # sort keeps node order within a term.
+        terms = sorted(vocabulary, key=lambda term: term.encode("utf-8"))
+        rank = np.zeros(len(vocabulary), dtype=np.int32)
+        for number, term in enumerate(terms):
+            rank[vocabulary[term]] = number
+        term_array = rank[np.asarray(term_ids, dtype=np.int32)]
+        order = np.argsort(term_array, kind="stable")
+        postings = np.asarray(node_numbers, dtype=np.int32)[order]
+        frequency_array = np.asarray(frequencies, dtype=np.int32)[order]
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        term_offsets[1:] = np.cumsum(np.bincount(term_array, minlength=len(terms)))
+
+        previous = self._current_version()
+        version = f"v{int(previous[1:]) + 1}" if previous else "v1"
+        path = os.path.join(self.directory, version)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        np.save(os.path.join(path, "postings.npy"), postings)
+        np.save(os.path.join(path, "frequencies.npy"), frequency_array)
+        np.save(os.path.join(path, "lengths.npy"), lengths)
+        np.save(os.path.join(path, "term_offsets.npy"), term_offsets)
+        _save_strings(path, "terms", terms)
+        _save_strings(path, "nodes", node_ids)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({
+                "node_count": len(rows),
+                "avg_length": float(lengths.mean()) if len(rows) else 0.0,
+            }, f)
+
+        pointer = os.path.join(self.directory, "CURRENT")
+        with open(f"{pointer}.tmp", "w") as f:
+            f.write(version)
+        os.replace(f"{pointer}.tmp", pointer)
+        self.load()
+
+        # Open memory maps of the old version stay valid after deletion.
+        if previous and previous != version:
+            shutil.rmtree(os.path.join(self.directory, previous), ignore_errors=True)
+        logger.info(f"Lexical index {version}: {len(rows)} nodes, {len(terms)} terms")
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Rank nodes against a query with BM25
+
+        Returns:
+            Up to top_k (node_id, score) pairs, best first
+        """
+        index = self._index
+        if index is None or not index.node_count:
+            return []
+
+        scores = np.zeros(index.node_count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            number = index.terms.find(term)
+            if number is None:
+                continue
+            offset = int(index.term_offsets[number])
+            df = int(index.term_offsets[number + 1]) - offset
+            nodes = index.postings[offset:offset + df]
+            tf = index.frequencies[offset:offset + df].astype(np.float32)
+            idf = np.log(1.0 + (index.node_count - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * index.lengths[nodes] / index.avg_length)
+            scores[nodes] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        matched = matched[np.argsort(-scores[matched])]
+        return [(index.node_ids[i], float(scores[i])) for i in matched]
+
+    def clear(self) -> None:
+        """Drop all staged nodes and compiled versions"""
+        with self._lock:
+            self._conn.execute("DELETE FROM nodes")
+            self._conn.commit()
+        self._index = None
+        for entry in os.listdir(self.directory):
+            path = os.path.join(self.directory, entry)
+            if entry == "CURRENT":
+                os.remove(path)
+            elif os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        index = self._index
+        return {
+            "version": self._current_version(),
+            "nodes": index.node_count if index else 0,
+            "terms": len(index.terms) if index else 0,
+        }
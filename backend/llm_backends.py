@@ -0,0 +1,133 @@
+"""
+Pluggable LLM backends selected by configuration
+"""
+import os
+from typing import Any, Dict
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LLM_BACKENDS = ("openai", "openai_like", "llamacpp")
+
+
+def offline_mode() -> bool:
+    """Whether OFFLINE_MODE asks for a fully local stack"""
+    return (os.getenv("OFFLINE_MODE") or "false").lower() in ("1", "true", "yes")
+
+
+def apply_offline_defaults() -> None:
+    """
+    Default to local providers and stop libraries from calling the network
+
+    Must run before datasets, transformers or huggingface_hub are imported,
+    since they read their offline flags at import time. Explicit settings
+    in the environment always win.
+    """
+    if not offline_mode():
+        return
+    os.environ.setdefault("EMBEDDING_PROVIDER", "huggingface")
+    os.environ.setdefault("LLM_BACKEND", "openai_like")
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("HF_DATASETS_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+    logger.info("Offline mode: using local embedding and LLM backends")
+
+
+def llm_backend() -> str:
+    return (os.getenv("LLM_BACKEND") or "openai").lower()
+
+
+def llm_is_local() -> bool:
+    """Whether the LLM runs in-process, with blocking calls only"""
+    return llm_backend() == "llamacpp"
+
+
+def _client_kwargs() -> Dict[str, Any]:
+    """Shared pooled HTTP clients, retries and timeout for OpenAI-style APIs"""
+    from http_clients import async_client, sync_client
+
+    return {
+        "http_client": sync_client(),
+        "async_http_client": async_client(),
+        "max_retries": int(os.getenv("LLM_MAX_RETRIES", "3")),
+        "timeout": float(os.getenv("LLM_TIMEOUT", "120")),
+    }
+
+
+def requires_openai_key() -> bool:
+    """Whether the configured LLM or embedding provider calls the OpenAI API"""
+    embedding_provider = (os.getenv("EMBEDDING_PROVIDER") or "openai").lower()
+    return llm_backend() == "openai" or embedding_provider == "openai"
+
+
+def build_llm() -> Any:
+    """
+    Create the LLM selected by LLM_BACKEND
+
+    Backends:
+        openai: Hosted OpenAI chat model (LLM_MODEL, default gpt-3.5-turbo)
+        openai_like: Any OpenAI-compatible HTTP server, e.g. vLLM, llama.cpp
+            server, Ollama or local_llm_server.py (LLM_API_BASE, LLM_MODEL)
+        llamacpp: In-process CPU model from a GGUF file (LLM_MODEL_PATH);
+            needs llama-index-llms-llama-cpp installed
+
+    The HTTP backends share one pooled client per process (see
+    http_clients), retry failed calls LLM_MAX_RETRIES times and give up
+    after LLM_TIMEOUT seconds.
+
+    Returns:
+        A LlamaIndex LLM
+    """
+    backend = llm_backend()
+    temperature = float(os.getenv("LLM_TEMPERATURE", "0.1"))
+    max_tokens = int(os.getenv("LLM_MAX_TOKENS", "512"))
+    context_window = int(os.getenv("LLM_CONTEXT_WINDOW", "4096"))
+
+    if backend == "openai":
+        from llama_index.llms.openai import OpenAI
+
+        return OpenAI(
+            model=os.getenv("LLM_MODEL") or "gpt-3.5-turbo",
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **_client_kwargs()
+        )
+
+    if backend == "openai_like":
+        from llama_index.llms.openai_like import OpenAILike
+
+        api_base = os.getenv("LLM_API_BASE") or "http://localhost:8080/v1"
+        logger.info(f"Using OpenAI-compatible LLM at {api_base}")
+        return OpenAILike(
+            model=os.getenv("LLM_MODEL") or "local-model",
+            api_base=api_base,
+            api_key=os.getenv("LLM_API_KEY") or "not-needed",
+            is_chat_model=True,
+            context_window=context_window,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **_client_kwargs()
+        )
+
+    if backend == "llamacpp":
+        try:
+            from llama_index.llms.llama_cpp import LlamaCPP
+        except ImportError as e:
+            raise ImportError(
+                "LLM_BACKEND=llamacpp needs llama-index-llms-llama-cpp installed"
+            ) from e
+
+        model_path = os.getenv("LLM_MODEL_PATH")
+        if not model_path:
+            raise ValueError("LLM_BACKEND=llamacpp needs LLM_MODEL_PATH set to a GGUF file")
+        return LlamaCPP(
+            model_path=model_path,
+            temperature=temperature,
+            max_new_tokens=max_tokens,
+            context_window=context_window,
+            model_kwargs={"n_threads": int(os.getenv("LLM_THREADS") or os.cpu_count() or 1)},
+            verbose=False
+        )
+
+    raise ValueError(f"Unknown LLM_BACKEND {backend!r}; expected one of {', '.join(LLM_BACKENDS)}")
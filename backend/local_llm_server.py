@@ -0,0 +1,232 @@
+"""
+Local OpenAI-compatible stand-in LLM server for tests, benchmarks and
+air-gapped development
+
+Answers are extracted from the retrieved context in the prompt rather than
+generated, so responses are deterministic and need no model weights. The
+latency flags emulate a real model's time to first token and per-token
+speed.
+
+Usage:
+    python local_llm_server.py --port 8080
+    LLM_BACKEND=openai_like LLM_API_BASE=http://localhost:8080/v1 python main.py
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# LlamaIndex's QA prompts wrap retrieved context in these delimiter lines.
+_CONTEXT_PATTERN = re.compile(r"-{5,}\n(.*?)\n-{5,}", re.DOTALL)
+_SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+def extract_answer(prompt: str, max_tokens: int = 512, max_sentences: int = 3) -> str:
+    """
+    Build a deterministic answer from the context embedded in a prompt
+
+    Args:
+        prompt: Full prompt text
+        max_tokens: Maximum number of whitespace-separated words
+        max_sentences: Maximum number of context sentences to return
+
+    Returns:
+        The first sentences of the context, or a canned reply if none
+    """
+    match = _CONTEXT_PATTERN.search(prompt)
+    if not match:
+        return "I am a local test model and have no context to answer from."
+
+    context = match.group(1)
+    # Skip metadata lines such as "doc_id: ..." that precede the text.
+    lines = [line for line in context.splitlines() if line.strip() and not re.match(r"^\w+: \S+$", line)]
+    sentences = _SENTENCE_PATTERN.split(" ".join(lines))
+    answer = " ".join(sentences[:max_sentences]).strip()
+    words = answer.split()
+    if len(words) > max_tokens:
+        answer = " ".join(words[:max_tokens])
+    return answer or "I am a local test model and have no context to answer from."
+
+
+class StandInModel:
+    """Deterministic answers with configurable latency"""
+
+    def __init__(self, model: str, first_token_latency: float, token_latency: float):
+        self.model = model
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def tokens(self, prompt: str, max_tokens: int) -> Iterator[str]:
+        with self._lock:
+            self.requests += 1
+        answer = extract_answer(prompt, max_tokens=max_tokens)
+        time.sleep(self.first_token_latency)
+        for index, word in enumerate(answer.split(" ")):
+            if index:
+                time.sleep(self.token_latency)
+            yield word if index == 0 else f" {word}"
+
+
+def _prompt_from_messages(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(content)
+    return "\n".join(parts)
+
+
+def _usage(prompt: str, completion: str) -> Dict[str, int]:
+    prompt_tokens = len(prompt.split())
+    completion_tokens = len(completion.split())
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    model: StandInModel = None
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _read_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") in ("/v1/models", "/models"):
+            self._send_json(200, {
+                "object": "list",
+                "data": [{"id": self.model.model, "object": "model", "owned_by": "local"}],
+            })
+        elif self.path.rstrip("/") == "/health":
+            self._send_json(200, {"status": "healthy", "requests": self.model.requests})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self) -> None:
+        path = self.path.rstrip("/")
+        if path.endswith("/chat/completions"):
+            chat = True
+        elif path.endswith("/completions"):
+            chat = False
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        request = self._read_body()
+        prompt = _prompt_from_messages(request.get("messages", [])) if chat else str(request.get("prompt", ""))
+        max_tokens = int(request.get("max_tokens") or 512)
+        completion_id = f"{'chatcmpl' if chat else 'cmpl'}-{uuid.uuid4().hex}"
+        created = int(time.time())
+        tokens = self.model.tokens(prompt, max_tokens)
+
+        if not request.get("stream"):
+            text = "".join(tokens)
+            choice: Dict[str, Any] = {"index": 0, "finish_reason": "stop"}
+            if chat:
+                choice["message"] = {"role": "assistant", "content": text}
+            else:
+                choice["text"] = text
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion" if chat else "text_completion",
+                "created": created,
+                "model": self.model.model,
+                "choices": [choice],
+                "usage": _usage(prompt, text),
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(delta: Optional[str], finish_reason: Optional[str] = None) -> bytes:
+            choice: Dict[str, Any] = {"index": 0, "finish_reason": finish_reason}
+            if chat:
+                choice["delta"] = {"role": "assistant", "content": delta} if delta is not None else {}
+            else:
+                choice["text"] = delta or ""
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk" if chat else "text_completion",
+                "created": created,
+                "model": self.model.model,
+                "choices": [choice],
+            }
+            return f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+
+        for token in tokens:
+            self._send_chunk(event(token))
+        self._send_chunk(event(None, finish_reason="stop"))
+        self._send_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def make_server(
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    model: str = "local-model",
+    first_token_latency: float = 0.0,
+    token_latency: float = 0.0
+) -> ThreadingHTTPServer:
+    """Create (but don't start) a stand-in server; port 0 picks a free port"""
+    handler = type("Handler", (_Handler,), {
+        "model": StandInModel(model, first_token_latency, token_latency)
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--model", default="local-model")
+    parser.add_argument("--first-token-latency", type=float, default=0.0,
+                        help="Seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.0,
+                        help="Seconds between tokens")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.model,
+                         args.first_token_latency, args.token_latency)
+    logger.info(f"Stand-in LLM listening on http://{args.host}:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
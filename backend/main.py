@@ -3,17 +3,38 @@ FastAPI backend for AI Doctor wellness app
 """
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Literal
 import os
+import json
+import asyncio
+import threading
+import time
+from itertools import chain
 from dotenv import load_dotenv
 import logging
 
-from data_loader import WikidocDataLoader
-from vector_store import MedicalVectorStore
+from llm_backends import apply_offline_defaults, requires_openai_key
 
-# Load environment variables
+# Load environment variables before the modules below import libraries
+# that read offline flags at import time
 load_dotenv()
+apply_offline_defaults()
+
+from query_pool import QueryPool, QueryRejected
+from single_flight import SingleFlight
+from precomputed_answers import QuestionLog, default_questions
+from jobs import IngestionJob, JobConflict, JobManager
+from timings import StageTimer
+import http_clients
+import metrics
+
+# The vector store (chromadb, LlamaIndex, embedding models) and the data
+# loader (datasets) are imported when they are first needed, so the server
+# binds its port and answers /health straight away.
+if TYPE_CHECKING:
+    from vector_store import MedicalVectorStore
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -42,19 +63,125 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global vector store instance
-vector_store: Optional[MedicalVectorStore] = None
+# Request counts and latency per route, for /metrics
+metrics_enabled = (os.getenv("METRICS_ENABLED") or "true").lower() not in ("0", "false", "no")
+if metrics_enabled:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+# Global vector store instance, set by the background warm-up
+vector_store: Optional["MedicalVectorStore"] = None
+
+# Progress of the background warm-up, reported by /ready
+startup_state: Dict[str, Any] = {"phase": "starting", "ready": False, "error": None, "timings": None}
+
+# Worker pool that runs blocking queries off the event loop
+query_pool: Optional[QueryPool] = None
+
+# Separate pool for retrieval-only requests, so they never queue behind
+# slow LLM synthesis
+retrieve_pool: Optional[QueryPool] = None
+
+# Identical questions asked at the same time share one computation
+query_flights: Optional[SingleFlight] = None
+
+# How often each question is asked, to pick the ones worth precomputing
+question_log: Optional[QuestionLog] = None
+
+def _cache_dir() -> str:
+    """Cache directory, with the same default as MedicalVectorStore"""
+    return os.getenv("CACHE_DIR") or os.path.join(
+        os.path.dirname(os.path.abspath(os.getenv("CHROMA_DB_PATH", "./chroma_db"))), "cache"
+    )
+
+
+# Background index build jobs; state is shared through the cache directory
+# so any worker process can report on or cancel a build
+job_manager = JobManager(state_dir=os.path.join(_cache_dir(), "jobs"))
+
+
+def _metrics_dir() -> Optional[str]:
+    """Where workers share metric snapshots, when there are several of them"""
+    if int(os.getenv("WORKERS", "1")) > 1:
+        return os.path.join(_cache_dir(), "metrics")
+    return None
+
+
+def _collect_metrics() -> None:
+    """Copy pool, cache and ingestion counters kept elsewhere into the metrics"""
+    for name, pool in (("query", query_pool), ("retrieve", retrieve_pool)):
+        if pool is None:
+            continue
+        stats = pool.stats()
+        metrics.POOL_IN_FLIGHT.set(stats["in_flight"], pool=name)
+        metrics.POOL_WAITING.set(stats["waiting"], pool=name)
+        metrics.POOL_REJECTED.sync(stats["rejected"] + stats["timed_out"], pool=name)
+    
+    if query_flights is not None:
+        stats = query_flights.stats()
+        metrics.COALESCED_QUERIES.sync(stats["leaders"], role="leader")
+        metrics.COALESCED_QUERIES.sync(stats["followers"], role="follower")
+    
+    store = vector_store
+    if store is not None:
+        if store.answer_cache:
+            stats = store.answer_cache.stats()
+            metrics.CACHE_LOOKUPS.sync(stats["lookups"], cache="answer")
+            metrics.CACHE_HITS.sync(stats["hits"], cache="answer")
+        if store.precomputed:
+            stats = store.precomputed.stats()
+            metrics.CACHE_LOOKUPS.sync(stats["lookups"], cache="precomputed")
+            metrics.CACHE_HITS.sync(stats["hits"], cache="precomputed")
+        if store.embedding_cache:
+            stats = store.embedding_cache.stats()
+            hits = stats["memory_hits"] + stats["disk_hits"]
+            metrics.CACHE_LOOKUPS.sync(hits + stats["misses"], cache="embedding")
+            metrics.CACHE_HITS.sync(hits, cache="embedding")
+        if store.reranker and store.reranker.cache:
+            stats = store.reranker.cache.stats()
+            metrics.CACHE_LOOKUPS.sync(stats["hits"] + stats["misses"], cache="rerank")
+            metrics.CACHE_HITS.sync(stats["hits"], cache="rerank")
+    
+    # Only builds running here; another worker reports its own.
+    job = job_manager.active_job()
+    if isinstance(job, IngestionJob):
+        metrics.INGEST_DOCS_PER_SECOND.set(job.to_dict()["docs_per_sec"] or 0.0)
+    else:
+        metrics.INGEST_DOCS_PER_SECOND.set(0.0)
+
+
+metrics.REGISTRY.add_collector(_collect_metrics)
 
 
 class QueryRequest(BaseModel):
     """Request model for health queries"""
     question: str
+    mode: Literal["answer", "retrieve"] = "answer"
+
+
+class RetrieveRequest(BaseModel):
+    """Request model for retrieval-only queries"""
+    question: str
+    top_k: Optional[int] = None
+    
+
+class QueryBatchRequest(BaseModel):
+    """Request model for batch health queries"""
+    questions: List[str]
+    concurrency: Optional[int] = None
     
 
 class QueryResponse(BaseModel):
     """Response model for health queries"""
     answer: str
     success: bool
+    sources: List[Dict[str, Any]] = []
+    cached: bool = False
+    precomputed: bool = False
+    matched_question: Optional[str] = None
+    coalesced: bool = False
+    context: Optional[Dict[str, int]] = None
+    usage: Optional[Dict[str, int]] = None
+    timings: Optional[Dict[str, float]] = None
     
 
 class StatusResponse(BaseModel):
@@ -62,32 +189,130 @@ class StatusResponse(BaseModel):
     status: str
     index_loaded: bool
     message: str
+    query_pool: Optional[Dict[str, Any]] = None
+    retrieve_pool: Optional[Dict[str, Any]] = None
+    coalescing: Optional[Dict[str, Any]] = None
+    answer_cache: Optional[Dict[str, Any]] = None
+    precomputed_answers: Optional[Dict[str, Any]] = None
+    embedding_cache: Optional[Dict[str, Any]] = None
+    lexical_index: Optional[Dict[str, Any]] = None
+    quantized_index: Optional[Dict[str, Any]] = None
+    reranker: Optional[Dict[str, Any]] = None
+    startup: Optional[Dict[str, Any]] = None
+    index_generation: Optional[int] = None
+    index_version: Optional[str] = None
+    worker_pid: Optional[int] = None
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize the vector store on startup"""
+def _warm_up(chroma_db_path: str) -> None:
+    """
+    Load the vector store and index, then run a retrieval-only warm query
+    
+    Runs on a background thread after the server has started, so liveness
+    checks pass while models load. /ready reports 503 until this finishes.
+    """
     global vector_store
     
+    timings = StageTimer()
     try:
-        logger.info("Starting up AI Doctor API...")
-        
-        # Check for OpenAI API key
-        if not os.getenv("OPENAI_API_KEY"):
-            logger.warning("OPENAI_API_KEY not found in environment variables")
+        startup_state["phase"] = "loading"
+        with timings.stage("import"):
+            from vector_store import MedicalVectorStore
+        with timings.stage("models"):
+            store = MedicalVectorStore(persist_dir=chroma_db_path)
+        with timings.stage("index"):
+            loaded = store.load_index()
+        vector_store = store
         
-        # Initialize vector store
-        chroma_db_path = os.getenv("CHROMA_DB_PATH", "./chroma_db")
-        vector_store = MedicalVectorStore(persist_dir=chroma_db_path)
-        
-        # Try to load existing index
-        if not vector_store.load_index():
+        if not loaded:
             logger.info("No existing index found. Use /initialize endpoint to create one.")
         else:
             logger.info("Vector store index loaded successfully")
-            
+            # Touch the embedding model, index files and reranker once
+            # without calling the LLM.
+            if (os.getenv("WARMUP_ENABLED") or "true").lower() not in ("0", "false", "no"):
+                startup_state["phase"] = "warming"
+                try:
+                    with timings.stage("warm_query"):
+                        store.retrieve_only(
+                            os.getenv("WARMUP_QUERY") or "What are the symptoms of diabetes?"
+                        )
+                except Exception as e:
+                    # Serve anyway; the first real query will retry.
+                    logger.warning(f"Warm-up query failed: {e}")
+        
+        startup_state.update(phase="ready", ready=True)
+        logger.info("AI Doctor API ready")
     except Exception as e:
         logger.error(f"Error during startup: {e}")
+        startup_state.update(phase="failed", error=str(e))
+    finally:
+        startup_state["timings"] = timings.finish()
+
+
+def _watch_index_generation(interval: float) -> None:
+    """Reload or drop the index when another worker rebuilds or resets it"""
+    while True:
+        time.sleep(interval)
+        store = vector_store
+        if store is None or job_manager.active_job() is not None:
+            continue
+        try:
+            if store.sync_generation() and query_pool:
+                query_pool.restart()
+        except Exception as e:
+            logger.warning(f"Could not sync index generation: {e}")
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Create the query pools and start loading the vector store in the background"""
+    global query_pool, retrieve_pool, query_flights, question_log
+    
+    logger.info("Starting up AI Doctor API...")
+    
+    # Check for OpenAI API key
+    if requires_openai_key() and not os.getenv("OPENAI_API_KEY"):
+        logger.warning("OPENAI_API_KEY not found in environment variables")
+    
+    chroma_db_path = os.getenv("CHROMA_DB_PATH", "./chroma_db")
+    query_pool = QueryPool.from_env(persist_dir=chroma_db_path)
+    retrieve_pool = QueryPool(
+        max_workers=int(os.getenv("RETRIEVE_POOL_WORKERS", "8")),
+        max_queue=int(os.getenv("RETRIEVE_POOL_QUEUE", "64")),
+        queue_timeout=float(os.getenv("RETRIEVE_POOL_QUEUE_TIMEOUT", "5"))
+    )
+    query_flights = SingleFlight.from_env()
+    question_log = QuestionLog.from_env(_cache_dir())
+    
+    threading.Thread(
+        target=_warm_up, args=(chroma_db_path,), name="warmup", daemon=True
+    ).start()
+    
+    metrics_dir = _metrics_dir()
+    if metrics_enabled and metrics_dir:
+        metrics.REGISTRY.start_flushing(
+            metrics_dir, float(os.getenv("METRICS_FLUSH_INTERVAL", "1"))
+        )
+    
+    poll_interval = float(os.getenv("INDEX_GENERATION_POLL", "2"))
+    if poll_interval > 0:
+        threading.Thread(
+            target=_watch_index_generation, args=(poll_interval,),
+            name="index-watcher", daemon=True
+        ).start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the query worker pools, close pooled LLM connections and save question counts"""
+    if question_log is not None:
+        question_log.flush()
+    if query_pool is not None:
+        query_pool.shutdown()
+    if retrieve_pool is not None:
+        retrieve_pool.shutdown()
+    await http_clients.aclose()
 
 
 @app.get("/")
@@ -98,75 +323,219 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "health": "/health",
+            "ready": "/ready",
             "status": "/status",
             "initialize": "/initialize",
-            "query": "/query"
+            "jobs": "/jobs/{job_id}",
+            "query": "/query",
+            "query_stream": "/query/stream",
+            "query_batch": "/query/batch",
+            "retrieve": "/retrieve",
+            "metrics": "/metrics"
         }
     }
 
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Liveness check: the server is up, even while models are still loading"""
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: request and stage latency, pools, caches, tokens, ingestion"""
+    if not metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(
+        metrics.REGISTRY.render(_metrics_dir()), media_type=metrics.CONTENT_TYPE
+    )
+
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness check: 200 once the vector store and index are loaded and
+    warmed up, 503 before that or if loading failed
+    
+    Returns:
+        The warm-up phase, any error, and per-stage warm-up timings in
+        milliseconds
+    """
+    if not startup_state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "not_ready", **startup_state})
+    return {"status": "ready", **startup_state}
+
+
 @app.get("/status", response_model=StatusResponse)
 async def get_status():
     """Get system status"""
     global vector_store
     
     if vector_store is None:
+        failed = startup_state["phase"] == "failed"
         return StatusResponse(
-            status="error",
+            status="error" if failed else "starting",
             index_loaded=False,
-            message="Vector store not initialized"
+            message=(
+                f"Vector store not initialized: {startup_state['error']}"
+                if failed else "Vector store is loading"
+            ),
+            startup=startup_state,
+            worker_pid=os.getpid()
         )
     
     index_loaded = vector_store.index is not None
+    collection = vector_store.collection
     
     return StatusResponse(
         status="ok" if index_loaded else "not_ready",
         index_loaded=index_loaded,
-        message="System ready" if index_loaded else "Index not loaded. Use /initialize to create index."
+        message="System ready" if index_loaded else "Index not loaded. Use /initialize to create index.",
+        query_pool=query_pool.stats() if query_pool else None,
+        retrieve_pool=retrieve_pool.stats() if retrieve_pool else None,
+        coalescing=query_flights.stats() if query_flights else None,
+        answer_cache=vector_store.answer_cache.stats() if vector_store.answer_cache else None,
+        precomputed_answers=vector_store.precomputed.stats() if vector_store.precomputed else None,
+        embedding_cache=vector_store.embedding_cache.stats() if vector_store.embedding_cache else None,
+        lexical_index=vector_store.lexical_index.stats() if vector_store.lexical_index else None,
+        quantized_index=vector_store.quantized_index.stats() if vector_store.quantized_index else None,
+        reranker=vector_store.reranker.stats() if vector_store.reranker else None,
+        startup=startup_state,
+        index_generation=vector_store.loaded_generation,
+        index_version=collection.name if collection is not None else None,
+        worker_pid=os.getpid()
     )
 
 
-@app.post("/initialize")
+def _build_index(job: IngestionJob, max_samples: Optional[int]) -> Dict[str, Any]:
+    """Load the dataset and build the index, reporting progress on the job"""
+    from data_loader import WikidocDataLoader
+    
+    job.set_phase("loading")
+    loader = WikidocDataLoader(cache_dir=vector_store.cache_dir)
+    dataset_mode = (os.getenv("DATASET_MODE") or "arrow").lower()
+    if dataset_mode == "memory":
+        documents = loader.load_data(max_samples=max_samples)
+        job.update(docs_total=len(documents))
+    else:
+        # Feed batches straight into the index so memory stays flat: either
+        # from the cached, memory-mapped Arrow preparation or streamed from
+        # the hub. The total is an estimate until the batches run out.
+        if dataset_mode == "streaming":
+            batches = loader.iter_batches(max_samples=max_samples)
+        else:
+            batches = loader.iter_prepared_batches(max_samples=max_samples)
+        documents = chain.from_iterable(batches)
+        if max_samples:
+            job.update(docs_total=max_samples + loader.curated_document_count())
+    job.check_cancelled()
+    
+    def on_progress(phase: str, stats: Dict[str, int]) -> None:
+        if phase != job.phase:
+            job.set_phase(phase)
+        job.update(
+            docs_processed=stats["documents"],
+            docs_embedded=stats["added"] + stats["updated"]
+        )
+        job.check_cancelled()
+    
+    job.set_phase("indexing")
+    metrics.INGEST_IN_PROGRESS.inc()
+    try:
+        stats = vector_store.create_index(documents, progress_callback=on_progress)
+    finally:
+        metrics.INGEST_IN_PROGRESS.dec()
+    for result in ("added", "updated", "unchanged", "deleted"):
+        metrics.INGEST_DOCUMENTS.inc(stats[result], result=result)
+    if query_pool:
+        query_pool.restart()
+    
+    # Answers precomputed from the previous version are no longer served;
+    # generate new ones. The index is already live, so a failure here
+    # only means those questions take the full query path.
+    if vector_store.precomputed:
+        job.set_phase("precomputing")
+        try:
+            if question_log:
+                question_log.flush()
+            stats["precomputed"] = vector_store.precompute_answers(
+                default_questions(vector_store.cache_dir)
+            )
+        except Exception as e:
+            logger.warning(f"Could not precompute answers: {e}")
+    return stats
+
+
+@app.post("/initialize", status_code=202)
 async def initialize_index(max_samples: Optional[int] = 1000):
     """
-    Initialize the vector store with data from HuggingFace
+    Start a background job that builds the vector store from HuggingFace data
+    
+    Queries keep being served from the current index until the new one is
+    ready. Poll /jobs/{job_id} for progress.
     
     Args:
         max_samples: Maximum number of samples to load (default: 1000)
     """
     global vector_store
     
-    if not os.getenv("OPENAI_API_KEY"):
+    if requires_openai_key() and not os.getenv("OPENAI_API_KEY"):
         raise HTTPException(
             status_code=400,
             detail="OPENAI_API_KEY not found. Please set it in your environment."
         )
     
+    if vector_store is None:
+        raise HTTPException(status_code=503, detail="Vector store not initialized")
+    
     try:
         logger.info(f"Initializing index with max {max_samples} samples...")
-        
-        # Load data
-        loader = WikidocDataLoader()
-        documents = loader.load_data(max_samples=max_samples)
-        
-        # Create index
-        vector_store.create_index(documents)
-        
-        return {
-            "success": True,
-            "message": f"Index initialized with {len(documents)} documents",
-            "documents_count": len(documents)
-        }
-        
-    except Exception as e:
-        logger.error(f"Error initializing index: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        job = job_manager.submit(
+            lambda job: _build_index(job, max_samples),
+            params={"max_samples": max_samples}
+        )
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return {
+        "success": True,
+        "message": "Index build started",
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}"
+    }
+
+
+@app.get("/jobs")
+async def list_jobs():
+    """List recent index build jobs"""
+    return {"jobs": [job.to_dict() for job in job_manager.list()]}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get phase, progress, throughput, ETA and errors of an index build job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Cancel an index build job
+    
+    The build stops after the current batch; rerunning /initialize resumes
+    from the last checkpoint.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if not job.active:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is already {job.status}")
+    job.cancel()
+    return job.to_dict()
 
 
 @app.post("/query", response_model=QueryResponse)
@@ -174,33 +543,306 @@ async def query_health(request: QueryRequest):
     """
     Query the AI doctor for wellness advice
     
+    With mode "retrieve" the LLM is skipped: the answer is the top matching
+    snippets and the sources carry the ranked results.
+    
     Args:
         request: QueryRequest with user question
         
     Returns:
         AI-generated wellness advice
     """
-    global vector_store
+    global vector_store, query_pool, retrieve_pool
     
-    if vector_store is None or vector_store.query_engine is None:
+    if (
+        vector_store is None
+        or vector_store.retriever is None
+        or query_pool is None
+        or retrieve_pool is None
+    ):
         raise HTTPException(
             status_code=503,
             detail="Vector store not initialized. Use /initialize endpoint first."
         )
     
+    operation = "retrieve" if request.mode == "retrieve" else "query"
     try:
-        logger.info(f"Processing query: {request.question}")
+        logger.info(f"Processing query ({request.mode}): {request.question}")
         
-        # Query the vector store
-        answer = vector_store.query(request.question)
+        if request.mode == "retrieve":
+            result = await retrieve_pool.run_local(vector_store.retrieve_only, request.question)
+            metrics.observe_timings(operation, result["timings"])
+            metrics.QUERIES.inc(operation=operation, outcome="retrieved")
+            return QueryResponse(
+                answer=result["answer"],
+                success=True,
+                sources=result["results"],
+                timings=result["timings"]
+            )
+        
+        if question_log is not None:
+            question_log.record(request.question)
+        
+        # Query the vector store on the worker pool, sharing the work with
+        # identical questions already in progress
+        store = vector_store
+        if query_flights is not None:
+            key = (SingleFlight.normalize(request.question), store.loaded_generation)
+            result, coalesced = await query_flights.run(
+                key, lambda: query_pool.run_query(store, request.question)
+            )
+        else:
+            result, coalesced = await query_pool.run_query(store, request.question), False
+        if coalesced:
+            # The leader's stages and tokens are already recorded
+            metrics.QUERIES.inc(operation="query", outcome="coalesced")
+        else:
+            metrics.observe_query("query", result)
         
         return QueryResponse(
-            answer=answer,
-            success=True
+            answer=result["answer"],
+            success=True,
+            sources=result["sources"],
+            cached=result["cached"],
+            precomputed=result.get("precomputed", False),
+            matched_question=result.get("matched_question"),
+            coalesced=coalesced,
+            context=result.get("context"),
+            usage=result.get("usage"),
+            timings=result["timings"]
         )
         
+    except QueryRejected as e:
+        logger.warning(f"Query rejected: {e}")
+        metrics.QUERIES.inc(operation=operation, outcome="rejected")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         logger.error(f"Error processing query: {e}")
+        metrics.QUERIES.inc(operation=operation, outcome="error")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _sse(event: str, data) -> str:
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/query/stream")
+async def query_health_stream(request: QueryRequest):
+    """
+    Query the AI doctor and stream the answer as Server-Sent Events
+    
+    Sends a "sources" event with the retrieved documents first, a
+    "context" event with prompt token counts, then "token" events as the
+    LLM generates the answer, a "timings" event with per-stage
+    milliseconds, then "done".
+    
+    Args:
+        request: QueryRequest with user question
+    """
+    global vector_store, query_pool
+    
+    if vector_store is None or vector_store.stream_synthesizer is None or query_pool is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Vector store not initialized. Use /initialize endpoint first."
+        )
+    
+    logger.info(f"Processing streaming query: {request.question}")
+    if question_log is not None:
+        question_log.record(request.question)
+    
+    try:
+        events = await query_pool.stream(vector_store.stream_query, request.question)
+    except QueryRejected as e:
+        logger.warning(f"Query rejected: {e}")
+        metrics.QUERIES.inc(operation="stream_query", outcome="rejected")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    async def event_stream():
+        precomputed = False
+        try:
+            async for event in events:
+                if event["event"] == "precomputed":
+                    precomputed = True
+                elif event["event"] == "usage":
+                    metrics.observe_usage(event["data"])
+                elif event["event"] == "timings":
+                    # Stored answers stop before retrieval.
+                    metrics.observe_query("stream_query", {
+                        "timings": event["data"], "cached": "retrieve" not in event["data"],
+                        "precomputed": precomputed
+                    })
+                yield _sse(event["event"], event["data"])
+            yield _sse("done", {"success": True})
+        except Exception as e:
+            logger.error(f"Error streaming query: {e}")
+            metrics.QUERIES.inc(operation="stream_query", outcome="error")
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            await events.aclose()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/query/batch")
+async def query_health_batch(request: QueryBatchRequest):
+    """
+    Answer many questions in one call, streaming results as NDJSON
+    
+    All questions are embedded together and retrieved with a shared Chroma
+    lookup, then answers are synthesized concurrently (at most
+    QUERY_BATCH_CONCURRENCY at once), each through the query pool like a
+    single query, so batches count against the same limits. Each line of
+    the response is one result with the question's index, written as soon
+    as it is ready, so lines arrive out of order. Answers the pool rejects
+    come back with success false and a retry_after.
+    
+    Args:
+        request: QueryBatchRequest with the questions and an optional lower
+            concurrency
+    """
+    global vector_store, query_pool
+    
+    if vector_store is None or vector_store.synthesizer is None or query_pool is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Vector store not initialized. Use /initialize endpoint first."
+        )
+    
+    max_questions = int(os.getenv("QUERY_BATCH_MAX_QUESTIONS", "1000"))
+    if len(request.questions) > max_questions:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {max_questions} questions per batch"
+        )
+    
+    max_concurrency = int(os.getenv("QUERY_BATCH_CONCURRENCY", "8"))
+    concurrency = max(1, min(request.concurrency or max_concurrency, max_concurrency))
+    questions = request.questions
+    logger.info(f"Processing batch of {len(questions)} queries")
+    
+    try:
+        # Embedding and retrieval for the whole batch take one pool slot.
+        store = vector_store
+        items = await query_pool.run_local(store.retrieve_batch, questions)
+    except QueryRejected as e:
+        logger.warning(f"Query rejected: {e}")
+        metrics.QUERIES.inc(len(questions), operation="batch_query", outcome="rejected")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except Exception as e:
+        logger.error(f"Error processing batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    def answer(index: int) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"index": index, "question": questions[index]}
+        try:
+            result.update(store.answer_retrieved(questions[index], items[index]))
+            result["success"] = True
+            metrics.observe_query("batch_query", result)
+        except Exception as e:
+            logger.error(f"Error answering batch query {index}: {e}")
+            metrics.QUERIES.inc(operation="batch_query", outcome="error")
+            result.update(success=False, error=str(e))
+        return result
+    
+    async def pooled_answer(index: int, limit: asyncio.Semaphore) -> Dict[str, Any]:
+        async with limit:
+            try:
+                return await query_pool.run_local(answer, index)
+            except QueryRejected as e:
+                logger.warning(f"Batch query {index} rejected: {e}")
+                metrics.QUERIES.inc(operation="batch_query", outcome="rejected")
+                return {
+                    "index": index,
+                    "question": questions[index],
+                    "success": False,
+                    "error": str(e),
+                    "retry_after": e.retry_after,
+                }
+    
+    async def results():
+        limit = asyncio.Semaphore(concurrency)
+        tasks = [
+            asyncio.ensure_future(pooled_answer(index, limit))
+            for index in range(len(questions))
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            # Stop queued synthesis if the client goes away.
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+def _max_top_k() -> int:
+    return int(os.getenv("RETRIEVE_MAX_TOP_K", "50"))
+
+
+@app.post("/retrieve")
+async def retrieve(request: RetrieveRequest):
+    """
+    Return the ranked knowledge-base matches for a question without
+    calling the LLM
+    
+    Args:
+        request: RetrieveRequest with the question and optional top_k
+        
+    Returns:
+        Ranked results (doc_id, question, answer, topic, source, text,
+        score) and per-stage timings in milliseconds
+    """
+    global vector_store, retrieve_pool
+    
+    if vector_store is None or vector_store.retriever is None or retrieve_pool is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Vector store not initialized. Use /initialize endpoint first."
+        )
+    
+    if request.top_k is not None and not 1 <= request.top_k <= _max_top_k():
+        raise HTTPException(
+            status_code=400,
+            detail=f"top_k must be between 1 and {_max_top_k()}"
+        )
+    
+    try:
+        result = await retrieve_pool.run_local(
+            vector_store.retrieve_only, request.question, request.top_k
+        )
+        metrics.observe_timings("retrieve", result["timings"])
+        metrics.QUERIES.inc(operation="retrieve", outcome="retrieved")
+        return {"results": result["results"], "timings": result["timings"]}
+    except QueryRejected as e:
+        logger.warning(f"Retrieval rejected: {e}")
+        metrics.QUERIES.inc(operation="retrieve", outcome="rejected")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except Exception as e:
+        logger.error(f"Error retrieving: {e}")
+        metrics.QUERIES.inc(operation="retrieve", outcome="error")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -209,9 +851,18 @@ async def reset_index():
     """Reset the vector store (use with caution)"""
     global vector_store
     
+    active = job_manager.active_job()
+    if active is not None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job {active.id} is {active.status}; cancel it before resetting"
+        )
+    
     try:
         if vector_store:
             vector_store.reset()
+        if query_pool:
+            query_pool.restart()
             
         return {
             "success": True,
@@ -228,5 +879,15 @@ if __name__ == "__main__":
     
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", 8000))
+    workers = int(os.getenv("WORKERS", "1"))
     
-    uvicorn.run(app, host=host, port=port)
+    if workers > 1:
+        import shutil
+        from workers import serve
+        
+        # Snapshots from a previous run would be merged into this one's.
+        shutil.rmtree(_metrics_dir(), ignore_errors=True)
+        
+        serve(app, host=host, port=port, workers=workers)
+    else:
+        uvicorn.run(app, host=host, port=port)
@@ -0,0 +1,419 @@
+"""
+Prometheus metrics in the text exposition format
+
+Counters, gauges and histograms are kept in memory with a lock per metric,
+so recording a value costs about a microsecond and can stay on in
+production. With several worker processes, each one periodically writes a
+snapshot to a shared directory and /metrics merges them.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds; covers cache hits (milliseconds) up to slow LLM calls.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def snapshot(self) -> List[List[Any]]:
+        """[label values, value] pairs, JSON-serializable"""
+        with self._lock:
+            return [[list(key), _copy(value)] for key, value in self._values.items()]
+
+
+def _copy(value: Any) -> Any:
+    return [list(value[0]), value[1]] if isinstance(value, list) else value
+
+
+class Counter(_Metric):
+    """Monotonically increasing total"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def sync(self, total: float, **labels: Any) -> None:
+        """Set the total from a count kept elsewhere (e.g. a cache's hit counter)"""
+        with self._lock:
+            self._values[self._key(labels)] = float(total)
+
+
+class Gauge(_Metric):
+    """Value that goes up and down"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed buckets"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (not cumulative) counts, the last one for +Inf, and the sum
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][slot] += 1
+            entry[1] += value
+
+
+class Registry:
+    """
+    Named metrics and the callbacks that refresh them before each scrape
+
+    Collectors are for values that are already counted elsewhere (pool
+    occupancy, cache hit counts), so the hot path doesn't count them twice.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._flusher: Optional[threading.Thread] = None
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Call collector before every snapshot to update metrics it owns"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        """Current values of every metric, after running the collectors"""
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics.values())
+        for collector in collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+        return {
+            metric.name: {
+                "kind": metric.kind,
+                "documentation": metric.documentation,
+                "labelnames": list(metric.labelnames),
+                "buckets": list(getattr(metric, "buckets", [])),
+                "values": metric.snapshot(),
+            }
+            for metric in metrics
+        }
+
+    def write(self, directory: str) -> None:
+        """Save this process's snapshot for other workers to merge"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.collect(), f)
+        os.replace(tmp_path, path)
+
+    def start_flushing(self, directory: str, interval: float) -> None:
+        """Write snapshots every interval seconds on a daemon thread"""
+        if self._flusher is not None:
+            return
+
+        def flush() -> None:
+            while True:
+                try:
+                    self.write(directory)
+                except OSError as e:
+                    logger.warning(f"Could not write metrics snapshot: {e}")
+                time.sleep(interval)
+
+        self._flusher = threading.Thread(target=flush, name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    def render(self, directory: Optional[str] = None) -> str:
+        """
+        Metrics in Prometheus text format
+
+        Args:
+            directory: Shared snapshot directory of a multi-worker server;
+                counters and histograms are summed over every worker that
+                ever wrote one, gauges over the workers still running
+        """
+        if not directory:
+            return _format(self.collect())
+        self.write(directory)
+        snapshots = []
+        for entry in os.listdir(directory):
+            if not entry.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(directory, entry)) as f:
+                    snapshots.append((_alive(entry[:-5]), json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return _format(_merge(snapshots))
+
+
+def _alive(pid: str) -> bool:
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(snapshots: List[Tuple[bool, Dict[str, Dict[str, Any]]]]) -> Dict[str, Dict[str, Any]]:
+    merged: Dict[str, Dict[str, Any]] = {}
+    for alive, snapshot in snapshots:
+        for name, metric in snapshot.items():
+            if metric["kind"] == "gauge" and not alive:
+                continue
+            target = merged.setdefault(name, {**metric, "values": []})
+            values = {tuple(labels): value for labels, value in target["values"]}
+            for labels, value in metric["values"]:
+                key = tuple(labels)
+                current = values.get(key)
+                if current is None:
+                    values[key] = _copy(value)
+                elif metric["kind"] == "histogram":
+                    current[0] = [a + b for a, b in zip(current[0], value[0])]
+                    current[1] += value[1]
+                else:
+                    values[key] = current + value
+            target["values"] = [[list(key), value] for key, value in values.items()]
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: List[str], values: List[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _format(metrics: Dict[str, Dict[str, Any]]) -> str:
+    lines = []
+    for name in sorted(metrics):
+        metric = metrics[name]
+        lines.append(f"# HELP {name} {metric['documentation']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        names = metric["labelnames"]
+        for labels, value in sorted(metric["values"], key=lambda item: item[0]):
+            if metric["kind"] != "histogram":
+                lines.append(f"{name}{_labels(names, labels)} {_number(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(list(metric["buckets"]) + [float("inf")], counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{name}_bucket{_labels(names, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, labels)} {_number(round(total, 6))}")
+            lines.append(f"{name}_count{_labels(names, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests and their latency by route template
+
+    Streaming responses are timed until their last byte. Requests that match
+    no route share the "unmatched" label, so scanners can't blow up the
+    number of series.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUESTS.inc(route=route, method=scope["method"], status=str(status))
+            HTTP_SECONDS.observe(
+                time.perf_counter() - started, route=route, method=scope["method"]
+            )
+
+
+def observe_timings(operation: str, timings: Optional[Dict[str, float]]) -> None:
+    """
+    Record a StageTimer result (milliseconds per stage) in the stage histogram
+
+    Queries report their timings back even from process pool workers, so
+    recording them here covers every pool mode.
+    """
+    for stage, milliseconds in (timings or {}).items():
+        STAGE_SECONDS.observe(milliseconds / 1000, operation=operation, stage=stage)
+
+
+def observe_query(operation: str, result: Dict[str, Any]) -> None:
+    """Record the stages, outcome and token usage of an answered query"""
+    timings = result.get("timings") or {}
+    observe_timings(operation, timings)
+    if result.get("precomputed"):
+        outcome = "precomputed"
+    elif result.get("cached"):
+        outcome = "cached"
+    elif "fallback" in timings:
+        outcome = "fallback"
+    else:
+        outcome = "answered"
+    QUERIES.inc(operation=operation, outcome=outcome)
+    observe_usage(result.get("usage"))
+
+
+def observe_usage(usage: Optional[Dict[str, int]]) -> None:
+    if usage:
+        LLM_TOKENS.inc(usage.get("prompt_tokens", 0), kind="prompt")
+        LLM_TOKENS.inc(usage.get("completion_tokens", 0), kind="completion")
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "rag_http_requests_total", "HTTP requests by route, method and status",
+    ("route", "method", "status")
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "rag_http_request_duration_seconds", "HTTP request latency by route",
+    ("route", "method")
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "rag_http_requests_in_flight", "HTTP requests being handled"
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_duration_seconds",
+    "Query processing time per stage (embed, retrieve, rerank, compress, synthesize, fallback, total)",
+    ("operation", "stage")
+)
+QUERIES = REGISTRY.counter(
+    "rag_queries_total", "Queries by operation and outcome (answered, precomputed, cached, coalesced, fallback, error, rejected)",
+    ("operation", "outcome")
+)
+LLM_TOKENS = REGISTRY.counter(
+    "rag_llm_tokens_total", "Approximate LLM prompt (question and context) and completion tokens",
+    ("kind",)
+)
+POOL_IN_FLIGHT = REGISTRY.gauge(
+    "rag_pool_in_flight", "Requests running on a worker pool", ("pool",)
+)
+POOL_WAITING = REGISTRY.gauge(
+    "rag_pool_waiting", "Requests queued for a worker pool", ("pool",)
+)
+POOL_REJECTED = REGISTRY.counter(
+    "rag_pool_rejected_total", "Requests turned away by a full worker pool", ("pool",)
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "rag_cache_lookups_total", "Cache lookups (answer, precomputed, embedding, rerank)", ("cache",)
+)
+CACHE_HITS = REGISTRY.counter(
+    "rag_cache_hits_total", "Cache hits (answer, precomputed, embedding, rerank)", ("cache",)
+)
+COALESCED_QUERIES = REGISTRY.counter(
+    "rag_coalesced_queries_total",
+    "Queries that started a computation (leader) or shared one already running (follower)",
+    ("role",)
+)
+INGEST_DOCUMENTS = REGISTRY.counter(
+    "rag_ingest_documents_total", "Documents handled by index builds (added, updated, unchanged, deleted)",
+    ("result",)
+)
+INGEST_DOCS_PER_SECOND = REGISTRY.gauge(
+    "rag_ingest_docs_per_second", "Throughput of the index build running in this worker"
+)
+INGEST_IN_PROGRESS = REGISTRY.gauge(
+    "rag_ingest_in_progress", "Index builds running"
+)
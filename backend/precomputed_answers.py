@@ -0,0 +1,359 @@
+"""
+Precomputed answers for common questions, served by intent matching
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from single_flight import SingleFlight
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class QuestionLog:
+    """
+    Count how often each question is asked, to find the most frequent ones
+
+    Questions are grouped after the same normalization used for request
+    coalescing. Counts are buffered in memory and added to a SQLite table
+    shared by all worker processes every flush_every questions or
+    flush_interval seconds.
+    """
+
+    def __init__(self, path: str, flush_every: int = 50, flush_interval: float = 10.0):
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            "normalized TEXT PRIMARY KEY, "
+            "question TEXT NOT NULL, "
+            "count INTEGER NOT NULL, "
+            "last_asked REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+        self._pending: Counter = Counter()
+        self._examples: Dict[str, str] = {}
+        self._last_flush = time.monotonic()
+
+    @classmethod
+    def from_env(cls, cache_dir: str) -> Optional["QuestionLog"]:
+        """Build a log from QUESTION_LOG_* environment variables, or None if disabled"""
+        if (os.getenv("QUESTION_LOG_ENABLED") or "true").lower() in ("0", "false", "no"):
+            return None
+        os.makedirs(cache_dir, exist_ok=True)
+        return cls(
+            path=os.path.join(cache_dir, "questions.sqlite3"),
+            flush_interval=float(os.getenv("QUESTION_LOG_FLUSH_INTERVAL", "10")),
+        )
+
+    def record(self, question: str) -> None:
+        """Count one occurrence of a question"""
+        normalized = SingleFlight.normalize(question)
+        if not normalized:
+            return
+        with self._lock:
+            self._pending[normalized] += 1
+            self._examples.setdefault(normalized, " ".join(question.split()))
+            due = (
+                sum(self._pending.values()) >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered counts to SQLite"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            examples, self._examples = self._examples, {}
+            self._last_flush = time.monotonic()
+            if not pending:
+                return
+            now = time.time()
+            self._conn.executemany(
+                "INSERT INTO questions (normalized, question, count, last_asked) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT(normalized) DO UPDATE SET "
+                "count = count + excluded.count, last_asked = excluded.last_asked",
+                [(key, examples[key], count, now) for key, count in pending.items()],
+            )
+            self._conn.commit()
+
+    def top(self, n: int) -> List[str]:
+        """The n most frequently asked questions, as first asked"""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question FROM questions ORDER BY count DESC, last_asked DESC LIMIT ?",
+                (n,),
+            ).fetchall()
+        return [question for (question,) in rows]
+
+    def clear(self) -> None:
+        """Forget all counted questions"""
+        with self._lock:
+            self._pending.clear()
+            self._examples.clear()
+            self._conn.execute("DELETE FROM questions")
+            self._conn.commit()
+
+
+def unique_questions(questions: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Drop (kind, question) pairs whose question repeats an earlier one after normalization"""
+    seen = set()
+    unique = []
+    for kind, question in questions:
+        normalized = SingleFlight.normalize(question)
+        if normalized and normalized not in seen:
+            seen.add(normalized)
+            unique.append((kind, question))
+    return unique
+
+
+def default_questions(cache_dir: str) -> List[Tuple[str, str]]:
+    """
+    The questions to precompute: one per curated topic, then the most frequent logged ones
+
+    Returns:
+        (kind, question) pairs, kind being "curated" or "frequent"
+    """
+    from data_loader import WikidocDataLoader
+
+    questions = [
+        ("curated", question)
+        for question in WikidocDataLoader(cache_dir=cache_dir).curated_questions()
+    ]
+    top_n = int(os.getenv("PRECOMPUTE_TOP_QUESTIONS", "50"))
+    question_log = QuestionLog.from_env(cache_dir)
+    if question_log and top_n > 0:
+        questions.extend(("frequent", question) for question in question_log.top(top_n))
+    return unique_questions(questions)
+
+
+class PrecomputedAnswers:
+    """
+    Answers generated ahead of time and matched to questions by intent
+
+    Entries live in SQLite, tagged with the index version (collection) they
+    were generated from, and are matched by cosine similarity of query
+    embeddings against a small in-memory matrix. Only entries for the
+    serving version are matched, so answers from an older index are never
+    served while new ones are being generated. Another process replacing
+    the entries is noticed within a second.
+    """
+
+    def __init__(self, path: str, model_name: str, threshold: float = 0.9, concurrency: int = 4):
+        self.path = path
+        self.model_name = model_name
+        self.threshold = threshold
+        self.concurrency = max(1, concurrency)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS precomputed ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "model TEXT NOT NULL, "
+            "index_version TEXT NOT NULL, "
+            "kind TEXT NOT NULL, "
+            "question TEXT NOT NULL, "
+            "embedding BLOB NOT NULL, "
+            "answer TEXT NOT NULL, "
+            "sources TEXT NOT NULL, "
+            "created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+        self._entries: List[Dict[str, Any]] = []
+        self._versions: Optional[np.ndarray] = None
+        self._matrix: Optional[np.ndarray] = None
+        self._data_version = None
+        self._checked_at = 0.0
+
+        self._lookups = 0
+        self._hits = 0
+
+        self._load()
+
+    @classmethod
+    def from_env(cls, cache_dir: str, model_name: str) -> Optional["PrecomputedAnswers"]:
+        """Build a store from PRECOMPUTED_* environment variables, or None if disabled"""
+        if (os.getenv("PRECOMPUTED_ANSWERS_ENABLED") or "true").lower() in ("0", "false", "no"):
+            return None
+        os.makedirs(cache_dir, exist_ok=True)
+        return cls(
+            path=os.path.join(cache_dir, "precomputed_answers.sqlite3"),
+            model_name=model_name,
+            threshold=float(os.getenv("PRECOMPUTED_THRESHOLD", "0.9")),
+            concurrency=int(os.getenv("PRECOMPUTE_CONCURRENCY", "4")),
+        )
+
+    def _load(self) -> None:
+        rows = self._conn.execute(
+            "SELECT index_version, kind, question, embedding, answer, sources "
+            "FROM precomputed WHERE model = ? ORDER BY id",
+            (self.model_name,),
+        ).fetchall()
+        self._entries = []
+        versions = []
+        vectors = []
+        for index_version, kind, question, blob, answer, sources in rows:
+            versions.append(index_version)
+            vectors.append(np.frombuffer(blob, dtype=np.float32))
+            self._entries.append({
+                "kind": kind,
+                "question": question,
+                "answer": answer,
+                "sources": json.loads(sources),
+            })
+        self._versions = np.array(versions) if versions else None
+        self._matrix = np.vstack(vectors) if vectors else None
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._checked_at = time.monotonic()
+
+    def _refresh_locked(self) -> None:
+        """Reload if another process changed the entries, checking at most once a second"""
+        if time.monotonic() - self._checked_at < 1.0:
+            return
+        self._checked_at = time.monotonic()
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+            self._load()
+
+    def match(self, embedding: List[float], index_version: str) -> Optional[Dict[str, Any]]:
+        """
+        Find the precomputed answer whose question best matches a query
+
+        Args:
+            embedding: Query embedding
+            index_version: Serving collection; entries for others are ignored
+
+        Returns:
+            Dict with the matched "question", its "answer" and "sources"
+            and the "similarity", or None below the threshold
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        with self._lock:
+            self._lookups += 1
+            self._refresh_locked()
+            if self._matrix is None or self._matrix.shape[1] != query.shape[0]:
+                return None
+
+            scores = np.where(self._versions == index_version, self._matrix @ query, -1.0)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            self._hits += 1
+            entry = self._entries[best]
+            return {
+                "question": entry["question"],
+                "answer": entry["answer"],
+                "sources": entry["sources"],
+                "similarity": round(float(scores[best]), 4),
+            }
+
+    def has_version(self, index_version: str) -> bool:
+        """Whether answers were generated from this index version"""
+        with self._lock:
+            self._refresh_locked()
+            return self._versions is not None and bool((self._versions == index_version).any())
+
+    def replace(self, index_version: str, entries: List[Dict[str, Any]]) -> None:
+        """
+        Swap in answers generated from an index version, dropping all others
+
+        Args:
+            index_version: Collection the answers were generated from
+            entries: Dicts with "kind", "question", "embedding", "answer"
+                and "sources"
+        """
+        now = time.time()
+        rows = []
+        for entry in entries:
+            vector = np.asarray(entry["embedding"], dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm:
+                vector = vector / norm
+            rows.append((
+                self.model_name, index_version, entry["kind"], entry["question"],
+                vector.tobytes(), entry["answer"], json.dumps(entry["sources"]), now,
+            ))
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM precomputed WHERE model = ?", (self.model_name,))
+                self._conn.executemany(
+                    "INSERT INTO precomputed (model, index_version, kind, question, "
+                    "embedding, answer, sources, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+            self._load()
+        logger.info(f"Stored {len(rows)} precomputed answers for {index_version}")
+
+    def clear(self) -> None:
+        """Drop all precomputed answers, e.g. after the index is reset"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM precomputed")
+            self._load()
+
+    def stats(self) -> Dict[str, Any]:
+        """Stored answers per version and kind, and the match rate since startup"""
+        with self._lock:
+            versions: Dict[str, int] = {}
+            kinds: Dict[str, int] = {}
+            if self._versions is not None:
+                for version, entry in zip(self._versions.tolist(), self._entries):
+                    versions[version] = versions.get(version, 0) + 1
+                    kinds[entry["kind"]] = kinds.get(entry["kind"], 0) + 1
+            return {
+                "entries": len(self._entries),
+                "versions": versions,
+                "kinds": kinds,
+                "lookups": self._lookups,
+                "hits": self._hits,
+                "hit_rate": round(self._hits / self._lookups, 4) if self._lookups else 0.0,
+            }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dotenv import load_dotenv
+
+    from llm_backends import apply_offline_defaults
+
+    load_dotenv()
+    apply_offline_defaults()
+
+    parser = argparse.ArgumentParser(
+        description="Generate answers for the curated topics and most frequent questions"
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Regenerate even if answers for the serving index version exist"
+    )
+    args = parser.parse_args()
+
+    from vector_store import MedicalVectorStore
+
+    store = MedicalVectorStore(persist_dir=os.getenv("CHROMA_DB_PATH", "./chroma_db"))
+    if not store.load_index():
+        raise SystemExit("No index to answer from; build one with /initialize first")
+    print(json.dumps(
+        store.precompute_answers(default_questions(store.cache_dir), force=args.force),
+        indent=2,
+    ))
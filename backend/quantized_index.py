@@ -0,0 +1,363 @@
+"""
+Compact vector index: int8 codes with IVF lists, rescored with exact floats
+kept elsewhere
+"""
+import json
+import math
+import os
+import shutil
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rows are processed in chunks of this size so builds and scans never hold
+# a full float copy of the corpus in memory.
+_CHUNK_ROWS = 8192
+
+
+def _kmeans(sample: np.ndarray, lists: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Centroids of sample (rows are vectors) by Lloyd's algorithm"""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest(sample, centroids)
+        for list_id in range(lists):
+            members = sample[assignment == list_id]
+            if len(members):
+                centroids[list_id] = members.mean(axis=0)
+            else:
+                # Re-seed empty lists so every list stays in use.
+                centroids[list_id] = sample[rng.integers(len(sample))]
+    return centroids
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid (squared L2) for each row"""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _CHUNK_ROWS):
+        chunk = np.asarray(vectors[start:start + _CHUNK_ROWS], dtype=np.float32)
+        distances = centroid_norms[None, :] - 2.0 * chunk @ centroids.T
+        assignment[start:start + len(chunk)] = distances.argmin(axis=1)
+    return assignment
+
+
+class _CompiledQuantizedIndex:
+    """One immutable, memory-mapped version of the index"""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.count = meta["count"]
+        self.dim = meta["dim"]
+        with open(os.path.join(path, "ids.json")) as f:
+            self.ids: List[str] = json.load(f)
+        if not self.count:
+            return
+        self.codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+        self.norms = np.load(os.path.join(path, "norms.npy"), mmap_mode="r")
+        # Centroids and list offsets are small; keep them in memory.
+        self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+
+
+class QuantizedIndex:
+    """
+    Approximate nearest-neighbour search over int8-quantized embeddings
+
+    Each vector is stored as int8 codes with a per-vector scale, grouped
+    into inverted lists around k-means centroids (IVF). A search scans the
+    nprobe lists closest to the query using the int8 codes, then rescores
+    the best rescore candidates with their exact float32 vectors. The index
+    keeps no float copy of its own: the caller supplies those vectors from
+    where they are already stored (the Chroma collection), so the index
+    adds about a quarter of the float vectors' size on disk. All arrays are
+    memory-mapped, so loading is cheap and only the rows a query touches
+    are paged in.
+
+    Distances are squared L2 and scores exp(-distance), matching Chroma's
+    default space and ChromaVectorStore's scores. Like the lexical index,
+    each build writes a new version directory and switches a CURRENT
+    pointer.
+    """
+
+    def __init__(self, directory: str, lists: int = 0, nprobe: int = 8, rescore: int = 100):
+        self.directory = directory
+        self.lists = lists
+        self.nprobe = max(1, nprobe)
+        self.rescore = max(1, rescore)
+        os.makedirs(directory, exist_ok=True)
+
+        self._index: Optional[_CompiledQuantizedIndex] = None
+
+    @classmethod
+    def from_env(cls, cache_dir: str, name: str) -> Optional["QuantizedIndex"]:
+        """Build an index from VECTOR_BACKEND / QUANT_* environment variables, or None if not selected"""
+        if (os.getenv("VECTOR_BACKEND") or "chroma").lower() != "quantized":
+            return None
+        return cls(
+            directory=os.path.join(cache_dir, f"{name}_quantized"),
+            lists=int(os.getenv("QUANT_IVF_LISTS", "0")),
+            nprobe=int(os.getenv("QUANT_NPROBE", "8")),
+            rescore=int(os.getenv("QUANT_RESCORE", "100")),
+        )
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    @property
+    def count(self) -> int:
+        return self._index.count if self._index else 0
+
+    def _current_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def load(self) -> bool:
+        """
+        Memory-map the current version
+
+        Returns:
+            True if a built index was found
+        """
+        version = self._current_version()
+        if version is None:
+            return False
+        try:
+            self._index = _CompiledQuantizedIndex(os.path.join(self.directory, version))
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load quantized index {version}: {e}")
+            return False
+
+    def _list_count(self, count: int) -> int:
+        if self.lists > 0:
+            return min(self.lists, count)
+        # Small corpora are scanned in full; IVF only pays off past that.
+        if count < 4096:
+            return 1
+        return min(4096, int(math.sqrt(count)))
+
+    def build(self, pages: Iterable[Tuple[Sequence[str], Any]], count: int) -> None:
+        """
+        Quantize vectors into a new version and switch to it
+
+        Args:
+            pages: (ids, vectors) chunks, vectors as a 2-D float array
+            count: Total number of vectors across all pages (upper bound)
+        """
+        previous = self._current_version()
+        version = f"v{int(previous[1:]) + 1}" if previous else "v1"
+        path = os.path.join(self.directory, version)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+        # Stage the raw vectors on disk first so the corpus is never held
+        # in memory as floats.
+        raw_path = os.path.join(path, "raw.npy")
+        raw = None
+        ids: List[str] = []
+        for page_ids, page_vectors in pages:
+            if not len(page_ids):
+                continue
+            page_vectors = np.asarray(page_vectors, dtype=np.float32)
+            if raw is None:
+                raw = np.lib.format.open_memmap(
+                    raw_path, mode="w+", dtype=np.float32, shape=(max(count, 1), page_vectors.shape[1])
+                )
+            if len(ids) + len(page_ids) > len(raw):
+                raise ValueError(f"More than {count} vectors given to build")
+            raw[len(ids):len(ids) + len(page_ids)] = page_vectors
+            ids.extend(page_ids)
+
+        total = len(ids)
+        dim = int(raw.shape[1]) if raw is not None else 0
+        if total:
+            self._write_arrays(path, raw[:total], ids)
+        else:
+            with open(os.path.join(path, "ids.json"), "w") as f:
+                json.dump([], f)
+        del raw
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"count": total, "dim": dim}, f)
+
+        pointer = os.path.join(self.directory, "CURRENT")
+        with open(f"{pointer}.tmp", "w") as f:
+            f.write(version)
+        os.replace(f"{pointer}.tmp", pointer)
+        self.load()
+
+        # Open memory maps of the old version stay valid after deletion.
+        if previous and previous != version:
+            shutil.rmtree(os.path.join(self.directory, previous), ignore_errors=True)
+        logger.info(
+            f"Quantized index {version}: {total} vectors, "
+            f"{len(self._index.centroids) if total else 0} lists"
+        )
+
+    def _write_arrays(self, path: str, raw: np.ndarray, ids: List[str]) -> None:
+        total, dim = raw.shape
+        lists = self._list_count(total)
+        if lists > 1:
+            rng = np.random.default_rng(0)
+            sample_size = min(total, lists * 64)
+            sample_rows = np.sort(rng.choice(total, sample_size, replace=False))
+            centroids = _kmeans(np.asarray(raw[sample_rows]), lists)
+            assignment = _nearest(raw, centroids)
+        else:
+            centroids = np.asarray(raw[:_CHUNK_ROWS], dtype=np.float32).mean(axis=0, keepdims=True)
+            assignment = np.zeros(total, dtype=np.int32)
+
+        # Store rows grouped by list so each list is one contiguous range.
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=lists))))
+
+        codes = np.lib.format.open_memmap(
+            os.path.join(path, "codes.npy"), mode="w+", dtype=np.int8, shape=(total, dim)
+        )
+        scales = np.empty(total, dtype=np.float32)
+        norms = np.empty(total, dtype=np.float32)
+        for start in range(0, total, _CHUNK_ROWS):
+            rows = order[start:start + _CHUNK_ROWS]
+            chunk = np.asarray(raw[rows], dtype=np.float32)
+            end = start + len(rows)
+            chunk_scales = np.abs(chunk).max(axis=1) / 127.0
+            chunk_scales[chunk_scales == 0] = 1.0
+            codes[start:end] = np.clip(np.rint(chunk / chunk_scales[:, None]), -127, 127)
+            scales[start:end] = chunk_scales
+            norms[start:end] = (chunk ** 2).sum(axis=1)
+        codes.flush()
+        del codes
+
+        np.save(os.path.join(path, "scales.npy"), scales)
+        np.save(os.path.join(path, "norms.npy"), norms)
+        np.save(os.path.join(path, "centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(path, "offsets.npy"), offsets.astype(np.int64))
+        with open(os.path.join(path, "ids.json"), "w") as f:
+            json.dump([ids[row] for row in order], f)
+
+    def candidates(self, embedding: Sequence[float], top_k: int = 10) -> List[str]:
+        """
+        Ids of the vectors nearest to a query embedding by their int8 codes
+
+        Returns:
+            Up to max(rescore, top_k) ids, to be rescored exactly
+        """
+        index = self._index
+        if index is None or not index.count:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+
+        lists = len(index.centroids)
+        if lists > self.nprobe:
+            centroid_distances = ((index.centroids - query) ** 2).sum(axis=1)
+            probe = np.argpartition(centroid_distances, self.nprobe - 1)[:self.nprobe]
+        else:
+            probe = np.arange(lists)
+
+        # Approximate distances from the int8 codes, without the constant
+        # |query|^2 term.
+        pool = max(self.rescore, top_k)
+        candidate_rows: List[np.ndarray] = []
+        candidate_distances: List[np.ndarray] = []
+        for list_id in probe:
+            list_start, list_end = int(index.offsets[list_id]), int(index.offsets[list_id + 1])
+            for start in range(list_start, list_end, _CHUNK_ROWS):
+                end = min(start + _CHUNK_ROWS, list_end)
+                dots = (index.codes[start:end].astype(np.float32) @ query) * index.scales[start:end]
+                distances = index.norms[start:end] - 2.0 * dots
+                if len(distances) > pool:
+                    keep = np.argpartition(distances, pool - 1)[:pool]
+                else:
+                    keep = np.arange(len(distances))
+                candidate_rows.append(keep + start)
+                candidate_distances.append(distances[keep])
+        if not candidate_rows:
+            return []
+        rows = np.concatenate(candidate_rows)
+        distances = np.concatenate(candidate_distances)
+        if len(rows) > pool:
+            rows = rows[np.argpartition(distances, pool - 1)[:pool]]
+
+        return [index.ids[row] for row in np.sort(rows)]
+
+    @staticmethod
+    def exact_scores(
+        embedding: Sequence[float], vectors: Mapping[str, Sequence[float]], top_k: int = 10
+    ) -> List[Tuple[str, float]]:
+        """
+        Exact scores for candidate vectors
+
+        Args:
+            embedding: Query embedding
+            vectors: Float vectors of the candidates, by id
+
+        Returns:
+            Up to top_k (id, score) pairs, best first
+        """
+        if not vectors:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        ids = list(vectors)
+        exact = ((np.asarray([vectors[node_id] for node_id in ids], dtype=np.float32) - query) ** 2).sum(axis=1)
+        best = np.argsort(exact)[:top_k]
+        return [(ids[i], math.exp(-float(exact[i]))) for i in best]
+
+    def search(
+        self,
+        embedding: Sequence[float],
+        top_k: int,
+        fetch_vectors: Callable[[List[str]], Mapping[str, Sequence[float]]]
+    ) -> List[Tuple[str, float]]:
+        """
+        Nearest vectors to a query embedding
+
+        Args:
+            embedding: Query embedding
+            top_k: Number of results
+            fetch_vectors: Float vectors for a list of ids, by id, e.g.
+                read from the Chroma collection the index was built from
+
+        Returns:
+            Up to top_k (id, score) pairs, best first
+        """
+        return self.exact_scores(embedding, fetch_vectors(self.candidates(embedding, top_k)), top_k)
+
+    def clear(self) -> None:
+        """Drop all built versions"""
+        self._index = None
+        for entry in os.listdir(self.directory):
+            path = os.path.join(self.directory, entry)
+            if entry == "CURRENT":
+                os.remove(path)
+            elif os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        index = self._index
+        version = self._current_version()
+        size = 0
+        if version:
+            version_path = os.path.join(self.directory, version)
+            for entry in os.listdir(version_path):
+                size += os.path.getsize(os.path.join(version_path, entry))
+        return {
+            "version": version,
+            "vectors": index.count if index else 0,
+            "dim": index.dim if index else 0,
+            "lists": len(index.centroids) if index and index.count else 0,
+            "nprobe": self.nprobe,
+            "rescore": self.rescore,
+            "disk_bytes": size,
+        }
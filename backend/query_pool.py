@@ -0,0 +1,379 @@
+"""
+Bounded worker pool with admission control for blocking query work
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, Optional, Tuple
+import logging
+
+from llm_backends import llm_is_local
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class QueryRejected(Exception):
+    """Raised when the pool cannot accept more work"""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+_STREAM_DONE = object()
+
+# Per-process state used when queries run in a process pool. Each worker
+# process builds its own vector store and loads the persisted index once.
+_worker_store = None
+
+
+def _init_process_worker(persist_dir: str) -> None:
+    global _worker_store
+    from vector_store import MedicalVectorStore
+
+    _worker_store = MedicalVectorStore(persist_dir=persist_dir)
+    if not _worker_store.load_index():
+        logger.warning(f"Query worker {os.getpid()} started without an index")
+
+
+def _process_query(query_text: str) -> Dict[str, Any]:
+    if _worker_store is None:
+        raise ValueError("Query worker not initialized")
+    return _worker_store.query_with_details(query_text)
+
+
+class _PooledStream:
+    """
+    Async iterator over a blocking streaming call that holds a pool slot
+
+    The slot is released when the items run out, when iterating raises
+    (including cancellation when the client goes away), on aclose(), and
+    as a backstop when the stream is garbage collected, so a stream closed
+    before its first item doesn't leak the slot. Unless the items ran out,
+    the underlying generator is closed too, on the executor it runs on, so
+    an abandoned LLM call stops and frees its connection.
+    """
+
+    def __init__(
+        self,
+        pool: "QueryPool",
+        slots: asyncio.Semaphore,
+        started: float,
+        executor: Optional[Executor],
+        fn: Callable[..., Iterable[Any]],
+        args: Tuple[Any, ...],
+    ):
+        self._pool = pool
+        self._slots = slots
+        self._started = started
+        self._executor = executor
+        self._fn = fn
+        self._args = args
+        self._loop = asyncio.get_running_loop()
+        # Serializes next() and close(); a cancelled __anext__ leaves its
+        # next() running, and a generator can't be closed while it runs.
+        self._lock = threading.Lock()
+        self._iterator: Optional[Iterator[Any]] = None
+        self._closed = False
+        self._released = False
+
+    def __aiter__(self) -> "_PooledStream":
+        return self
+
+    def _next(self) -> Any:
+        with self._lock:
+            if self._closed:
+                return _STREAM_DONE
+            if self._iterator is None:
+                self._iterator = iter(self._fn(*self._args))
+            return next(self._iterator, _STREAM_DONE)
+
+    def _close_iterator(self) -> None:
+        with self._lock:
+            self._closed = True
+            iterator, self._iterator = self._iterator, None
+            close = getattr(iterator, "close", None)
+            if close is None:
+                return
+            try:
+                close()
+            except Exception as e:
+                logger.warning(f"Error closing stream: {e}")
+
+    async def __anext__(self) -> Any:
+        if self._released:
+            raise StopAsyncIteration
+        try:
+            item = await self._loop.run_in_executor(self._executor, self._next)
+        except BaseException:
+            self._release()
+            raise
+        if item is _STREAM_DONE:
+            self._free_slot()
+            raise StopAsyncIteration
+        return item
+
+    async def aclose(self) -> None:
+        """Stop iterating, free the slot and close the underlying generator"""
+        if self._released:
+            return
+        self._free_slot()
+        await self._loop.run_in_executor(self._executor, self._close_iterator)
+
+    def _free_slot(self) -> None:
+        if not self._released:
+            self._released = True
+            self._pool._release(self._slots, self._started)
+
+    def _release(self) -> None:
+        """Free the slot and close the generator in the background"""
+        if self._released:
+            return
+        self._free_slot()
+        try:
+            self._loop.call_soon_threadsafe(
+                self._loop.run_in_executor, self._executor, self._close_iterator
+            )
+        except RuntimeError:
+            # The event loop is closed; close here instead.
+            self._close_iterator()
+
+    def __del__(self) -> None:
+        self._release()
+
+
+class QueryPool:
+    """
+    Run blocking queries off the event loop with a max-in-flight limit
+    and a bounded wait queue.
+
+    Requests beyond max_workers wait in the queue; once the queue is full
+    new requests are rejected with 429, and requests that wait longer than
+    queue_timeout are rejected with 503. Both carry a Retry-After estimate
+    based on recent service times.
+
+    Modes:
+        thread: Queries run on max_workers threads
+        process: Queries run in max_workers processes, each with its own
+            copy of the index
+        async: Queries are awaited on the event loop (MedicalVectorStore.aquery),
+            so max_workers can be in the hundreds; their blocking stages use
+            the default thread pool
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_queue: int = 16,
+        queue_timeout: float = 30.0,
+        mode: str = "thread",
+        persist_dir: str = "./chroma_db",
+    ):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.mode = mode
+        self.persist_dir = persist_dir
+
+        self._executor: Optional[Executor] = None
+        self._executor_lock = threading.Lock()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._waiting = 0
+        self._avg_service_time = 1.0
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+    @classmethod
+    def from_env(cls, persist_dir: str = "./chroma_db") -> "QueryPool":
+        """
+        Build a pool from QUERY_POOL_* environment variables
+
+        Defaults to async mode with 256 queries in flight, or thread mode
+        with 4 when the LLM runs in-process and can't be awaited.
+        """
+        mode = (os.getenv("QUERY_POOL_MODE") or ("thread" if llm_is_local() else "async")).lower()
+        return cls(
+            max_workers=int(os.getenv("QUERY_POOL_WORKERS") or (256 if mode == "async" else 4)),
+            max_queue=int(os.getenv("QUERY_POOL_QUEUE", "16")),
+            queue_timeout=float(os.getenv("QUERY_POOL_QUEUE_TIMEOUT", "30")),
+            mode=mode,
+            persist_dir=persist_dir,
+        )
+
+    def _get_executor(self) -> Executor:
+        with self._executor_lock:
+            if self._executor is None:
+                if self.mode == "process":
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        initializer=_init_process_worker,
+                        initargs=(self.persist_dir,),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="query",
+                    )
+            return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        return self._slots
+
+    def _retry_after(self) -> int:
+        backlog = self._in_flight + self._waiting
+        estimate = self._avg_service_time * (backlog / self.max_workers + 1)
+        return max(1, int(round(estimate)))
+
+    async def _acquire(self) -> asyncio.Semaphore:
+        if self._in_flight + self._waiting >= self.max_workers + self.max_queue:
+            self._rejected += 1
+            raise QueryRejected(
+                "Server is busy, too many queries in progress",
+                status_code=429,
+                retry_after=self._retry_after(),
+            )
+
+        slots = self._get_slots()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._timed_out += 1
+            raise QueryRejected(
+                "Timed out waiting for a free query worker",
+                status_code=503,
+                retry_after=self._retry_after(),
+            )
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        return slots
+
+    def _release(self, slots: asyncio.Semaphore, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * elapsed
+        self._completed += 1
+        self._in_flight -= 1
+        slots.release()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run fn(*args) on the pool, waiting for a free slot if needed
+
+        In process mode fn must be picklable; use run_query for queries.
+
+        Raises:
+            QueryRejected: If the wait queue is full or the wait times out
+        """
+        slots = await self._acquire()
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), functools.partial(fn, *args)
+            )
+        finally:
+            self._release(slots, started)
+
+    async def run_async(self, fn: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """
+        Await fn(*args) on the event loop, waiting for a free slot if needed
+
+        Raises:
+            QueryRejected: If the wait queue is full or the wait times out
+        """
+        slots = await self._acquire()
+        started = time.perf_counter()
+        try:
+            return await fn(*args)
+        finally:
+            self._release(slots, started)
+
+    async def run_local(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Like run, but always in this process
+
+        Uses the pool's threads in thread mode and the default thread pool
+        otherwise, so fn can be any callable.
+
+        Raises:
+            QueryRejected: If the wait queue is full or the wait times out
+        """
+        slots = await self._acquire()
+        started = time.perf_counter()
+        executor = self._get_executor() if self.mode == "thread" else None
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, functools.partial(fn, *args))
+        finally:
+            self._release(slots, started)
+
+    async def stream(
+        self, fn: Callable[..., Iterable[Any]], *args: Any
+    ) -> AsyncIterator[Any]:
+        """
+        Admit a streaming call and return an async iterator over its items
+
+        Admission happens before this returns, so rejections can still be
+        turned into an HTTP error. The slot is held until the iterator is
+        exhausted or closed, even if it is closed before it is iterated.
+        Generators cannot cross process boundaries, so outside thread mode
+        the items are produced on the default thread pool.
+
+        Raises:
+            QueryRejected: If the wait queue is full or the wait times out
+        """
+        slots = await self._acquire()
+        executor = self._get_executor() if self.mode == "thread" else None
+        return _PooledStream(self, slots, time.perf_counter(), executor, fn, args)
+
+    async def run_query(self, store: Any, query_text: str) -> Dict[str, Any]:
+        """Run a vector store query on the pool, returning its answer, sources and timings"""
+        if self.mode == "process":
+            return await self.run(_process_query, query_text)
+        if self.mode == "async":
+            return await self.run_async(store.aquery, query_text)
+        return await self.run(store.query_with_details, query_text)
+
+    def restart(self) -> None:
+        """
+        Drop the current executor so the next query starts fresh workers.
+
+        Needed in process mode after the index is rebuilt or reset, since
+        each worker process holds its own copy of the index.
+        """
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def shutdown(self) -> None:
+        """Stop the executor and wait for running queries to finish"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current pool occupancy and counters"""
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "timed_out": self._timed_out,
+            "avg_service_time": round(self._avg_service_time, 3),
+        }
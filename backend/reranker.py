@@ -0,0 +1,240 @@
+"""
+Cross-encoder reranking of retrieved candidates, with a score cache
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import logging
+
+from llama_index.core.schema import NodeWithScore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class RerankCache:
+    """
+    Scores of (query, passage) pairs in a bounded in-memory LRU backed by
+    a SQLite file
+
+    Keys are hashes of (model name, normalized query, passage text), so a
+    passage that is re-ingested unchanged keeps its cached scores.
+    """
+
+    def __init__(self, path: str, max_entries: int = 50000):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, float]" = OrderedDict()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "key TEXT PRIMARY KEY, "
+            "score REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def make_key(model_name: str, query: str, text: str) -> str:
+        normalized = " ".join(query.split()).casefold()
+        return hashlib.sha256(f"{model_name}\0{normalized}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, score: float) -> None:
+        self._memory[key] = score
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, float]:
+        found: Dict[str, float] = {}
+        with self._lock:
+            pending = []
+            for key in dict.fromkeys(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                else:
+                    pending.append(key)
+
+            # Stay under SQLite's bound-parameter limit.
+            for start in range(0, len(pending), 500):
+                chunk = pending[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, score FROM scores WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, score in rows:
+                    found[key] = score
+                    self._remember(key, score)
+
+            self._hits += len(found)
+            self._misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, float]) -> None:
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scores (key, score) VALUES (?, ?)",
+                list(items.items()),
+            )
+            self._conn.commit()
+            for key, score in items.items():
+                self._remember(key, score)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "memory_entries": len(self._memory),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class CrossEncoderReranker:
+    """
+    Score (query, passage) pairs with a small local cross-encoder on CPU
+
+    The model is loaded on first use. Pairs from any number of queries are
+    scored together in batches of batch_size, and scores are cached per
+    pair so repeated queries skip the model entirely.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        batch_size: int = 32,
+        max_length: int = 512,
+        cache: Optional[RerankCache] = None,
+    ):
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.max_length = max_length
+        self.cache = cache
+
+        self._load_lock = threading.Lock()
+        self._predict_lock = threading.Lock()
+        self._tokenizer = None
+        self._model = None
+
+    @classmethod
+    def from_env(cls, cache_dir: str) -> Optional["CrossEncoderReranker"]:
+        """Build a reranker from RERANK* environment variables, or None if disabled"""
+        if (os.getenv("RERANKER") or "none").lower() != "cross_encoder":
+            return None
+        cache = None
+        if (os.getenv("RERANK_CACHE_ENABLED") or "true").lower() not in ("0", "false", "no"):
+            os.makedirs(cache_dir, exist_ok=True)
+            cache = RerankCache(
+                os.path.join(cache_dir, "rerank.sqlite3"),
+                max_entries=int(os.getenv("RERANK_CACHE_MAX_ENTRIES", "50000")),
+            )
+        return cls(
+            model_name=os.getenv("RERANKER_MODEL") or "cross-encoder/ms-marco-MiniLM-L-6-v2",
+            batch_size=int(os.getenv("RERANK_BATCH_SIZE", "32")),
+            max_length=int(os.getenv("RERANK_MAX_LENGTH", "512")),
+            cache=cache,
+        )
+
+    def _load(self) -> None:
+        with self._load_lock:
+            if self._model is not None:
+                return
+            try:
+                from transformers import AutoModelForSequenceClassification, AutoTokenizer
+            except ImportError as e:
+                raise ImportError(
+                    "RERANKER=cross_encoder needs transformers and torch installed"
+                ) from e
+            logger.info(f"Loading reranker {self.model_name}")
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+            model.eval()
+            self._model = model
+
+    def _predict(self, pairs: Sequence[Tuple[str, str]]) -> List[float]:
+        import torch
+
+        self._load()
+        scores: List[float] = []
+        with self._predict_lock, torch.no_grad():
+            for start in range(0, len(pairs), self.batch_size):
+                batch = pairs[start:start + self.batch_size]
+                features = self._tokenizer(
+                    [query for query, _ in batch],
+                    [text for _, text in batch],
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_length,
+                    return_tensors="pt",
+                )
+                logits = self._model(**features).logits
+                if logits.shape[-1] == 1:
+                    batch_scores = logits[:, 0]
+                else:
+                    batch_scores = torch.softmax(logits, dim=-1)[:, -1]
+                scores.extend(batch_scores.tolist())
+        return scores
+
+    def rerank_many(
+        self,
+        requests: Sequence[Tuple[str, List[NodeWithScore]]],
+        top_n: int,
+    ) -> List[List[NodeWithScore]]:
+        """
+        Rerank the candidates of several queries in shared batches
+
+        Args:
+            requests: (query, candidate nodes) pairs
+            top_n: Nodes to keep per query
+
+        Returns:
+            Per query, its top_n nodes by cross-encoder score
+        """
+        pairs = []
+        for query, nodes in requests:
+            for node in nodes:
+                pairs.append((query, node.node.get_content()))
+        keys = [RerankCache.make_key(self.model_name, query, text) for query, text in pairs]
+
+        scores = self.cache.get_many(keys) if self.cache else {}
+        missing = [i for i, key in enumerate(keys) if key not in scores]
+        if missing:
+            computed = self._predict([pairs[i] for i in missing])
+            new_scores = {keys[i]: score for i, score in zip(missing, computed)}
+            if self.cache:
+                self.cache.put_many(new_scores)
+            scores.update(new_scores)
+
+        results = []
+        position = 0
+        for _, nodes in requests:
+            scored = []
+            for node in nodes:
+                scored.append(NodeWithScore(node=node.node, score=scores[keys[position]]))
+                position += 1
+            scored.sort(key=lambda node: node.score, reverse=True)
+            results.append(scored[:top_n])
+        return results
+
+    def rerank(self, query: str, nodes: List[NodeWithScore], top_n: int) -> List[NodeWithScore]:
+        """Rerank one query's candidates and keep the best top_n"""
+        return self.rerank_many([(query, nodes)], top_n)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "loaded": self._model is not None,
+            "cache": self.cache.stats() if self.cache else None,
+        }
@@ -0,0 +1,107 @@
+"""
+Coalesce identical concurrent queries into one computation
+"""
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    """
+    Let concurrent requests for the same key share one in-progress call
+
+    The first request for a key (the leader) starts the computation as its
+    own task; requests arriving while it runs (followers) wait for the same
+    task instead of starting another. All of them receive its result or its
+    exception. Because the task isn't tied to the leader, a client that
+    disconnects doesn't cancel the answer the others are waiting for.
+
+    Nothing is kept once the call finishes; repeats after that are the
+    answer cache's job. Optionally, per-key counts for the most recent keys
+    are kept for /status, labelled by a hash of the key so the questions
+    themselves are never exposed.
+
+    Usage:
+        flights = SingleFlight()
+        result, shared = await flights.run(key, lambda: compute())
+    """
+
+    def __init__(self, max_tracked_keys: int = 0):
+        self.max_tracked_keys = max(0, max_tracked_keys)
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._keys: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self._leaders = 0
+        self._followers = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["SingleFlight"]:
+        """Build from QUERY_COALESCE_* environment variables, or None if disabled"""
+        if (os.getenv("QUERY_COALESCE_ENABLED") or "true").lower() in ("0", "false", "no"):
+            return None
+        return cls(max_tracked_keys=int(os.getenv("QUERY_COALESCE_TRACKED_KEYS", "0")))
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """Case-fold, collapse whitespace and drop trailing punctuation"""
+        return " ".join(question.split()).casefold().rstrip(" ?!.")
+
+    def _count(self, question: str, role: str) -> None:
+        if not self.max_tracked_keys:
+            return
+        label = hashlib.sha256(question.encode("utf-8")).hexdigest()[:12]
+        counts = self._keys.pop(label, None) or {"leaders": 0, "followers": 0}
+        counts[role] += 1
+        self._keys[label] = counts
+        while len(self._keys) > self.max_tracked_keys:
+            self._keys.popitem(last=False)
+
+    async def run(
+        self, key: Tuple[str, Any], fn: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """
+        Await fn(), or the call already running for key
+
+        Args:
+            key: Normalized question and anything else that must match,
+                e.g. the index generation; key[0] labels the per-key stats
+            fn: Starts the computation; only called by the leader
+
+        Returns:
+            The result and whether it came from another request's call
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            self._followers += 1
+            self._count(key[0], "followers")
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+        self._leaders += 1
+        self._count(key[0], "leaders")
+
+        def _done(finished: "asyncio.Future[Any]") -> None:
+            if self._calls.get(key) is finished:
+                del self._calls[key]
+            # Retrieve the exception so it isn't reported as unhandled
+            # when every waiter has gone away.
+            if not finished.cancelled():
+                finished.exception()
+
+        task.add_done_callback(_done)
+        return await asyncio.shield(task), False
+
+    def stats(self) -> Dict[str, Any]:
+        """Leader and follower counts, overall and for the most recent keys if tracked (most shared first)"""
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self._leaders,
+            "followers": self._followers,
+            "keys": sorted(
+                ({"key": label, **counts} for label, counts in self._keys.items()),
+                key=lambda entry: entry["followers"],
+                reverse=True,
+            ),
+        }
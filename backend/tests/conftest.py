@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+# Backend modules import each other by their top-level names.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """An empty MedicalVectorStore with the offline hash embedding, under tmp_path"""
+    monkeypatch.setenv("EMBEDDING_PROVIDER", "hash")
+    monkeypatch.setenv("HASH_EMBEDDING_DIM", "64")
+    monkeypatch.setenv("LLM_BACKEND", "openai_like")
+    monkeypatch.setenv("LLM_API_BASE", "http://127.0.0.1:9/v1")
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("RETRIEVAL_MODE", "vector")
+    monkeypatch.delenv("VECTOR_BACKEND", raising=False)
+    monkeypatch.delenv("RERANKER", raising=False)
+    from vector_store import MedicalVectorStore
+
+    return MedicalVectorStore(persist_dir=str(tmp_path / "chroma"))
+
+
+def documents(count: int = 12, tag: str = ""):
+    topics = ["metformin lowers blood glucose", "asthma inhalers open airways", "aspirin reduces fever"]
+    return [
+        {"text": f"{topics[i % len(topics)]} {tag} note {i}", "metadata": {"doc_id": str(i)}}
+        for i in range(count)
+    ]
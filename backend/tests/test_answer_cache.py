@@ -0,0 +1,86 @@
+import math
+
+import answer_cache
+from answer_cache import SemanticAnswerCache
+
+
+def _cache(tmp_path, model_name="hash-4", **kwargs):
+    return SemanticAnswerCache(str(tmp_path / "answers.sqlite3"), model_name=model_name, **kwargs)
+
+
+def test_clear_keeps_other_models_answers(tmp_path):
+    first = _cache(tmp_path, "hash-4")
+    other = _cache(tmp_path, "openai:text-embedding-3-small")
+    first.store("flu", [1, 0, 0, 0], "rest and fluids", [], 1.0)
+    other.store("flu", [0, 1, 0, 0], "see a doctor", [], 1.0)
+
+    first.clear()
+    other.reload()
+
+    assert first.stats()["entries"] == 0
+    assert other.lookup([0, 1, 0, 0]) == ("see a doctor", [])
+
+
+def _at_angle(cosine):
+    """A unit vector whose cosine similarity with [1, 0, 0, 0] is cosine"""
+    return [cosine, math.sqrt(1 - cosine ** 2), 0, 0]
+
+
+def test_lookup_hits_at_the_threshold_and_misses_below(tmp_path):
+    cache = _cache(tmp_path)
+    cache.store("flu", [1, 0, 0, 0], "rest and fluids", [{"doc_id": "1"}], 2.0)
+
+    assert cache.lookup([2, 0, 0, 0]) == ("rest and fluids", [{"doc_id": "1"}])
+    assert cache.lookup(_at_angle(0.951)) is not None
+    assert cache.lookup(_at_angle(0.949)) is None
+    assert cache.lookup([0, 1, 0, 0]) is None
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["lookups"] == 4
+
+
+def test_entries_expire_after_the_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = _cache(tmp_path, ttl=60)
+    cache.store("flu", [1, 0, 0, 0], "rest and fluids", [], 1.0)
+
+    now[0] += 59
+    assert cache.lookup([1, 0, 0, 0]) is not None
+    now[0] += 2
+    assert cache.lookup([1, 0, 0, 0]) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = _cache(tmp_path, max_entries=2)
+    cache.store("flu", [1, 0, 0, 0], "flu answer", [], 1.0)
+    now[0] += 1
+    cache.store("asthma", [0, 1, 0, 0], "asthma answer", [], 1.0)
+    now[0] += 1
+    assert cache.lookup([1, 0, 0, 0]) is not None
+
+    now[0] += 1
+    cache.store("migraine", [0, 0, 1, 0], "migraine answer", [], 1.0)
+
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup([0, 1, 0, 0]) is None
+    assert cache.lookup([1, 0, 0, 0]) == ("flu answer", [])
+    assert cache.lookup([0, 0, 1, 0]) == ("migraine answer", [])
+    # The eviction is persisted, not just dropped from memory.
+    assert _cache(tmp_path, max_entries=2).stats()["entries"] == 2
+
+
+def test_reload_picks_up_another_process_entries(tmp_path):
+    cache = _cache(tmp_path)
+    writer = _cache(tmp_path)
+    writer.store("flu", [1, 0, 0, 0], "rest and fluids", [], 1.0)
+    assert cache.lookup([1, 0, 0, 0]) is None
+
+    cache.reload()
+
+    assert cache.lookup([1, 0, 0, 0]) == ("rest and fluids", [])
+    writer.clear()
+    cache.reload()
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,55 @@
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from context_budget import ContextBudget
+
+QUERY = "What are the symptoms of diabetes?"
+CONTEXT = (
+    "Question: What are the symptoms of diabetes? "
+    "Answer: Common signs include increased thirst, frequent urination and blurred vision."
+)
+
+
+def _nodes(*texts):
+    return [
+        NodeWithScore(node=TextNode(text=text, id_=f"node-{i}"), score=1.0 - i / 10)
+        for i, text in enumerate(texts)
+    ]
+
+
+def _text(nodes):
+    return " ".join(node.node.get_content() for node in nodes)
+
+
+def test_context_under_budget_is_unchanged():
+    nodes = _nodes(CONTEXT, "Type 2 diabetes often develops slowly.")
+    budget = ContextBudget(max_tokens=1024, tokenizer=str.split)
+
+    compressed, stats = budget.apply(QUERY, nodes)
+
+    assert compressed == nodes
+    assert stats["prompt_tokens_after"] == stats["prompt_tokens_before"]
+    assert stats["nodes_after"] == stats["nodes_before"] == 2
+
+
+def test_answer_sentence_without_query_terms_is_kept():
+    filler = " ".join(["Unrelated notes about hospital parking rules."] * 20)
+    nodes = _nodes(CONTEXT, filler)
+    budget = ContextBudget(max_tokens=40, tokenizer=str.split)
+
+    compressed, stats = budget.apply(QUERY, nodes)
+
+    text = _text(compressed)
+    assert "increased thirst" in text
+    assert stats["prompt_tokens_after"] <= 40 < stats["prompt_tokens_before"]
+
+
+def test_matching_sentences_come_before_document_order():
+    nodes = _nodes(
+        "Exercise helps general health. " * 5,
+        "Diabetes symptoms include thirst and fatigue.",
+    )
+    budget = ContextBudget(max_tokens=20, tokenizer=str.split)
+
+    compressed, _ = budget.apply(QUERY, nodes)
+
+    assert "Diabetes symptoms include thirst" in _text(compressed)
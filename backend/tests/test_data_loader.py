@@ -0,0 +1,51 @@
+import pyarrow as pa
+import pytest
+
+from data_loader import WikidocDataLoader, _prepare_batch, _truncate, _truncate_column
+
+# Multi-byte text: accents (2 bytes), CJK (3 bytes), emoji (4 bytes) and a
+# combining accent, which is its own code point.
+PIECES = ["a", "é", "中", "🩺", "é"]
+
+
+def _values():
+    values = ["", "short", None]
+    for piece in PIECES:
+        for length in (196, 197, 198, 199, 200, 201, 202, 203, 400):
+            values.append((piece * length)[:length])
+            # Multi-byte characters right where the cut falls.
+            values.append("x" * 195 + piece * (length - 195))
+    return values
+
+
+@pytest.mark.parametrize("max_len", [200, 10, 4])
+def test_truncate_column_matches_truncate(max_len):
+    values = _values()
+    column = pa.chunked_array([pa.array(values[:20], pa.string()), pa.array(values[20:], pa.string())])
+
+    truncated = _truncate_column(pa.chunked_array(
+        [chunk.fill_null("") for chunk in column.chunks]
+    ), max_len).to_pylist()
+
+    assert truncated == [_truncate(value or "", max_len) for value in values]
+
+
+def test_prepared_batch_matches_row_documents():
+    rows = [
+        {"input": "中" * 250, "output": "🩺 " * 120},
+        {"input": "What is é" + "é" * 200, "output": None},
+        {"input": None, "output": "short"},
+    ]
+    loader = WikidocDataLoader(dataset_name="fixture", cache_dir=None)
+    make_document = loader._document_factory("input", "output")
+
+    prepared = _prepare_batch(
+        pa.Table.from_pylist(rows), [5, 6, 7], "input", "output", "fixture"
+    ).to_pylist()
+
+    for index, row, document in zip([5, 6, 7], rows, prepared):
+        expected = make_document(index, row)
+        assert document["text"] == expected["text"]
+        assert document["doc_id"] == expected["metadata"]["doc_id"]
+        assert document["question"] == expected["metadata"]["question"]
+        assert document["answer"] == expected["metadata"]["answer"]
@@ -0,0 +1,83 @@
+import pytest
+
+from conftest import documents
+
+
+def _record(store, monkeypatch, events):
+    write_alias, drop_version = store._write_alias, store._drop_version
+
+    def recording_write_alias(name, previous):
+        events.append(("swap", name))
+        write_alias(name, previous)
+
+    def recording_drop_version(name):
+        events.append(("drop", name))
+        drop_version(name)
+
+    monkeypatch.setattr(store, "_write_alias", recording_write_alias)
+    monkeypatch.setattr(store, "_drop_version", recording_drop_version)
+
+
+def test_failed_validation_keeps_the_old_version_serving(store, monkeypatch):
+    store.create_index(documents(tag="first"))
+    store.create_index(documents(tag="second"))
+    assert store.serving_collection_name() == "medical_wikidoc_v2"
+
+    def fail(*args, **kwargs):
+        raise ValueError("smoke query returned no results")
+
+    monkeypatch.setattr(store, "_validate_version", fail)
+    with pytest.raises(ValueError):
+        store.create_index(documents(tag="third"))
+
+    alias = store._read_alias()
+    assert alias["collection"] == "medical_wikidoc_v2"
+    assert alias["previous"] == "medical_wikidoc_v1"
+    assert store.collection.name == "medical_wikidoc_v2"
+    # The broken version is dropped; nothing older is collected.
+    assert sorted(store._version_names()) == ["medical_wikidoc_v1", "medical_wikidoc_v2"]
+    assert "second" in store.retrieve("metformin")[0].node.get_content()
+
+
+def test_old_versions_are_collected_only_after_the_swap(store, monkeypatch):
+    store.create_index(documents(tag="first"))
+    store.create_index(documents(tag="second"))
+    events = []
+    _record(store, monkeypatch, events)
+
+    store.create_index(documents(tag="third"))
+
+    # The first drop clears leftovers of an interrupted build of v3.
+    assert events == [
+        ("drop", "medical_wikidoc_v3"),
+        ("swap", "medical_wikidoc_v3"),
+        ("drop", "medical_wikidoc_v1"),
+    ]
+    assert sorted(store._version_names()) == ["medical_wikidoc_v2", "medical_wikidoc_v3"]
+    assert store._read_alias()["previous"] == "medical_wikidoc_v2"
+
+
+def test_served_versions_are_never_collected(store, monkeypatch):
+    monkeypatch.setattr(store, "keep_versions", 10)
+    for tag in ("first", "second", "third"):
+        store.create_index(documents(tag=tag))
+    # The alias was rolled back to v3 from v1, which workers may still serve.
+    store._write_alias("medical_wikidoc_v3", previous="medical_wikidoc_v1")
+    monkeypatch.setattr(store, "keep_versions", 1)
+
+    store._collect_old_versions()
+
+    assert sorted(store._version_names()) == ["medical_wikidoc_v1", "medical_wikidoc_v3"]
+
+
+def test_unchanged_build_keeps_serving_without_a_swap(store, monkeypatch):
+    store.create_index(documents())
+    events = []
+    _record(store, monkeypatch, events)
+
+    stats = store.create_index(documents())
+
+    assert stats["unchanged"] == stats["documents"]
+    # v2 is built, found identical and discarded.
+    assert events == [("drop", "medical_wikidoc_v2"), ("drop", "medical_wikidoc_v2")]
+    assert store.serving_collection_name() == "medical_wikidoc_v1"
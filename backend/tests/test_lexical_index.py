@@ -0,0 +1,118 @@
+import math
+
+import pytest
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from lexical_index import LexicalIndex, tokenize
+from vector_store import HybridRetriever
+
+TEXTS = {
+    "a": "Metformin lowers blood glucose in type 2 diabetes",
+    "b": "Insulin lowers blood glucose quickly; insulin is injected",
+    "c": "Asthma inhalers open the airways",
+    "d": "Beta-blockers slow the heart rate",
+}
+
+
+def _index(path, texts=TEXTS):
+    index = LexicalIndex(str(path))
+    index.add_texts((node_id, f"doc-{node_id}", text) for node_id, text in texts.items())
+    index.compile()
+    return index
+
+
+def _bm25(query, texts, k1=1.5, b=0.75):
+    """Reference BM25 scores, straight from the formula"""
+    documents = {node_id: tokenize(text) for node_id, text in texts.items()}
+    avg_length = sum(len(terms) for terms in documents.values()) / len(documents)
+    scores = {}
+    for node_id, terms in documents.items():
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in other for other in documents.values())
+            tf = terms.count(term)
+            if not tf:
+                continue
+            idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(terms) / avg_length))
+        if score:
+            scores[node_id] = score
+    return scores
+
+
+def test_search_matches_reference_bm25(tmp_path):
+    index = _index(tmp_path)
+    for query in ["insulin glucose", "blood", "asthma airways", "beta heart", "unknown words"]:
+        expected = _bm25(query, TEXTS)
+        found = index.search(query, top_k=10)
+        assert [node_id for node_id, _ in found] == sorted(expected, key=expected.get, reverse=True)
+        for node_id, score in found:
+            assert score == pytest.approx(expected[node_id], rel=1e-5)
+
+
+def test_top_k_limits_results(tmp_path):
+    assert [node_id for node_id, _ in _index(tmp_path).search("lowers blood glucose", top_k=1)] == ["a"]
+
+
+def test_compiled_index_reopens_from_disk(tmp_path):
+    built = _index(tmp_path)
+    expected = built.search("glucose insulin", top_k=10)
+
+    reopened = LexicalIndex(str(tmp_path))
+    assert reopened.load()
+    assert reopened.search("glucose insulin", top_k=10) == expected
+    assert reopened.stats() == built.stats()
+
+
+def test_recompile_switches_versions_and_keeps_terms_findable(tmp_path):
+    index = _index(tmp_path)
+    index.remove_documents(["doc-c"])
+    index.add_texts([("e", "doc-e", "Ibuprofen eases pain; café au lait spots, Ärztin")])
+    index.compile()
+
+    assert index.stats()["version"] == "v2"
+    assert index.search("asthma", top_k=10) == []
+    assert [node_id for node_id, _ in index.search("ärztin café", top_k=10)] == ["e"]
+    assert sorted(node_id for node_id, _ in index.search("lowers", top_k=10)) == ["a", "b"]
+
+
+def test_empty_index_compiles_and_searches(tmp_path):
+    index = _index(tmp_path, texts={})
+    assert index.loaded
+    assert index.search("anything", top_k=10) == []
+
+
+class _Collection:
+    """Just enough of a Chroma collection for fetching nodes by id"""
+
+    def get(self, ids, include):
+        return {
+            "ids": list(ids),
+            "documents": [TEXTS[node_id] for node_id in ids],
+            "metadatas": [{} for _ in ids],
+        }
+
+
+def test_hybrid_retriever_fuses_ranks(tmp_path):
+    retriever = HybridRetriever(
+        vector_retriever=None,
+        lexical_index=_index(tmp_path),
+        collection=_Collection(),
+        top_k=3,
+        candidates=10,
+        rrf_k=60,
+    )
+    vector_nodes = [
+        NodeWithScore(node=TextNode(id_=node_id, text=TEXTS[node_id]), score=1.0)
+        for node_id in ["c", "b"]
+    ]
+
+    fused = retriever.fuse("insulin glucose", vector_nodes)
+
+    # Lexical ranks: b (1), a (2); vector ranks: c (1), b (2).
+    assert [node.node.node_id for node in fused] == ["b", "c", "a"]
+    assert fused[0].score == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[1].score == pytest.approx(1 / 61)
+    assert fused[2].score == pytest.approx(1 / 62)
+    # "a" only came from BM25, so it was fetched from the collection.
+    assert fused[2].node.get_content() == TEXTS["a"]
@@ -0,0 +1,13 @@
+from conftest import documents
+
+
+def test_precompute_leaves_the_answer_cache_empty(store):
+    store.create_index(documents())
+    store.synthesize = lambda query_text, nodes: f"answer to {query_text}"
+    assert store.answer_cache is not None and store.precomputed is not None
+
+    result = store.precompute_answers([("curated", "What does metformin do?"), ("frequent", "asthma inhalers")])
+
+    assert result["stored"] == 2
+    assert store.precomputed.stats()["entries"] == 2
+    assert store.answer_cache.stats()["entries"] == 0
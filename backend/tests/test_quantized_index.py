@@ -0,0 +1,69 @@
+import os
+
+import chromadb
+import numpy as np
+from chromadb.config import Settings
+
+from quantized_index import QuantizedIndex
+from vector_store import QuantizedRetriever
+
+
+def _fixture(tmp_path, count=600, dim=16, lists=8, nprobe=8):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(12, dim))
+    vectors = centers[rng.integers(len(centers), size=count)] + 0.3 * rng.normal(size=(count, dim))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    ids = [f"node-{i}" for i in range(count)]
+
+    client = chromadb.PersistentClient(
+        path=str(tmp_path / "chroma"), settings=Settings(anonymized_telemetry=False)
+    )
+    collection = client.create_collection("fixture")
+    collection.add(ids=ids, embeddings=vectors.tolist(), documents=ids)
+
+    index = QuantizedIndex(str(tmp_path / "quantized"), lists=lists, nprobe=nprobe, rescore=50)
+    index.build([(ids[:300], vectors[:300]), (ids[300:], vectors[300:])], count)
+    return ids, vectors, collection, index
+
+
+def _exact_top_k(ids, vectors, query, top_k):
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    return [ids[i] for i in np.argsort(distances)[:top_k]]
+
+
+def test_rescored_candidates_reproduce_exact_top_k(tmp_path):
+    ids, vectors, collection, index = _fixture(tmp_path)
+    retriever = QuantizedRetriever(index, collection, embed_model=None, top_k=10)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), size=20, replace=False)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+
+    found = retriever.retrieve_many([query.tolist() for query in queries], top_k=10)
+
+    for query, nodes in zip(queries, found):
+        assert [node.node.node_id for node in nodes] == _exact_top_k(ids, vectors, query, 10)
+        scores = [node.score for node in nodes]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_index_keeps_no_float_copy(tmp_path):
+    _, vectors, _, index = _fixture(tmp_path)
+    version = os.path.join(str(tmp_path / "quantized"), index.stats()["version"])
+    assert "vectors.npy" not in os.listdir(version)
+    assert index.stats()["disk_bytes"] < vectors.nbytes
+
+
+def test_search_with_fewer_probes_keeps_recall(tmp_path):
+    ids, vectors, collection, index = _fixture(tmp_path, nprobe=3)
+
+    def fetch_vectors(node_ids):
+        result = collection.get(ids=node_ids, include=["embeddings"])
+        return dict(zip(result["ids"], result["embeddings"]))
+
+    rng = np.random.default_rng(2)
+    recalls = []
+    for row in rng.choice(len(vectors), size=20, replace=False):
+        expected = set(_exact_top_k(ids, vectors, vectors[row], 10))
+        got = {node_id for node_id, _ in index.search(vectors[row], 10, fetch_vectors)}
+        recalls.append(len(expected & got) / 10)
+    assert np.mean(recalls) >= 0.9
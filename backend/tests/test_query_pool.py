@@ -0,0 +1,148 @@
+import asyncio
+import threading
+
+import pytest
+
+from query_pool import QueryPool, QueryRejected
+
+
+def test_full_queue_rejects_with_429():
+    async def scenario():
+        pool = QueryPool(max_workers=1, max_queue=1, queue_timeout=5)
+        release = asyncio.Event()
+        running = asyncio.ensure_future(pool.run_async(release.wait))
+        queued = asyncio.ensure_future(pool.run_async(release.wait))
+        await asyncio.sleep(0.01)
+        with pytest.raises(QueryRejected) as rejected:
+            await pool.run_async(release.wait)
+        release.set()
+        await asyncio.gather(running, queued)
+        return rejected.value, pool.stats()
+
+    rejected, stats = asyncio.run(scenario())
+    assert rejected.status_code == 429
+    assert rejected.retry_after >= 1
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+
+
+def test_queue_timeout_rejects_with_503_and_retry_after():
+    async def scenario():
+        pool = QueryPool(max_workers=1, max_queue=4, queue_timeout=0.05)
+        release = asyncio.Event()
+        running = asyncio.ensure_future(pool.run_async(release.wait))
+        await asyncio.sleep(0.01)
+        with pytest.raises(QueryRejected) as rejected:
+            await pool.run_async(release.wait)
+        waiting = pool.stats()["waiting"]
+        release.set()
+        await running
+        return rejected.value, waiting, pool.stats()
+
+    rejected, waiting, stats = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert rejected.retry_after >= 1
+    assert waiting == 0
+    assert stats["timed_out"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_failed_call_releases_its_slot():
+    def fail():
+        raise ValueError("boom")
+
+    async def scenario():
+        pool = QueryPool(max_workers=1, max_queue=0, queue_timeout=0.05)
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                await pool.run(fail)
+        return await pool.run(lambda: "ok"), pool.stats()
+
+    result, stats = asyncio.run(scenario())
+    assert result == "ok"
+    assert stats["in_flight"] == 0
+    assert stats["rejected"] == 0
+    assert stats["completed"] == 4
+
+
+def test_stream_closed_before_iterating_releases_its_slot():
+    async def scenario():
+        pool = QueryPool(max_workers=1)
+        events = await pool.stream(lambda: iter(["a", "b"]))
+        assert pool.stats()["in_flight"] == 1
+        await events.aclose()
+        return pool.stats()["in_flight"]
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_stream_releases_its_slot_when_exhausted():
+    async def scenario():
+        pool = QueryPool(max_workers=1)
+        events = await pool.stream(lambda: iter(["a", "b"]))
+        items = [item async for item in events]
+        await events.aclose()
+        return items, pool.stats()
+
+    items, stats = asyncio.run(scenario())
+    assert items == ["a", "b"]
+    assert stats["in_flight"] == 0
+    assert stats["completed"] == 1
+
+
+def _tracked_generator(closed, resume=None):
+    def generate():
+        try:
+            yield "first"
+            if resume is not None:
+                resume.wait(5)
+            yield "second"
+        finally:
+            closed.set()
+    return generate
+
+
+def test_stream_closed_mid_stream_closes_its_generator():
+    closed = threading.Event()
+
+    async def scenario():
+        pool = QueryPool(max_workers=1)
+        events = await pool.stream(_tracked_generator(closed))
+        assert await events.__anext__() == "first"
+        await events.aclose()
+        # Checked while the stream is still referenced, so garbage
+        # collection can't be what closed it.
+        return pool.stats()["in_flight"], closed.is_set(), events
+
+    in_flight, was_closed, _ = asyncio.run(scenario())
+    assert in_flight == 0
+    assert was_closed
+
+
+def test_stream_cancelled_mid_item_closes_its_generator():
+    closed = threading.Event()
+    resume = threading.Event()
+
+    async def scenario():
+        pool = QueryPool(max_workers=1)
+        events = await pool.stream(_tracked_generator(closed, resume))
+
+        async def consume():
+            async for _ in events:
+                pass
+
+        consumer = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.1)
+        consumer.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await consumer
+        in_flight = pool.stats()["in_flight"]
+        # The generator is still producing its second item; it is closed
+        # once that returns.
+        resume.set()
+        was_closed = await asyncio.get_running_loop().run_in_executor(None, closed.wait, 5)
+        return in_flight, was_closed, events
+
+    in_flight, was_closed, _ = asyncio.run(scenario())
+    assert in_flight == 0
+    assert was_closed
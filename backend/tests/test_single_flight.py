@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+KEY = ("what are the symptoms of the flu", 1)
+
+
+def test_concurrent_calls_share_one_computation():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def scenario():
+        flights = SingleFlight()
+        results = await asyncio.gather(*[flights.run(KEY, compute) for _ in range(5)])
+        return results, flights.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [result for result, _ in results] == ["answer"] * 5
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert (stats["leaders"], stats["followers"]) == (1, 4)
+
+
+def test_different_keys_do_not_share():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        return await asyncio.gather(flights.run(KEY, compute), flights.run((KEY[0], 2), compute))
+
+    assert [shared for _, shared in asyncio.run(scenario())] == [False, False]
+
+
+def test_exception_reaches_followers():
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError("LLM unavailable")
+
+    async def scenario():
+        flights = SingleFlight()
+        return await asyncio.gather(
+            *[flights.run(KEY, compute) for _ in range(3)], return_exceptions=True
+        )
+
+    errors = asyncio.run(scenario())
+    assert all(isinstance(error, ValueError) for error in errors)
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def scenario():
+        flights = SingleFlight()
+        leader = asyncio.ensure_future(flights.run(KEY, compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.run(KEY, compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == ("answer", True)
+
+
+def test_key_is_forgotten_once_the_call_finishes():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return "answer"
+
+    async def scenario():
+        flights = SingleFlight()
+        first = await flights.run(KEY, compute)
+        in_flight = flights.stats()["in_flight"]
+        second = await flights.run(KEY, compute)
+        return first, in_flight, second
+
+    first, in_flight, second = asyncio.run(scenario())
+    assert in_flight == 0
+    assert first == second == ("answer", False)
+    assert len(calls) == 2
+
+
+def test_failed_call_is_forgotten():
+    attempts = []
+
+    async def compute():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ValueError("first try fails")
+        return "answer"
+
+    async def scenario():
+        flights = SingleFlight()
+        with pytest.raises(ValueError):
+            await flights.run(KEY, compute)
+        return await flights.run(KEY, compute), flights.stats()["in_flight"]
+
+    assert asyncio.run(scenario()) == (("answer", False), 0)
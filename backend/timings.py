@@ -0,0 +1,64 @@
+"""
+Per-stage timing of query processing
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from tracing import get_tracer
+
+
+class StageTimer:
+    """
+    Record how long each named stage of a request takes
+
+    A named timer is also traced when OpenTelemetry is enabled: one span for
+    the whole operation with a child span per stage. Stages may run on other
+    threads, so the parent is passed explicitly.
+
+    Usage:
+        timings = StageTimer("query")
+        with timings.stage("retrieve"):
+            ...
+        timings.finish()  # {"retrieve": 12.3, "total": 12.5}
+    """
+
+    def __init__(self, name: Optional[str] = None):
+        self._started = time.perf_counter()
+        self._stages: Dict[str, float] = {}
+        self._span = None
+        self._context = None
+        tracer = get_tracer() if name else None
+        if tracer is not None:
+            from opentelemetry import trace
+
+            self._tracer = tracer
+            self._span = tracer.start_span(name)
+            self._context = trace.set_span_in_context(self._span)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block, adding to any earlier time for the same stage"""
+        span = None
+        if self._span is not None:
+            span = self._tracer.start_span(name, context=self._context)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._stages[name] = self._stages.get(name, 0.0) + time.perf_counter() - started
+            if span is not None:
+                span.end()
+
+    def elapsed(self) -> float:
+        """Seconds since the timer was created"""
+        return time.perf_counter() - self._started
+
+    def finish(self) -> Dict[str, float]:
+        """Stage durations and the total, in milliseconds"""
+        timings = {name: round(seconds * 1000, 2) for name, seconds in self._stages.items()}
+        timings["total"] = round(self.elapsed() * 1000, 2)
+        if self._span is not None:
+            self._span.end()
+            self._span = None
+        return timings
@@ -0,0 +1,59 @@
+"""
+Optional OpenTelemetry tracing of query stages
+"""
+import os
+import threading
+from typing import Any, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_tracer: Any = None
+_configured = False
+
+
+def get_tracer() -> Optional[Any]:
+    """
+    Tracer for query spans, or None unless OTEL_ENABLED is set
+
+    Needs opentelemetry-api. If opentelemetry-sdk and the OTLP exporter are
+    installed too, spans are exported to OTEL_EXPORTER_OTLP_ENDPOINT with
+    the standard OTEL_* settings; otherwise whatever tracer provider the
+    process has set up is used.
+    """
+    global _tracer, _configured
+    if _configured:
+        return _tracer
+    with _lock:
+        if _configured:
+            return _tracer
+        _configured = True
+        if (os.getenv("OTEL_ENABLED") or "false").lower() not in ("1", "true", "yes"):
+            return None
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            logger.warning("OTEL_ENABLED is set but opentelemetry-api is not installed")
+            return None
+        if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            _configure_exporter(trace)
+        _tracer = trace.get_tracer("ai-doctor")
+        return _tracer
+
+
+def _configure_exporter(trace: Any) -> None:
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    except ImportError as e:
+        logger.warning(f"Not exporting spans, OpenTelemetry SDK or exporter missing: {e}")
+        return
+    provider = TracerProvider(resource=Resource.create({
+        "service.name": os.getenv("OTEL_SERVICE_NAME") or "ai-doctor-backend"
+    }))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
@@ -2,21 +2,276 @@
 """
 ChromaDB vector store setup and management with LlamaIndex
 """
+import asyncio
 import os
+import json
+import shutil
+import time
+import hashlib
+import math
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import chromadb
 from chromadb.config import Settings
-from llama_index.core import VectorStoreIndex, Document, StorageContext, Settings as LlamaSettings
+from llama_index.core import VectorStoreIndex, Document, QueryBundle, Settings as LlamaSettings
+from llama_index.core import get_response_synthesizer
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import BaseNode, NodeWithScore, TextNode
+from llama_index.core.utils import get_tokenizer
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
 from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.embeddings.openai import OpenAIEmbedding
-from llama_index.llms.openai import OpenAI
-from typing import List, Dict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import logging
 
+from answer_cache import SemanticAnswerCache
+from embedding_cache import CachedEmbedding, EmbeddingCache, embed_queries
+from ingestion import IngestionPipeline
+from index_generation import FileLock, IndexGeneration
+from lexical_index import LexicalIndex
+from precomputed_answers import PrecomputedAnswers, unique_questions
+from quantized_index import QuantizedIndex
+from reranker import CrossEncoderReranker
+from context_budget import ContextBudget
+from http_clients import hedged
+from llm_backends import build_llm, llm_is_local
+from timings import StageTimer
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _content_hash(text: str, metadata: Dict[str, Any]) -> str:
+    """Stable hash of a document's text and metadata"""
+    payload = json.dumps({"text": text, "metadata": metadata}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _flatten(groups: Dict[Any, List[str]]) -> List[str]:
+    return [item for group in groups.values() for item in group]
+
+
+def _batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Yield lists of up to size items"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _use_all_cpu_threads() -> None:
+    """Let local embedding models use every core (or EMBEDDING_THREADS)"""
+    try:
+        import torch
+    except ImportError:
+        return
+    threads = int(os.getenv("EMBEDDING_THREADS") or os.cpu_count() or 1)
+    torch.set_num_threads(threads)
+
+
+def _chroma_nodes(
+    ids: List[str],
+    documents: List[str],
+    metadatas: List[Dict[str, Any]],
+    scores: List[Optional[float]]
+) -> List[NodeWithScore]:
+    """Rebuild nodes from Chroma results the way ChromaVectorStore does"""
+    nodes = []
+    for node_id, text, metadata, score in zip(ids, documents, metadatas, scores):
+        try:
+            node = metadata_dict_to_node(metadata)
+            node.set_content(text)
+        except Exception:
+            node = TextNode(id_=node_id, text=text, metadata=metadata or {})
+        nodes.append(NodeWithScore(node=node, score=score))
+    return nodes
+
+
+def _fetch_nodes(collection: Any, ids: List[str]) -> Dict[str, BaseNode]:
+    """Nodes stored in Chroma, by id"""
+    if not ids:
+        return {}
+    result = collection.get(ids=ids, include=["documents", "metadatas"])
+    return {
+        found.node.node_id: found.node
+        for found in _chroma_nodes(
+            result["ids"], result["documents"], result["metadatas"],
+            [None] * len(result["ids"])
+        )
+    }
+
+
+def _fetch_embeddings(collection: Any, ids: List[str]) -> Dict[str, List[float]]:
+    """Embeddings stored in Chroma, by id"""
+    if not ids:
+        return {}
+    result = collection.get(ids=ids, include=["embeddings"])
+    return dict(zip(result["ids"], result["embeddings"]))
+
+
+class QuantizedRetriever(BaseRetriever):
+    """
+    Dense retrieval through the quantized index instead of Chroma's HNSW search
+    
+    The int8 index picks candidates; their float embeddings, text and
+    metadata are then read from the Chroma collection by id for exact
+    rescoring, so the float vectors are stored only once.
+    """
+    
+    def __init__(
+        self,
+        quantized_index: QuantizedIndex,
+        collection: Any,
+        embed_model: Any,
+        top_k: int = 3
+    ):
+        super().__init__()
+        self.quantized_index = quantized_index
+        self.collection = collection
+        self.embed_model = embed_model
+        self.top_k = top_k
+    
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        embedding = query_bundle.embedding
+        if embedding is None:
+            embedding = self.embed_model.get_query_embedding(query_bundle.query_str)
+        return self.retrieve_many([embedding], self.top_k)[0]
+    
+    def retrieve_many(
+        self, embeddings: List[List[float]], top_k: int
+    ) -> List[List[NodeWithScore]]:
+        """Nearest nodes for several embeddings, with one Chroma read of each kind for all"""
+        candidates = [self.quantized_index.candidates(embedding, top_k) for embedding in embeddings]
+        vectors = _fetch_embeddings(
+            self.collection, list(dict.fromkeys(node_id for found in candidates for node_id in found))
+        )
+        hits = [
+            self.quantized_index.exact_scores(
+                embedding, {node_id: vectors[node_id] for node_id in found if node_id in vectors}, top_k
+            )
+            for embedding, found in zip(embeddings, candidates)
+        ]
+        nodes = _fetch_nodes(
+            self.collection, list(dict.fromkeys(node_id for found in hits for node_id, _ in found))
+        )
+        return [
+            [NodeWithScore(node=nodes[node_id], score=score) for node_id, score in found if node_id in nodes]
+            for found in hits
+        ]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuse dense and BM25 results with reciprocal rank fusion
+    
+    Both retrievers return a larger candidate list; each node scores
+    1 / (rrf_k + rank) for every list it appears in, and the best top_k
+    are returned. Lexical-only hits are fetched from Chroma by id.
+    """
+    
+    def __init__(
+        self,
+        vector_retriever: BaseRetriever,
+        lexical_index: LexicalIndex,
+        collection: Any,
+        top_k: int = 3,
+        candidates: int = 10,
+        rrf_k: int = 60
+    ):
+        super().__init__()
+        self.vector_retriever = vector_retriever
+        self.lexical_index = lexical_index
+        self.collection = collection
+        self.top_k = top_k
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+    
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self.fuse(query_bundle.query_str, self.vector_retriever.retrieve(query_bundle))
+    
+    def fuse(self, query_text: str, vector_nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        """Fuse vector candidates with BM25 candidates for the same query"""
+        lexical_hits = self.lexical_index.search(query_text, self.candidates)
+        
+        fused: Dict[str, float] = {}
+        for rank, node in enumerate(vector_nodes):
+            fused[node.node.node_id] = fused.get(node.node.node_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        for rank, (node_id, _) in enumerate(lexical_hits):
+            fused[node_id] = fused.get(node_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        best = sorted(fused, key=fused.get, reverse=True)[:self.top_k]
+        
+        nodes = {node.node.node_id: node.node for node in vector_nodes}
+        nodes.update(_fetch_nodes(
+            self.collection, [node_id for node_id in best if node_id not in nodes]
+        ))
+        
+        return [
+            NodeWithScore(node=nodes[node_id], score=fused[node_id])
+            for node_id in best if node_id in nodes
+        ]
+
+
+# Embedding model created before worker processes fork, so they share its
+# weights copy-on-write instead of each loading their own (see workers.py).
+_preloaded_embed_model: Optional[Tuple[str, Any, str]] = None
+
+
+def build_embed_model(provider: str) -> Tuple[Any, str]:
+    """
+    Create the embedding model for a provider, or reuse the preloaded one
+    
+    Only the selected provider is imported; the HuggingFace one pulls in
+    torch.
+    
+    Returns:
+        The model and its name
+    """
+    if _preloaded_embed_model is not None and _preloaded_embed_model[0] == provider:
+        return _preloaded_embed_model[1], _preloaded_embed_model[2]
+    
+    if provider == "hash":
+        from hash_embedding import HashEmbedding
+        
+        dim = int(os.getenv("HASH_EMBEDDING_DIM", "384"))
+        return HashEmbedding(
+            model_name=f"hash-{dim}",
+            dim=dim,
+            embed_batch_size=int(os.getenv("EMBED_BATCH_SIZE", "256"))
+        ), f"hash-{dim}"
+    
+    if provider == "huggingface":
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+        
+        model_name = os.getenv("EMBEDDING_MODEL") or "BAAI/bge-small-en-v1.5"
+        _use_all_cpu_threads()
+        model = HuggingFaceEmbedding(
+            model_name=model_name,
+            embed_batch_size=int(os.getenv("EMBED_BATCH_SIZE", "64"))
+        )
+    else:
+        from llama_index.embeddings.openai import OpenAIEmbedding
+        from http_clients import async_client, sync_client
+        
+        model_name = os.getenv("EMBEDDING_MODEL") or "text-embedding-3-small"
+        model = OpenAIEmbedding(
+            model=model_name,
+            embed_batch_size=int(os.getenv("EMBED_BATCH_SIZE", "256")),
+            http_client=sync_client(),
+            async_http_client=async_client()
+        )
+    return model, model_name
+
+
+def preload_embed_model() -> None:
+    """Load the configured embedding model now, for stores created later in forked workers"""
+    global _preloaded_embed_model
+    provider = (os.getenv("EMBEDDING_PROVIDER") or "openai").lower()
+    model, model_name = build_embed_model(provider)
+    _preloaded_embed_model = (provider, model, model_name)
+
+
 class MedicalVectorStore:
     """Manage ChromaDB vector store for medical data"""
     
@@ -26,85 +281,612 @@ class MedicalVectorStore:
 
         # Choose embedding provider to avoid local model OOM in small containers.
         embedding_provider = (os.getenv("EMBEDDING_PROVIDER") or "openai").lower()
-        if embedding_provider == "huggingface":
-            model_name = os.getenv("EMBEDDING_MODEL") or "BAAI/bge-small-en-v1.5"
-            self.embed_model = HuggingFaceEmbedding(model_name=model_name)
-        else:
-            model_name = os.getenv("EMBEDDING_MODEL") or "text-embedding-3-small"
-            self.embed_model = OpenAIEmbedding(model=model_name)
+        self.embedding_provider = embedding_provider
+        self.embed_model, model_name = build_embed_model(embedding_provider)
         
-        # Initialize LLM (OpenAI GPT)
-        self.llm = OpenAI(
-            model="gpt-3.5-turbo",
-            temperature=0.1,
-            max_tokens=512
+        # Caches live next to the Chroma directory so that resetting
+        # Chroma doesn't delete them out from under us.
+        self.cache_dir = os.getenv("CACHE_DIR") or os.path.join(
+            os.path.dirname(os.path.abspath(persist_dir)), "cache"
         )
         
+        # Serve repeated texts from the embedding cache on both the query
+        # and ingestion paths.
+        self.embedding_cache = EmbeddingCache.from_env(self.cache_dir)
+        if self.embedding_cache:
+            self.embed_model = CachedEmbedding(self.embed_model, self.embedding_cache)
+        
+        # Initialize LLM (hosted OpenAI by default, see LLM_BACKEND)
+        self.llm = build_llm()
+        
         # Set up LlamaIndex settings
         LlamaSettings.embed_model = self.embed_model
         LlamaSettings.llm = self.llm
         LlamaSettings.chunk_size = 2048
         
-        # Initialize ChromaDB
-        self.chroma_client = chromadb.PersistentClient(
-            path=persist_dir,
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
+        # Initialize ChromaDB; worker processes opening a new database at
+        # the same time would race on its schema migrations.
+        with FileLock(os.path.join(self.cache_dir, "chroma_client.lock")):
+            self.chroma_client = chromadb.PersistentClient(
+                path=persist_dir,
+                settings=Settings(
+                    anonymized_telemetry=False,
+                    allow_reset=True
+                )
             )
+        
+        # Shared with other worker processes, so a rebuild or reset in one
+        # is picked up by all of them (see sync_generation).
+        self.generation = IndexGeneration(
+            os.path.join(self.cache_dir, f"{self.collection_name}_generation.json")
+        )
+        self.loaded_generation = 0
+        
+        self.answer_cache = SemanticAnswerCache.from_env(
+            self.cache_dir, model_name=f"{embedding_provider}:{model_name}"
+        )
+        
+        # Answers generated ahead of time for the curated topics and the
+        # most frequent questions, matched by intent before the answer cache
+        self.precomputed = PrecomputedAnswers.from_env(
+            self.cache_dir, model_name=f"{embedding_provider}:{model_name}"
+        )
+        
+        # BM25 index over the same nodes, for hybrid retrieval. Like the
+        # quantized index below, there is one per collection version and the
+        # serving version's is opened when the index is loaded.
+        self.lexical_index: Optional[LexicalIndex] = None
+        self.retrieval_mode = (os.getenv("RETRIEVAL_MODE") or "hybrid").lower()
+        
+        # Compact int8 index searched instead of Chroma's HNSW when
+        # VECTOR_BACKEND=quantized
+        self.quantized_index: Optional[QuantizedIndex] = None
+        
+        # Versions kept after a swap: the serving one and the one before it,
+        # for workers that haven't switched yet
+        self.keep_versions = max(2, int(os.getenv("INDEX_KEEP_VERSIONS", "2")))
+        
+        # Retrieve a wide candidate pool, rerank it with a cross-encoder
+        # (when enabled) and hand only the best few nodes to the LLM.
+        self.reranker = CrossEncoderReranker.from_env(self.cache_dir)
+        self.synthesis_top_n = int(os.getenv("SYNTHESIS_TOP_N", "3"))
+        self.retrieval_top_k = int(
+            os.getenv("RETRIEVAL_TOP_K") or (50 if self.reranker else self.synthesis_top_n)
         )
         
+        # Dedupe and trim the selected context to a token budget
+        self.context_budget = ContextBudget.from_env()
+        
+        # Seconds before a slow async LLM call is sent again (0: never)
+        self.hedge_delay = float(os.getenv("LLM_HEDGE_DELAY", "0"))
+        
         self.index = None
-        self.query_engine = None
         self.retriever = None
+        self.synthesizer = None
+        self.stream_synthesizer = None
+        self.collection = None
+
+    def _build_engines(
+        self,
+        index: VectorStoreIndex,
+        lexical_index: Optional[LexicalIndex],
+        quantized_index: Optional[QuantizedIndex]
+    ) -> None:
+        """
+        Create the retriever and synthesizers for an index and start serving it
+        
+        Everything is built before any attribute is replaced, so queries
+        running concurrently keep using the previous engines until the swap.
+        """
+        collection = index.vector_store.client
+        retriever = self._make_retriever(
+            index, collection, self.retrieval_top_k, lexical_index, quantized_index
+        )
+        synthesizer = get_response_synthesizer(response_mode="compact")
+        stream_synthesizer = get_response_synthesizer(
+            response_mode="compact", streaming=True
+        )
+        
+        self.index = index
+        self.retriever = retriever
+        self.synthesizer = synthesizer
+        self.stream_synthesizer = stream_synthesizer
+        self.collection = collection
+        self.lexical_index = lexical_index
+        self.quantized_index = quantized_index
+        
+    def _make_retriever(
+        self,
+        index: VectorStoreIndex,
+        collection: Any,
+        top_k: int,
+        lexical_index: Optional[LexicalIndex],
+        quantized_index: Optional[QuantizedIndex]
+    ) -> BaseRetriever:
+        """Hybrid or vector-only retriever returning top_k nodes"""
+        if not self._use_hybrid(lexical_index):
+            return self._dense_retriever(index, collection, top_k, quantized_index)
+        candidates = max(top_k, int(os.getenv("HYBRID_CANDIDATES", "10")))
+        return HybridRetriever(
+            self._dense_retriever(index, collection, candidates, quantized_index),
+            lexical_index,
+            collection,
+            top_k=top_k,
+            candidates=candidates,
+            rrf_k=int(os.getenv("RRF_K", "60"))
+        )
+    
+    def _dense_retriever(
+        self,
+        index: VectorStoreIndex,
+        collection: Any,
+        top_k: int,
+        quantized_index: Optional[QuantizedIndex]
+    ) -> BaseRetriever:
+        """Embedding retriever on the quantized index if it is in use, else Chroma"""
+        if quantized_index is not None and quantized_index.loaded:
+            return QuantizedRetriever(quantized_index, collection, self.embed_model, top_k=top_k)
+        return index.as_retriever(similarity_top_k=top_k)
+    
+    def _use_hybrid(self, lexical_index: Optional[LexicalIndex]) -> bool:
+        return (
+            self.retrieval_mode == "hybrid"
+            and lexical_index is not None
+            and lexical_index.loaded
+        )
+    
+    @property
+    def _alias_path(self) -> str:
+        return os.path.join(self.cache_dir, f"{self.collection_name}_alias.json")
+    
+    def _read_alias(self) -> Dict[str, Any]:
+        """The collection version being served and the one served before it"""
+        try:
+            with open(self._alias_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable collection alias: {e}")
+            return {}
+    
+    def _write_alias(self, name: str, previous: Optional[str]) -> None:
+        """Point the alias at a collection version; readers see the old or the new file"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self._alias_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"collection": name, "previous": previous, "updated_at": time.time()}, f)
+        os.replace(tmp_path, self._alias_path)
+    
+    def _version_names(self) -> List[str]:
+        """This store's collections: the versions, plus the unversioned one of older builds"""
+        prefix = f"{self.collection_name}_v"
+        names = []
+        for collection in self.chroma_client.list_collections():
+            name = getattr(collection, "name", collection)
+            if name == self.collection_name or (
+                name.startswith(prefix) and name[len(prefix):].isdigit()
+            ):
+                names.append(name)
+        return names
+    
+    def _version_number(self, name: str) -> int:
+        suffix = name[len(self.collection_name) + 2:]
+        return int(suffix) if suffix.isdigit() else 0
+    
+    def serving_collection_name(self) -> Optional[str]:
+        """Name of the collection version queries are served from, if any"""
+        name = self._read_alias().get("collection")
+        if name:
+            return name
+        # Indexes built before versioning wrote to the bare collection name.
+        if self.collection_name in self._version_names():
+            return self.collection_name
+        return None
+    
+    def _serving(self, name: Optional[str]) -> bool:
+        """Whether this process is serving the named collection version"""
+        collection = self.collection
+        return collection is not None and collection.name == name
+    
+    def _next_version_name(self) -> str:
+        names = self._version_names() + [self._read_alias().get("collection") or ""]
+        number = max([self._version_number(name) for name in names if name] + [0]) + 1
+        return f"{self.collection_name}_v{number}"
+    
+    def _seed_collection(self, name: str, source: Optional[Any]) -> Any:
+        """
+        Create a collection version holding a copy of source's rows
         
-    def create_index(self, documents: List[Dict[str, str]]) -> None:
+        Stored embeddings are copied, so only changed documents are embedded
+        again when the new version is brought up to date.
+        """
+        collection = self.chroma_client.create_collection(name=name)
+        if source is None:
+            return collection
+        page_size = 5000
+        offset = 0
+        while True:
+            result = source.get(
+                include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset
+            )
+            ids = result.get("ids") or []
+            if ids:
+                collection.add(
+                    ids=ids,
+                    embeddings=result["embeddings"],
+                    documents=result["documents"],
+                    metadatas=result["metadatas"]
+                )
+            if len(ids) < page_size:
+                return collection
+            offset += page_size
+    
+    def _drop_version(self, name: str) -> None:
+        """Delete a collection version and its lexical and quantized indexes"""
+        try:
+            self.chroma_client.delete_collection(name)
+        except ValueError:
+            pass
+        for suffix in ("lexical", "quantized"):
+            shutil.rmtree(os.path.join(self.cache_dir, f"{name}_{suffix}"), ignore_errors=True)
+    
+    def _collect_old_versions(self) -> None:
+        """Delete all but the newest keep_versions versions, never the served ones"""
+        alias = self._read_alias()
+        keep = {alias.get("collection"), alias.get("previous")}
+        names = sorted(self._version_names(), key=self._version_number, reverse=True)
+        for name in names[self.keep_versions:]:
+            if name not in keep:
+                logger.info(f"Removing old index version {name}")
+                self._drop_version(name)
+    
+    def _validate_version(
+        self,
+        index: VectorStoreIndex,
+        collection: Any,
+        lexical_index: Optional[LexicalIndex],
+        quantized_index: Optional[QuantizedIndex],
+        expected_documents: int
+    ) -> None:
         """
-        Create vector store index from documents
+        Smoke-test a newly built version before it is served
+        
+        A stored node's own embedding is queried through the retriever the
+        version would be served with, which must find something.
+        
+        Raises:
+            ValueError: If the version is empty or the smoke query finds nothing
+        """
+        if not collection.count():
+            if expected_documents:
+                raise ValueError(f"{collection.name} is empty")
+            return
+        sample = collection.get(limit=1, include=["embeddings", "documents"])
+        retriever = self._make_retriever(index, collection, 1, lexical_index, quantized_index)
+        nodes = retriever.retrieve(QueryBundle(
+            query_str=(sample["documents"][0] or "")[:200],
+            embedding=list(sample["embeddings"][0])
+        ))
+        if not nodes:
+            raise ValueError(f"Smoke query on {collection.name} returned no results")
+    
+    def create_index(
+        self,
+        documents: Iterable[Dict[str, Any]],
+        prune: bool = True,
+        progress_callback: Optional[Callable[[str, Dict[str, int]], None]] = None
+    ) -> Dict[str, int]:
+        """
+        Create or incrementally update the vector store index from documents
+        
+        The update is built in a new collection version (medical_wikidoc_v{n})
+        seeded with a copy of the serving one, so queries keep being answered
+        from the serving version throughout. Documents are matched to what
+        is already in the collection by their metadata doc_id and a content
+        hash. Unchanged documents are skipped, changed ones are re-embedded
+        and replaced, and (with prune) documents no longer present are
+        deleted. Progress is checkpointed per batch, so rerunning after a
+        crash picks up where the last run stopped.
+        
+        Once built, the new version is validated with a smoke query and
+        swapped in by pointing the alias at it; old versions are then
+        deleted. If nothing changed, the new version is discarded.
         
         Args:
-            documents: List of documents with text and metadata
+            documents: Documents with text and metadata (including doc_id)
+            prune: Delete indexed documents that are not in documents
+            progress_callback: Called as (phase, counts) after every batch;
+                may raise to abort the build
+            
+        Returns:
+            Counts of documents seen, added, updated, unchanged and deleted
         """
         try:
-            logger.info(f"Creating index with {len(documents)} documents")
+            logger.info("Creating index (incremental)")
+            stats = {"documents": 0, "added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
             
-            # Create collection
-            collection = self.chroma_client.get_or_create_collection(
-                name=self.collection_name
-            )
+            live_name = self.serving_collection_name()
+            live = None
+            if live_name:
+                try:
+                    live = self.chroma_client.get_collection(name=live_name)
+                except ValueError:
+                    logger.warning(f"Serving collection {live_name} is missing")
+                    live_name = None
+            
+            # A checkpoint names the version an interrupted run was building;
+            # it is only written once that version was fully seeded.
+            checkpoint = self._load_checkpoint()
+            name = checkpoint.get("collection")
+            if name and name != live_name and name in self._version_names():
+                logger.info(
+                    f"Resuming {name} from checkpoint after "
+                    f"{checkpoint.get('processed', 0)} documents"
+                )
+                collection = self.chroma_client.get_collection(name=name)
+                lexical_index = LexicalIndex.from_env(self.cache_dir, name)
+            else:
+                checkpoint = {}
+                name = self._next_version_name()
+                logger.info(f"Building {name} from {live_name or 'scratch'}")
+                if progress_callback:
+                    progress_callback("seeding", stats)
+                self._drop_version(name)
+                collection = self._seed_collection(name, live)
+                lexical_index = LexicalIndex.from_env(self.cache_dir, name)
+                if lexical_index:
+                    # Copied if the serving version has one; otherwise
+                    # restaged from the collection when it is compiled.
+                    if self.lexical_index and self._serving(live_name):
+                        lexical_index.copy_from(self.lexical_index)
+                    else:
+                        lexical_index.clear()
+                self._save_checkpoint(name, 0, pending=[])
+            quantized_index = QuantizedIndex.from_env(self.cache_dir, name)
             
             # Create vector store
             vector_store = ChromaVectorStore(chroma_collection=collection)
-            storage_context = StorageContext.from_defaults(vector_store=vector_store)
-            
-            # Convert to LlamaIndex documents
-            llama_docs = []
-            for doc in documents:
-                llama_doc = Document(
-                    text=doc["text"],
-                    metadata=doc.get("metadata", {})
-                )
-                llama_docs.append(llama_doc)
+            index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
             
-            # Create index
-            self.index = VectorStoreIndex.from_documents(
-                llama_docs,
-                storage_context=storage_context,
-                show_progress=True
-            )
+            existing = self._existing_hashes(collection)
+            
+            # Documents that were being written when a previous run stopped
+            # may be partially stored, so force them to be rewritten.
+            for doc_id in checkpoint.get("pending", []):
+                if doc_id in existing:
+                    existing[doc_id] = None
             
-            # Create query engine
-            self.query_engine = self.index.as_query_engine(
-                similarity_top_k=3,
-                response_mode="compact"
+            seen = set()
+            batch_size = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+            
+            # Embedding and Chroma writes run in the pipeline while later
+            # batches are diffed; in_flight tracks what isn't written yet.
+            pipeline = IngestionPipeline.from_env(
+                self.embed_model, vector_store, self.embedding_provider
             )
-            self.retriever = self.index.as_retriever(similarity_top_k=3)
+            in_flight: Dict[int, List[str]] = {}
+            try:
+                for batch_number, batch in enumerate(_batched(documents, batch_size)):
+                    to_write = self._diff_batch(batch, existing, seen, stats)
+                    
+                    for written in pipeline.completed():
+                        in_flight.pop(written, None)
+                    
+                    if to_write:
+                        doc_ids = [llama_doc.id_ for llama_doc in to_write]
+                        in_flight[batch_number] = doc_ids
+                        self._save_checkpoint(name, stats["documents"], pending=_flatten(in_flight))
+                        
+                        replaced = [doc_id for doc_id in doc_ids if doc_id in existing]
+                        if replaced:
+                            collection.delete(where={"document_id": {"$in": replaced}})
+                        
+                        nodes = LlamaSettings.node_parser.get_nodes_from_documents(to_write)
+                        if lexical_index:
+                            # Also clears nodes staged by an interrupted run.
+                            lexical_index.remove_documents(doc_ids)
+                            lexical_index.add_nodes(nodes)
+                        pipeline.submit(nodes, tag=batch_number)
+                    else:
+                        self._save_checkpoint(name, stats["documents"], pending=_flatten(in_flight))
+                    
+                    if progress_callback:
+                        progress_callback("indexing", stats)
+                    logger.info(
+                        f"Processed {stats['documents']} documents "
+                        f"({stats['added']} added, {stats['updated']} updated, "
+                        f"{stats['unchanged']} unchanged)"
+                    )
+                pipeline.close()
+            except BaseException:
+                pipeline.close(raise_errors=False)
+                raise
             
-            logger.info("Index created successfully")
+            if prune:
+                if progress_callback:
+                    progress_callback("pruning", stats)
+                removed = [doc_id for doc_id in existing if doc_id not in seen]
+                for start in range(0, len(removed), batch_size):
+                    collection.delete(
+                        where={"document_id": {"$in": removed[start:start + batch_size]}}
+                    )
+                if lexical_index:
+                    lexical_index.remove_documents(removed)
+                stats["deleted"] = len(removed)
+            
+            changed = stats["added"] or stats["updated"] or stats["deleted"]
+            if not changed and not checkpoint and live is not None:
+                logger.info(f"No changes; keeping {live_name}")
+                self._drop_version(name)
+                self._clear_checkpoint()
+                if not self._serving(live_name):
+                    self.load_index()
+                return stats
+            
+            if lexical_index:
+                if progress_callback:
+                    progress_callback("lexical", stats)
+                self._sync_lexical_index(collection, lexical_index)
+            
+            if quantized_index:
+                if progress_callback:
+                    progress_callback("quantizing", stats)
+                self._build_quantized_index(collection, quantized_index)
+            
+            if progress_callback:
+                progress_callback("validating", stats)
+            try:
+                self._validate_version(
+                    index, collection, lexical_index, quantized_index, stats["documents"]
+                )
+            except Exception:
+                # Never swap in a broken version; the next run starts over.
+                self._drop_version(name)
+                self._clear_checkpoint()
+                raise
+            
+            # Swap in the new version: other workers follow the alias when
+            # they see the generation change.
+            if progress_callback:
+                progress_callback("swapping", stats)
+            self._write_alias(name, previous=live_name)
+            self._clear_checkpoint()
+            self._build_engines(index, lexical_index, quantized_index)
+            if self.answer_cache and changed:
+                self.answer_cache.clear()
+            self.loaded_generation = self.generation.bump("build")
+            self._collect_old_versions()
+            
+            logger.info(f"Index {name} created successfully: {stats}")
+            return stats
             
         except Exception as e:
             logger.error(f"Error creating index: {e}")
             raise
+
+    @staticmethod
+    def _diff_batch(
+        batch: List[Dict[str, Any]],
+        existing: Dict[str, Optional[str]],
+        seen: set,
+        stats: Dict[str, int]
+    ) -> List[Document]:
+        """Count a batch against the collection and return documents to write"""
+        to_write = []
+        for doc in batch:
+            metadata = dict(doc.get("metadata", {}))
+            doc_id = metadata.get("doc_id") or _content_hash(doc["text"], metadata)
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            stats["documents"] += 1
+            
+            content_hash = _content_hash(doc["text"], metadata)
+            if existing.get(doc_id) == content_hash:
+                stats["unchanged"] += 1
+                continue
+            
+            stats["updated" if doc_id in existing else "added"] += 1
+            metadata["content_hash"] = content_hash
+            to_write.append(Document(
+                id_=doc_id,
+                text=doc["text"],
+                metadata=metadata,
+                excluded_embed_metadata_keys=["content_hash"],
+                excluded_llm_metadata_keys=["content_hash"]
+            ))
+        return to_write
+
+    def _sync_lexical_index(self, collection: Any, lexical_index: LexicalIndex) -> None:
+        """
+        Compile a lexical index, first restaging it from the collection if
+        the two have drifted apart (e.g. an index built before BM25 existed)
+        """
+        if lexical_index.staged_count() != collection.count():
+            logger.info("Rebuilding lexical index from the vector collection")
+            lexical_index.clear()
+            page_size = 5000
+            offset = 0
+            while True:
+                result = collection.get(
+                    include=["documents", "metadatas"], limit=page_size, offset=offset
+                )
+                ids = result.get("ids") or []
+                lexical_index.add_texts(
+                    (node_id, (metadata or {}).get("document_id"), text or "")
+                    for node_id, text, metadata in zip(
+                        ids, result["documents"], result["metadatas"]
+                    )
+                )
+                if len(ids) < page_size:
+                    break
+                offset += page_size
+        lexical_index.compile()
+    
+    def _build_quantized_index(self, collection: Any, quantized_index: QuantizedIndex) -> None:
+        """Requantize every embedding in the collection into a new version"""
+        logger.info("Building quantized index from the vector collection")
+        
+        def pages() -> Iterator[Tuple[List[str], Any]]:
+            page_size = 5000
+            offset = 0
+            while True:
+                result = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+                ids = result.get("ids") or []
+                if ids:
+                    yield ids, result["embeddings"]
+                if len(ids) < page_size:
+                    return
+                offset += page_size
+        
+        quantized_index.build(pages(), collection.count())
+    
+    @staticmethod
+    def _existing_hashes(collection: Any) -> Dict[str, Optional[str]]:
+        """Map each indexed document id to its stored content hash"""
+        existing: Dict[str, Optional[str]] = {}
+        page_size = 5000
+        offset = 0
+        while True:
+            result = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            metadatas = result.get("metadatas") or []
+            for metadata in metadatas:
+                doc_id = metadata.get("document_id")
+                if doc_id and doc_id not in existing:
+                    existing[doc_id] = metadata.get("content_hash")
+            if len(metadatas) < page_size:
+                return existing
+            offset += page_size
+
+    @property
+    def _checkpoint_path(self) -> str:
+        return os.path.join(self.cache_dir, f"{self.collection_name}_ingest_checkpoint.json")
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        try:
+            with open(self._checkpoint_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable ingest checkpoint: {e}")
+            return {}
+
+    def _save_checkpoint(self, collection_name: str, processed: int, pending: List[str]) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self._checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "collection": collection_name, "processed": processed, "pending": pending
+            }, f)
+        os.replace(tmp_path, self._checkpoint_path)
+
+    def _clear_checkpoint(self) -> None:
+        try:
+            os.remove(self._checkpoint_path)
+        except FileNotFoundError:
+            pass
     
     def load_index(self) -> bool:
         """
@@ -113,32 +895,69 @@ class MedicalVectorStore:
         Returns:
             True if index loaded successfully, False otherwise
         """
+        # Read first: a rebuild finishing during the load bumps it again, so
+        # the next sync_generation reloads.
+        self.loaded_generation = self.generation.current()
         try:
             logger.info("Loading existing index")
             
-            collection = self.chroma_client.get_collection(
-                name=self.collection_name
-            )
+            name = self.serving_collection_name()
+            if name is None:
+                raise ValueError("no index version has been built")
+            collection = self.chroma_client.get_collection(name=name)
             
             vector_store = ChromaVectorStore(chroma_collection=collection)
+            lexical_index = LexicalIndex.from_env(self.cache_dir, name)
+            quantized_index = QuantizedIndex.from_env(self.cache_dir, name)
             
-            self.index = VectorStoreIndex.from_vector_store(
-                vector_store=vector_store
-            )
+            # Workers starting together take turns, so only the first one
+            # rebuilds missing index files and the rest load its result.
+            with FileLock(os.path.join(self.cache_dir, f"{self.collection_name}_load.lock")):
+                if lexical_index and not lexical_index.load():
+                    self._sync_lexical_index(collection, lexical_index)
+                if quantized_index and (
+                    not quantized_index.load()
+                    or quantized_index.count != collection.count()
+                ):
+                    self._build_quantized_index(collection, quantized_index)
             
-            self.query_engine = self.index.as_query_engine(
-                similarity_top_k=3,
-                response_mode="compact"
+            self._build_engines(
+                VectorStoreIndex.from_vector_store(vector_store=vector_store),
+                lexical_index,
+                quantized_index
             )
-            self.retriever = self.index.as_retriever(similarity_top_k=3)
             
-            logger.info("Index loaded successfully")
+            logger.info(f"Index {name} loaded successfully")
             return True
             
         except Exception as e:
             logger.warning(f"Could not load existing index: {e}")
             return False
     
+    def sync_generation(self) -> bool:
+        """
+        Catch up with a rebuild or reset done by another worker process
+        
+        Returns:
+            True if the index was reloaded or dropped
+        """
+        state = self.generation.read()
+        if state["generation"] == self.loaded_generation:
+            return False
+        
+        logger.info(
+            f"Index generation changed from {self.loaded_generation} to "
+            f"{state['generation']} ({state['event']})"
+        )
+        if state["event"] == "reset":
+            self._drop_engines()
+            self.loaded_generation = state["generation"]
+        else:
+            self.load_index()
+        if self.answer_cache:
+            self.answer_cache.reload()
+        return True
+    
     def query(self, query_text: str) -> str:
         """
         Query the vector store
@@ -149,50 +968,662 @@ class MedicalVectorStore:
         Returns:
             Response from the query engine
         """
-        if not self.query_engine:
+        return self.query_with_details(query_text)["answer"]
+    
+    def query_with_details(self, query_text: str) -> Dict[str, Any]:
+        """
+        Answer a query through explicit embed, retrieve and synthesize stages
+        
+        Nodes are retrieved once and reused for synthesis, the fallback
+        answer and the source list.
+        
+        Args:
+            query_text: User query
+            
+        Returns:
+            Dict with "answer", "sources", whether it was "cached" (and
+            if so whether it was "precomputed"), prompt token counts before
+            and after compression ("context"), approximate LLM token
+            "usage", and per-stage "timings" in milliseconds (including
+            "fallback" if the LLM gave no answer)
+        """
+        if not self.retriever:
             raise ValueError("Query engine not initialized. Create or load an index first.")
         
         try:
-            response = self.query_engine.query(query_text)
-            answer = str(response).strip()
-            if answer and answer != "Empty Response":
-                return answer
-
-            # If the LLM doesn't synthesize, fall back to raw retrieval results.
-            nodes = []
-            if self.retriever:
-                nodes = self.retriever.retrieve(query_text)
-            source_nodes = getattr(response, "source_nodes", []) or []
-            if source_nodes:
-                nodes = source_nodes
-
-            if nodes:
-                snippets = []
-                for node in nodes[:3]:
-                    base_node = getattr(node, "node", node)
-                    if hasattr(base_node, "get_content"):
-                        text = base_node.get_content()
-                    else:
-                        text = getattr(base_node, "text", "")
-                    text = text.strip()
-                    if text:
-                        snippets.append(text)
-                if snippets:
-                    combined = "\n\n".join(snippets)
-                    return (
-                        "I could not synthesize a full answer, but here is relevant "
-                        f"information from the knowledge base:\n\n{combined}"
-                    )
-
-            return "I could not find relevant information in the knowledge base."
+            timings = StageTimer("query")
+            with timings.stage("embed"):
+                embedding = self.embed_model.get_query_embedding(query_text)
+            
+            stored = self._stored_answer(embedding, timings)
+            if stored is not None:
+                stored["timings"] = timings.finish()
+                return stored
+            
+            with timings.stage("retrieve"):
+                nodes = self.retrieve(query_text, embedding)
+            nodes = self._select_nodes(query_text, nodes, timings)
+            context_nodes, context = self._budget_context(query_text, nodes, timings)
+            with timings.stage("synthesize"):
+                answer = self.synthesize(query_text, context_nodes)
+            
+            usage = None
+            if answer is None:
+                with timings.stage("fallback"):
+                    answer = self._fallback_answer(nodes)
+            else:
+                self._cache_store(query_text, embedding, answer, nodes, timings.elapsed())
+                usage = self._usage(query_text, context_nodes, context, answer)
+            return {
+                "answer": answer,
+                "sources": [self._node_source(node) for node in nodes],
+                "cached": False,
+                "context": context,
+                "usage": usage,
+                "timings": timings.finish()
+            }
         except Exception as e:
             logger.error(f"Error querying: {e}")
             raise
     
+    async def aquery(self, query_text: str) -> Dict[str, Any]:
+        """
+        Async version of query_with_details
+        
+        The query embedding and the LLM call are awaited on the shared
+        async HTTP client, so one event loop can keep hundreds of queries in
+        flight. Retrieval, reranking and the caches are CPU or disk bound
+        and run on the default thread pool.
+        
+        Args:
+            query_text: User query
+            
+        Returns:
+            The same dict as query_with_details
+        """
+        if not self.retriever:
+            raise ValueError("Query engine not initialized. Create or load an index first.")
+        
+        try:
+            timings = StageTimer("query")
+            with timings.stage("embed"):
+                embedding = await self._aembed_query(query_text)
+            
+            stored = await asyncio.to_thread(self._stored_answer, embedding, timings)
+            if stored is not None:
+                stored["timings"] = timings.finish()
+                return stored
+            
+            with timings.stage("retrieve"):
+                nodes = await self.aretrieve(query_text, embedding)
+            nodes = await asyncio.to_thread(self._select_nodes, query_text, nodes, timings)
+            context_nodes, context = await asyncio.to_thread(
+                self._budget_context, query_text, nodes, timings
+            )
+            with timings.stage("synthesize"):
+                answer = await self.asynthesize(query_text, context_nodes)
+            
+            usage = None
+            if answer is None:
+                with timings.stage("fallback"):
+                    answer = self._fallback_answer(nodes)
+            else:
+                compute_time = timings.elapsed()
+                await asyncio.to_thread(
+                    self._cache_store, query_text, embedding, answer, nodes, compute_time
+                )
+                usage = await asyncio.to_thread(
+                    self._usage, query_text, context_nodes, context, answer
+                )
+            return {
+                "answer": answer,
+                "sources": [self._node_source(node) for node in nodes],
+                "cached": False,
+                "context": context,
+                "usage": usage,
+                "timings": timings.finish()
+            }
+        except Exception as e:
+            logger.error(f"Error querying: {e}")
+            raise
+    
+    async def _aembed_query(self, query_text: str) -> List[float]:
+        """Embed a query, awaiting the API or, for local models, on a thread"""
+        if self.embedding_provider == "openai":
+            return await self.embed_model.aget_query_embedding(query_text)
+        return await asyncio.to_thread(self.embed_model.get_query_embedding, query_text)
+    
+    def _stored_answer(
+        self, embedding: List[float], timings: StageTimer
+    ) -> Optional[Dict[str, Any]]:
+        """
+        A precomputed answer for the query's intent, else a cached answer
+        for a near-identical query
+        
+        Returns:
+            Dict with "answer", "sources", "cached" and "precomputed" (plus
+            the "matched_question" for precomputed answers), or None
+        """
+        collection = self.collection
+        if self.precomputed and collection is not None:
+            with timings.stage("intent_match"):
+                match = self.precomputed.match(embedding, collection.name)
+            if match is not None:
+                return {
+                    "answer": match["answer"], "sources": match["sources"],
+                    "cached": True, "precomputed": True,
+                    "matched_question": match["question"]
+                }
+        if self.answer_cache:
+            with timings.stage("cache_lookup"):
+                cached = self.answer_cache.lookup(embedding)
+            if cached is not None:
+                answer, sources = cached
+                return {
+                    "answer": answer, "sources": sources,
+                    "cached": True, "precomputed": False
+                }
+        return None
+    
+    def retrieve(
+        self,
+        query_text: str,
+        embedding: Optional[List[float]] = None,
+        top_k: Optional[int] = None
+    ) -> List[NodeWithScore]:
+        """
+        Retrieve the nodes most similar to a query
+        
+        Args:
+            query_text: User query
+            embedding: Precomputed query embedding, to avoid embedding twice
+            top_k: Number of nodes, if different from the serving retriever's
+        """
+        retriever = self.retriever
+        if top_k is not None:
+            retriever = self._make_retriever(
+                self.index, self.collection, top_k, self.lexical_index, self.quantized_index
+            )
+        return retriever.retrieve(
+            QueryBundle(query_str=query_text, embedding=embedding)
+        )
+    
+    async def aretrieve(
+        self,
+        query_text: str,
+        embedding: Optional[List[float]] = None,
+        top_k: Optional[int] = None
+    ) -> List[NodeWithScore]:
+        """
+        Async version of retrieve
+        
+        Without a precomputed embedding the query is embedded first; the
+        search itself runs on the default thread pool.
+        """
+        if embedding is None:
+            embedding = await self._aembed_query(query_text)
+        return await asyncio.to_thread(self.retrieve, query_text, embedding, top_k)
+    
+    def _select_nodes(
+        self,
+        query_text: str,
+        nodes: List[NodeWithScore],
+        timings: StageTimer,
+        top_n: Optional[int] = None
+    ) -> List[NodeWithScore]:
+        """Keep the best top_n candidates, reranking them if a reranker is set"""
+        top_n = top_n or self.synthesis_top_n
+        if not self.reranker:
+            return nodes[:top_n]
+        with timings.stage("rerank"):
+            return self.reranker.rerank(query_text, nodes, top_n)
+    
+    def _budget_context(
+        self, query_text: str, nodes: List[NodeWithScore], timings: StageTimer
+    ) -> Tuple[List[NodeWithScore], Optional[Dict[str, int]]]:
+        """Compress selected nodes to the context budget, if one is set"""
+        if not self.context_budget or not nodes:
+            return nodes, None
+        with timings.stage("compress"):
+            return self.context_budget.apply(query_text, nodes)
+    
+    def retrieve_only(self, query_text: str, top_k: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Ranked nodes for a query, without calling the LLM
+        
+        Args:
+            query_text: User query
+            top_k: Number of results (default: SYNTHESIS_TOP_N)
+            
+        Returns:
+            Dict with ranked "results" (doc_id, question, answer, topic,
+            source, text, score), the top snippets formatted as an
+            "answer", and per-stage "timings" in milliseconds
+        """
+        if not self.retriever:
+            raise ValueError("Query engine not initialized. Create or load an index first.")
+        
+        timings = StageTimer("retrieve")
+        with timings.stage("embed"):
+            embedding = self.embed_model.get_query_embedding(query_text)
+        with timings.stage("retrieve"):
+            candidates = None
+            if top_k is not None and top_k > self.retrieval_top_k:
+                candidates = top_k
+            nodes = self.retrieve(query_text, embedding, top_k=candidates)
+        nodes = self._select_nodes(query_text, nodes, timings, top_n=top_k)
+        return {
+            "results": [self._node_result(node, rank) for rank, node in enumerate(nodes, 1)],
+            "answer": self.format_snippets(
+                nodes, "Here is relevant information from the knowledge base:"
+            ),
+            "timings": timings.finish()
+        }
+    
+    def _usage(
+        self,
+        query_text: str,
+        context_nodes: List[NodeWithScore],
+        context: Optional[Dict[str, int]],
+        answer: str
+    ) -> Dict[str, int]:
+        """
+        Approximate LLM token counts: question plus context, and the answer
+        
+        The prompt template isn't counted. Context tokens are reused from
+        the context budget when it ran.
+        """
+        tokenizer = get_tokenizer()
+        if context:
+            context_tokens = context["prompt_tokens_after"]
+        else:
+            context_tokens = sum(len(tokenizer(self._node_text(node))) for node in context_nodes)
+        return {
+            "prompt_tokens": context_tokens + len(tokenizer(query_text)),
+            "completion_tokens": len(tokenizer(answer))
+        }
+    
+    def synthesize(self, query_text: str, nodes: List[NodeWithScore]) -> Optional[str]:
+        """
+        Synthesize an answer from retrieved nodes
+        
+        Returns:
+            The answer, or None if the LLM produced nothing
+        """
+        if not nodes:
+            return None
+        return self._answer_text(self.synthesizer.synthesize(query_text, nodes=nodes))
+    
+    async def asynthesize(self, query_text: str, nodes: List[NodeWithScore]) -> Optional[str]:
+        """
+        Async version of synthesize
+        
+        If the LLM hasn't answered after LLM_HEDGE_DELAY seconds (0: never),
+        the request is sent a second time and the first answer wins. An
+        in-process LLM (llamacpp) can't be awaited and runs on a thread.
+        
+        Returns:
+            The answer, or None if the LLM produced nothing
+        """
+        if not nodes:
+            return None
+        if llm_is_local():
+            return await asyncio.to_thread(self.synthesize, query_text, nodes)
+        synthesizer = self.synthesizer
+        response = await hedged(
+            lambda: synthesizer.asynthesize(query_text, nodes=nodes), self.hedge_delay
+        )
+        return self._answer_text(response)
+    
+    @staticmethod
+    def _answer_text(response: Any) -> Optional[str]:
+        """The synthesized answer, or None if it is empty"""
+        answer = str(response).strip()
+        if not answer or answer == "Empty Response":
+            return None
+        return answer
+    
+    def stream_query(self, query_text: str) -> Iterator[Dict[str, Any]]:
+        """
+        Query the vector store and stream the answer as it is generated
+        
+        Args:
+            query_text: User query
+            
+        Yields:
+            A "precomputed" event with the matched question if the answer
+            was generated ahead of time, a "sources" event with retrieved
+            node metadata, a "context"
+            event with prompt token counts, then "token" events with answer
+            text as the LLM produces it, a "usage" event with approximate
+            LLM token counts if it answered, then a "timings" event with
+            per-stage milliseconds
+        """
+        if not self.retriever:
+            raise ValueError("Query engine not initialized. Create or load an index first.")
+        
+        try:
+            timings = StageTimer("stream_query")
+            with timings.stage("embed"):
+                embedding = self.embed_model.get_query_embedding(query_text)
+            
+            stored = self._stored_answer(embedding, timings)
+            if stored is not None:
+                if stored["precomputed"]:
+                    yield {
+                        "event": "precomputed",
+                        "data": {"matched_question": stored["matched_question"]}
+                    }
+                yield {"event": "sources", "data": stored["sources"]}
+                yield {"event": "token", "data": stored["answer"]}
+                yield {"event": "timings", "data": timings.finish()}
+                return
+            
+            with timings.stage("retrieve"):
+                nodes = self.retrieve(query_text, embedding)
+            nodes = self._select_nodes(query_text, nodes, timings)
+            yield {
+                "event": "sources",
+                "data": [self._node_source(node) for node in nodes]
+            }
+            context_nodes, context = self._budget_context(query_text, nodes, timings)
+            if context:
+                yield {"event": "context", "data": context}
+            
+            produced = []
+            with timings.stage("synthesize"):
+                if context_nodes:
+                    response = self.stream_synthesizer.synthesize(query_text, nodes=context_nodes)
+                    # Synthesis with no usable text returns a plain Response.
+                    response_gen = getattr(response, "response_gen", None)
+                    if response_gen is None:
+                        response_gen = [str(response)]
+                    for token in response_gen:
+                        if token:
+                            produced.append(token)
+                            yield {"event": "token", "data": token}
+            
+            answer = "".join(produced).strip()
+            if not answer or answer == "Empty Response":
+                with timings.stage("fallback"):
+                    fallback = self._fallback_answer(nodes)
+                yield {"event": "token", "data": fallback}
+            else:
+                self._cache_store(query_text, embedding, answer, nodes, timings.elapsed())
+                yield {
+                    "event": "usage",
+                    "data": self._usage(query_text, context_nodes, context, answer)
+                }
+            yield {"event": "timings", "data": timings.finish()}
+        except Exception as e:
+            logger.error(f"Error streaming query: {e}")
+            raise
+    
+    def retrieve_batch(
+        self, query_texts: List[str], chunk_size: int = 256, use_stored: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Embed and retrieve for many queries with shared calls
+        
+        All queries are embedded with batched embedding calls and looked up
+        with one multi-query Chroma call (or one quantized index pass and
+        Chroma read) per chunk, and all candidates are
+        reranked in shared batches. Queries with a precomputed or cached
+        answer skip retrieval.
+        
+        Args:
+            query_texts: User queries
+            chunk_size: Queries per Chroma call
+            use_stored: Whether to look for precomputed and cached answers
+            
+        Returns:
+            Per query, in order: its "embedding", the "cached" answer (as
+            returned by _stored_answer) or None, and the retrieved "nodes"
+        """
+        if self.collection is None or self.synthesizer is None:
+            raise ValueError("Query engine not initialized. Create or load an index first.")
+        
+        embeddings = embed_queries(self.embed_model, query_texts)
+        items = []
+        for embedding in embeddings:
+            cached = self._stored_answer(embedding, StageTimer()) if use_stored else None
+            items.append({"embedding": embedding, "cached": cached, "nodes": []})
+        
+        retriever = self.retriever
+        hybrid = isinstance(retriever, HybridRetriever)
+        n_results = retriever.candidates if hybrid else self.retrieval_top_k
+        dense = retriever.vector_retriever if hybrid else retriever
+        
+        pending = [i for i, item in enumerate(items) if item["cached"] is None]
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            if isinstance(dense, QuantizedRetriever):
+                found = dense.retrieve_many([items[i]["embedding"] for i in chunk], n_results)
+                for i, nodes in zip(chunk, found):
+                    items[i]["nodes"] = retriever.fuse(query_texts[i], nodes) if hybrid else nodes
+                continue
+            results = self.collection.query(
+                query_embeddings=[items[i]["embedding"] for i in chunk],
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"]
+            )
+            for position, i in enumerate(chunk):
+                # Score like ChromaVectorStore does.
+                nodes = _chroma_nodes(
+                    results["ids"][position],
+                    results["documents"][position],
+                    results["metadatas"][position],
+                    [math.exp(-distance) for distance in results["distances"][position]]
+                )
+                items[i]["nodes"] = retriever.fuse(query_texts[i], nodes) if hybrid else nodes
+        
+        if self.reranker and pending:
+            reranked = self.reranker.rerank_many(
+                [(query_texts[i], items[i]["nodes"]) for i in pending],
+                self.synthesis_top_n
+            )
+            for i, nodes in zip(pending, reranked):
+                items[i]["nodes"] = nodes
+        else:
+            for i in pending:
+                items[i]["nodes"] = items[i]["nodes"][:self.synthesis_top_n]
+        return items
+    
+    def answer_retrieved(
+        self, query_text: str, item: Dict[str, Any], cache: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Synthesize the answer for one query prepared by retrieve_batch
+        
+        Args:
+            query_text: User query
+            item: The query's entry from retrieve_batch
+            cache: Whether to store the answer in the answer cache
+            
+        Returns:
+            Dict with "answer", "sources", whether it was "cached" (and
+            "precomputed"), prompt token counts ("context"), approximate LLM
+            token "usage", and the synthesis "timings" in milliseconds
+        """
+        timings = StageTimer("batch_query")
+        if item["cached"] is not None:
+            return {**item["cached"], "timings": timings.finish()}
+        
+        nodes = item["nodes"]
+        context_nodes, context = self._budget_context(query_text, nodes, timings)
+        with timings.stage("synthesize"):
+            answer = self.synthesize(query_text, context_nodes)
+        usage = None
+        if answer is None:
+            with timings.stage("fallback"):
+                answer = self._fallback_answer(nodes)
+        else:
+            if cache:
+                self._cache_store(query_text, item["embedding"], answer, nodes, timings.elapsed())
+            usage = self._usage(query_text, context_nodes, context, answer)
+        return {
+            "answer": answer,
+            "sources": [self._node_source(node) for node in nodes],
+            "cached": False,
+            "context": context,
+            "usage": usage,
+            "timings": timings.finish()
+        }
+
+    def precompute_answers(
+        self, questions: List[Tuple[str, str]], force: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Generate and store answers to common questions from the serving index
+        
+        Questions are embedded and retrieved as one batch, neither read from
+        nor written to the answer caches, and answered
+        PRECOMPUTE_CONCURRENCY at a time. The stored answers replace those
+        from earlier index versions. Questions the LLM gave no answer for
+        are left to the full query path.
+        
+        Args:
+            questions: (kind, question) pairs, e.g. from
+                precomputed_answers.default_questions
+            force: Regenerate even if answers for this version exist
+            
+        Returns:
+            Dict with the "index_version", the number of "questions" and
+            "stored" answers, and whether the run was "skipped"
+        """
+        if self.collection is None or self.synthesizer is None:
+            raise ValueError("Query engine not initialized. Create or load an index first.")
+        
+        version = self.collection.name
+        questions = unique_questions(questions)
+        result = {"index_version": version, "questions": len(questions), "stored": 0, "skipped": True}
+        if not self.precomputed or not questions:
+            return result
+        if not force and self.precomputed.has_version(version):
+            logger.info(f"Precomputed answers for {version} are up to date")
+            return result
+        
+        texts = [question for _, question in questions]
+        items = self.retrieve_batch(texts, use_stored=False)
+        with ThreadPoolExecutor(
+            max_workers=self.precomputed.concurrency, thread_name_prefix="precompute"
+        ) as executor:
+            answers = list(executor.map(
+                functools.partial(self.answer_retrieved, cache=False), texts, items
+            ))
+        
+        entries = [
+            {
+                "kind": kind,
+                "question": question,
+                "embedding": item["embedding"],
+                "answer": answer["answer"],
+                "sources": answer["sources"]
+            }
+            for (kind, question), item, answer in zip(questions, items, answers)
+            if "fallback" not in answer["timings"]
+        ]
+        self.precomputed.replace(version, entries)
+        result.update(stored=len(entries), skipped=False)
+        return result
+    
+    def _cache_store(
+        self,
+        query_text: str,
+        embedding: Optional[List[float]],
+        answer: str,
+        source_nodes: List[Any],
+        compute_time: float
+    ) -> None:
+        """Remember a synthesized answer for similar future queries"""
+        if not self.answer_cache or embedding is None:
+            return
+        try:
+            sources = [self._node_source(node) for node in source_nodes]
+            self.answer_cache.store(query_text, embedding, answer, sources, compute_time)
+        except Exception as e:
+            logger.warning(f"Could not cache answer: {e}")
+
+    @staticmethod
+    def _node_source(node: Any) -> Dict[str, Any]:
+        """Metadata about a retrieved node, safe to send to clients"""
+        base_node = getattr(node, "node", node)
+        metadata = getattr(base_node, "metadata", {}) or {}
+        return {
+            "doc_id": metadata.get("doc_id", ""),
+            "source": metadata.get("source", ""),
+            "topic": metadata.get("topic", ""),
+            "question": metadata.get("question", ""),
+            "score": getattr(node, "score", None)
+        }
+
+    @classmethod
+    def _node_result(cls, node: Any, rank: int) -> Dict[str, Any]:
+        """A retrieved node with its text, for retrieval-only responses"""
+        base_node = getattr(node, "node", node)
+        metadata = getattr(base_node, "metadata", {}) or {}
+        result = {"rank": rank, **cls._node_source(node)}
+        result["answer"] = metadata.get("answer", "")
+        result["text"] = cls._node_text(node)
+        return result
+
+    @staticmethod
+    def _node_text(node: Any) -> str:
+        base_node = getattr(node, "node", node)
+        if hasattr(base_node, "get_content"):
+            return base_node.get_content().strip()
+        return getattr(base_node, "text", "").strip()
+
+    @classmethod
+    def format_snippets(cls, nodes: List[Any], intro: str) -> str:
+        """
+        Format the top retrieved nodes as a plain-text answer
+        
+        Args:
+            nodes: Retrieved nodes, best first
+            intro: Sentence to put before the snippets
+        """
+        snippets = [text for text in (cls._node_text(node) for node in nodes[:3]) if text]
+        if snippets:
+            combined = "\n\n".join(snippets)
+            return f"{intro}\n\n{combined}"
+        return "I could not find relevant information in the knowledge base."
+
+    @classmethod
+    def _fallback_answer(cls, nodes: List[Any]) -> str:
+        """Format raw retrieval results when the LLM doesn't synthesize"""
+        return cls.format_snippets(
+            nodes,
+            "I could not synthesize a full answer, but here is relevant "
+            "information from the knowledge base:"
+        )
+    
+    def _drop_engines(self) -> None:
+        """Stop serving the current index"""
+        self.index = None
+        self.retriever = None
+        self.synthesizer = None
+        self.stream_synthesizer = None
+        self.collection = None
+        self.lexical_index = None
+        self.quantized_index = None
+    
     def reset(self) -> None:
-        """Reset the vector store"""
+        """Delete every collection version and the alias pointing at them"""
         try:
-            self.chroma_client.reset()
+            self._drop_engines()
+            try:
+                os.remove(self._alias_path)
+            except FileNotFoundError:
+                pass
+            for name in self._version_names():
+                self._drop_version(name)
+            self._clear_checkpoint()
+            if self.answer_cache:
+                self.answer_cache.clear()
+            if self.precomputed:
+                self.precomputed.clear()
+            self.loaded_generation = self.generation.bump("reset")
             logger.info("Vector store reset")
         except Exception as e:
             logger.error(f"Error resetting vector store: {e}")
@@ -0,0 +1,102 @@
+"""
+Pre-fork multi-worker serving with shared models
+"""
+import os
+import signal
+import time
+from typing import Any, Dict
+import logging
+
+import uvicorn
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def preload() -> None:
+    """
+    Import the heavy libraries and load the embedding model before forking
+
+    Workers then share these pages copy-on-write. Chroma clients, SQLite
+    connections and threads are not fork-safe, so everything else is
+    created in each worker after the fork. Index files (lexical and
+    quantized) are memory-mapped, so workers share them through the page
+    cache.
+    """
+    import vector_store
+
+    vector_store.preload_embed_model()
+
+
+def serve(app: Any, host: str, port: int, workers: int) -> None:
+    """
+    Bind once, then fork workers that accept on the shared socket
+
+    Workers that exit unexpectedly are replaced. SIGINT or SIGTERM stops
+    all of them.
+
+    Args:
+        app: ASGI application
+        host: Interface to bind
+        port: Port to bind
+        workers: Number of worker processes
+    """
+    if not hasattr(os, "fork"):
+        logger.warning("Multiple workers need os.fork; serving with one process")
+        uvicorn.run(app, host=host, port=port)
+        return
+
+    # Split the cores between workers instead of each using all of them.
+    os.environ.setdefault("EMBEDDING_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+    # Tells workers to share state such as metrics snapshots.
+    os.environ["WORKERS"] = str(workers)
+
+    config = uvicorn.Config(app, host=host, port=port)
+    sock = config.bind_socket()
+    if (os.getenv("PRELOAD_MODELS") or "true").lower() not in ("0", "false", "no"):
+        started = time.perf_counter()
+        preload()
+        logger.info(f"Preloaded models in {time.perf_counter() - started:.1f}s")
+
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                uvicorn.Server(config).run(sockets=[sock])
+            finally:
+                os._exit(0)
+        children[pid] = slot
+        logger.info(f"Started worker {slot} (pid {pid})")
+
+    def stop(signum: int, frame: Any) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for slot in range(workers):
+        spawn(slot)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is not None and not stopping:
+            logger.warning(f"Worker {slot} (pid {pid}) exited with status {status}; restarting")
+            spawn(slot)
+    sock.close()
@@ -10,6 +10,7 @@ function App() {
   const [loading, setLoading] = useState(false)
   const [systemStatus, setSystemStatus] = useState(null)
   const [initializing, setInitializing] = useState(false)
+  const [initProgress, setInitProgress] = useState(null)
   const messagesEndRef = useRef(null)
 
   const scrollToBottom = () => {
@@ -55,6 +56,25 @@ function App() {
     }
   }
 
+  const formatProgress = (job) => {
+    if (!job || job.phase !== 'indexing' || !job.docs_total) {
+      return 'Initializing...'
+    }
+    const percent = Math.floor((job.docs_processed / job.docs_total) * 100)
+    return `Initializing... ${percent}%`
+  }
+
+  const waitForJob = async (jobId) => {
+    while (true) {
+      const { data: job } = await axios.get(`${API_URL}/jobs/${jobId}`)
+      if (!['queued', 'running'].includes(job.status)) {
+        return job
+      }
+      setInitProgress(job)
+      await new Promise(resolve => setTimeout(resolve, 2000))
+    }
+  }
+
   const initializeSystem = async () => {
     setInitializing(true)
     const systemMessage = {
@@ -65,7 +85,12 @@ function App() {
     setMessages(prev => [...prev, systemMessage])
 
     try {
-      await axios.post(`${API_URL}/initialize?max_samples=1000`)
+      const { data: job } = await axios.post(`${API_URL}/initialize?max_samples=1000`)
+      const result = await waitForJob(job.job_id)
+
+      if (result.status !== 'completed') {
+        throw new Error(result.errors?.join('; ') || `Initialization ${result.status}`)
+      }
       
       const successMessage = {
         type: 'system',
@@ -85,6 +110,35 @@ function App() {
       setMessages(prev => [...prev, errorMessage])
     } finally {
       setInitializing(false)
+      setInitProgress(null)
+    }
+  }
+
+  const readEventStream = async (response, onEvent) => {
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+
+    while (true) {
+      const { done, value } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+
+      // Server-Sent Events frames are separated by a blank line.
+      let boundary = buffer.indexOf('\n\n')
+      while (boundary !== -1) {
+        const frame = buffer.slice(0, boundary)
+        buffer = buffer.slice(boundary + 2)
+        boundary = buffer.indexOf('\n\n')
+
+        let event = 'message'
+        let data = ''
+        for (const line of frame.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7)
+          else if (line.startsWith('data: ')) data += line.slice(6)
+        }
+        if (data) onEvent(event, JSON.parse(data))
+      }
     }
   }
 
@@ -114,17 +168,48 @@ function App() {
     setLoading(true)
 
     try {
-      const response = await axios.post(`${API_URL}/query`, {
-        question: input
+      const response = await fetch(`${API_URL}/query/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ question: input })
       })
 
-      const assistantMessage = {
-        type: 'assistant',
-        content: response.data.answer,
-        timestamp: new Date()
+      if (!response.ok) {
+        const body = await response.json().catch(() => ({}))
+        throw { response: { data: body } }
       }
-      
-      setMessages(prev => [...prev, assistantMessage])
+
+      // Add the assistant message on the first event and fill it in as
+      // tokens arrive.
+      let started = false
+      const updateAssistantMessage = (update) => {
+        if (!started) {
+          started = true
+          setLoading(false)
+          setMessages(prev => [...prev, {
+            type: 'assistant',
+            content: '',
+            sources: [],
+            timestamp: new Date()
+          }])
+        }
+        setMessages(prev => {
+          const next = [...prev]
+          const last = next[next.length - 1]
+          next[next.length - 1] = { ...last, ...update(last) }
+          return next
+        })
+      }
+
+      await readEventStream(response, (event, data) => {
+        if (event === 'sources') {
+          updateAssistantMessage(() => ({ sources: data }))
+        } else if (event === 'token') {
+          updateAssistantMessage(last => ({ content: last.content + data }))
+        } else if (event === 'error') {
+          throw { response: { data: data } }
+        }
+      })
     } catch (error) {
       console.error('Error sending message:', error)
       const errorMessage = {
@@ -153,7 +238,7 @@ function App() {
                 onClick={initializeSystem}
                 disabled={initializing}
               >
-                {initializing ? 'Initializing...' : 'Initialize System'}
+                {initializing ? formatProgress(initProgress) : 'Initialize System'}
               </button>
             )}
             <div className={`status-indicator ${systemStatus?.index_loaded ? 'online' : 'offline'}`}>
@@ -171,6 +256,11 @@ function App() {
                 {message.type === 'system' && <div className="message-label">System</div>}
                 {message.type === 'error' && <div className="message-label">Error</div>}
                 <div className="message-text">{message.content}</div>
+                {message.sources?.length > 0 && (
+                  <div className="message-sources">
+                    Sources: {message.sources.map(source => source.topic || source.question || source.doc_id).join(' · ')}
+                  </div>
+                )}
               </div>
             </div>
           ))}